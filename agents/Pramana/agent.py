@@ -1,54 +1,72 @@
-import json
-import re
-from core.llm.ai_framework_adaptor import AIFrameworkAdaptor
+from core.llm.ai_framework_adapter import stream_to_session
+from core.llm.scheduler import update_request_context
+from core.llm.prompt_budget import FIXED, HEAD, MIDDLE, USER
 from agents.Pramana.prompts import PRAMANA_MASTER_PROMPT
-from core.rag.retriever import Retriever
+from core.services import get_services
+
+# Requested from providers that support constrained output (see PRAMANA_MASTER_PROMPT's output format)
+PRAMANA_OUTPUT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "test_files": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"path": {"type": "string"}, "code_content": {"type": "string"}},
+                "required": ["path", "code_content"]
+            }
+        },
+        "test_plan_summary": {"type": "string"}
+    },
+    "required": ["test_files", "test_plan_summary"]
+}
 
 class PramanaAgent:
     def __init__(self, db_path, collection_name, prompt_type="qa", config=None):
         self.mode = "qa"
+        self.db_path = db_path
+        self.collection_name = collection_name
         self.config = config or {}
-        try:
-            self.retriever = Retriever(db_path, collection_name)
-        except:
-            self.retriever = None
-        
-        self.llm = AIFrameworkAdaptor()
+        # Tests are written from the plan and the generated code, so Pramana needs no retriever
+        self.services = get_services()
         self.state = "IDLE"
 
+    @property
+    def llm(self):
+        return self.services.llm()
+
+    def generate_tests(self, code, plan, instruction, on_token=None):
+        """Returns (result_json, response) for test generation over `code`; result_json is None if unusable."""
+        # Sized to the model's context window.
+        # Master prompt + plan are a stable, cacheable prefix; the code and instruction change per request.
+        builder = self.llm.prompt_builder("Pramana")
+        builder.add("system", PRAMANA_MASTER_PROMPT, policy=FIXED)
+        builder.add("plan", plan, weight=2, policy=MIDDLE, header="\n# THE REQUIREMENT (PLAN)\n")
+        builder.add("code", code, weight=3, policy=HEAD, header="# THE CODE TO TEST (FROM PREVIOUS STEP)\n", role=USER)
+        builder.add("input", instruction, policy=MIDDLE, header="\n# USER INSTRUCTION\n", role=USER)
+        system_instruction, messages = builder.build_chat()
+        return self.llm.chat_json(messages, system_instruction=system_instruction, schema=PRAMANA_OUTPUT_SCHEMA, on_token=on_token)
+
     def execute(self, user_input, session_data):
         """
         user_input: "Generate tests for this feature"
         session_data: Must contain 'final_solution' (from Solvo) or code snippet.
         """
         self.state = "TESTING"
+        update_request_context(agent="Pramana", stage=self.state, session_id=session_data.get("session_id"))
         
         # 1. Get Context
         # Try to get the Code generated by Sutra, or the Plan from Solvo
         prev_response = session_data.get("last_agent_response", "")
         plan = session_data.get("uploaded_doc_content", "")
         
-        # 2. Construct Prompt
-        prompt = f"""{PRAMANA_MASTER_PROMPT}
-
-# THE REQUIREMENT (PLAN)
-{plan}
-
-# THE CODE TO TEST (FROM PREVIOUS STEP)
-{prev_response}
-
-# USER INSTRUCTION
-{user_input}
-"""
+        # 2. Generate
         print("\n⚖️ Pramana is generating proofs...")
-        response = self.llm.generate_content(prompt)
+        result_json, response = self.generate_tests(prev_response, plan, user_input, on_token=stream_to_session(session_data))
 
-        # 3. Parse Output (Reuse robust parser logic)
+        # 3. Parse Output (already extracted, or repaired once, by chat_json)
         try:
-            json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
-            if json_match:
-                result_json = json.loads(json_match.group(0))
-                
+            if result_json:
                 output_text = "### ⚖️ Test Generation Complete\n\n"
                 output_text += f"**Summary:** {result_json.get('test_plan_summary', 'Tests generated.')}\n\n"
                 
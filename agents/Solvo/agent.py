@@ -1,8 +1,12 @@
-import json
 import re
 import os
-from core.llm.ai_framework_adaptor import AIFrameworkAdaptor
-from core.rag.retriever import Retriever
+import json
+from concurrent.futures import ThreadPoolExecutor
+from core.llm.ai_framework_adapter import stream_to_session
+from core.llm.scheduler import update_request_context
+from core.llm.prompt_budget import FIXED, HEAD, MIDDLE, USER
+from core.llm.conversation_memory import ConversationMemory
+from core.services import get_services
 from agents.Solvo.tools.doc_generator import save_solution_to_doc
 # Ensure prompts are imported correctly. If in same dir, use .prompts
 from .prompts import (
@@ -14,26 +18,42 @@ from .prompts import (
     D1_EPIC_BREAKDOWN_PROMPT
 )
 
-# --- HELPER: ROBUST JSON EXTRACTOR ---
-def extract_first_json_block(text):
-    text = text.strip()
-    start_index = text.find('{')
-    if start_index == -1: return None
-    balance = 0
-    is_inside_string = False
-    escape_next = False
-    for i in range(start_index, len(text)):
-        char = text[i]
-        if char == '"' and not escape_next: is_inside_string = not is_inside_string
-        if not is_inside_string:
-            if char == '{': balance += 1
-            elif char == '}': balance -= 1
-        if char == '\\' and not escape_next: escape_next = True
-        else: escape_next = False
-        if balance == 0 and i > start_index:
-            try: return json.loads(text[start_index : i+1])
-            except json.JSONDecodeError: continue
-    return None
+# DigitalOne stages whose prompt needs retrieval, and how the accumulated report is turned into queries
+D1_RETRIEVAL_STAGES = ("SCOPE_IMPACT",)
+D1_NEXT_STAGE = {"REQ_ANALYSIS": "SCOPE_IMPACT", "SCOPE_IMPACT": "EPIC_BREAKDOWN"}
+D1_QUERY_SEGMENT_CHARS = 1000
+D1_MAX_QUERY_SEGMENTS = 4
+
+# Background retrieval for the next DigitalOne stage (pipelined mode)
+_PREFETCH_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="solvo-prefetch")
+
+def completed_json_string(text, key):
+    """The value of the string field `key` in partially streamed JSON, once its closing quote is in; else None."""
+    match = re.search(r'"%s"\s*:\s*"' % re.escape(key), text)
+    if not match:
+        return None
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text, match.end() - 1)
+    except json.JSONDecodeError:
+        return None
+    return value
+
+def split_query_segments(text, size=D1_QUERY_SEGMENT_CHARS, max_segments=D1_MAX_QUERY_SEGMENTS):
+    """Packs the paragraphs of a markdown report into up to `max_segments` retrieval queries of about `size` chars."""
+    segments, current = [], ""
+    for paragraph in re.split(r'\n\s*\n', text or ""):
+        paragraph = paragraph.strip()[:size]
+        if not paragraph:
+            continue
+        if current and len(current) + len(paragraph) + 1 > size:
+            segments.append(current)
+            current = ""
+            if len(segments) == max_segments:
+                return segments
+        current = f"{current}\n{paragraph}" if current else paragraph
+    if current:
+        segments.append(current)
+    return segments
 
 class SolvoAgent:
     def __init__(self, db_path, collection_name, prompt_type="solvo", config=None):
@@ -56,6 +76,10 @@ class SolvoAgent:
             
         self.state = self.states[0]
         self.accumulated_doc_content = "" # Initialize buffer for D1 reports
+        self.stage_outputs = [] # (state, markdown) per finished D1 stage, for compacted prompts
+        # Pipelined D1: run the stages back to back and fetch each stage's context while the previous one finishes
+        self.pipelined = bool(self.config.get("agent_behavior", {}).get("pipelined", False))
+        self._prefetched = {} # D1 state -> Future of its retrieved context
 
         # 2. Select Initial Prompt (for Ensemble/Default)
         if self.mode == "archivist":
@@ -64,42 +88,99 @@ class SolvoAgent:
              # This helper needs to be in prompts.py
              self.master_prompt = get_prompt_by_profile(self.profile_id)
         
-        # 3. Initialize Services
-        try:
-            self.retriever = Retriever(db_path, collection_name)
-            self.llm = AIFrameworkAdaptor()
-            print(f"🤖 Agent ready. Profile: {self.profile_id}")
-        except Exception as e:
-            print(f"🚨 FATAL: Could not initialize agent: {e}")
-            self.llm = None
-            self.state = "DONE"
+        # 3. Services (retriever, LLM) come from the shared container on first use
+        self.services = get_services()
+        self._memory = None
+        self._rag_context = None # (session_id, rendered context) pinned by the ensemble workflow
+        print(f"🤖 Agent ready. Profile: {self.profile_id}")
+
+    @property
+    def retriever(self):
+        return self.services.retriever(self.db_path, self.collection_name, self.config.get("knowledge_base", {}))
+
+    @property
+    def llm(self):
+        return self.services.llm()
+
+    @property
+    def memory(self):
+        if self._memory is None:
+            self._memory = ConversationMemory(self.llm)
+        return self._memory
 
     # --- PROMPT CONSTRUCTORS ---
     
-    def _construct_ensemble_prompt(self, user_input, rag_context, conversation_history):
-        history_str = ""
-        for i, turn in enumerate(conversation_history):
-            if i == len(conversation_history) - 1 and turn['content'] == user_input: continue
-            role_label = "Solvo" if turn['role'] == 'assistant' else "User"
-            history_str += f"[{role_label}]: {turn['content']}\n\n"
-        return f"{self.master_prompt}\n{rag_context}\n# CONVERSATION HISTORY\n{history_str}\n\n# LATEST USER INPUT\n\n{user_input}"
-
-    def _construct_d1_prompt(self, state, user_input, rag_context):
+    # Prompts are laid out for prefix caching and returned as (system_instruction, messages):
+    # master prompt and pinned context first, then the conversation, then the latest input.
+    # Follow-up turns share everything but the last message, so the server does not re-encode it.
+
+    def _construct_ensemble_prompt(self, user_input, rag_context, conversation_history, memory_summary=""):
+        history = list(conversation_history)
+        if history and history[-1]['role'] == 'user' and history[-1]['content'] == user_input:
+            history = history[:-1]
+
+        # Sized to the model's context window: oldest turns go first (the original request stays), then the weakest chunks
+        prompt = self.llm.prompt_builder("Solvo")
+        prompt.add("system", self.master_prompt, policy=FIXED)
+        prompt.add("context", rag_context, weight=3, policy=HEAD, separator="\n---\n")
+        if memory_summary:
+            prompt.add("memory", memory_summary, policy=MIDDLE, header="\n# EARLIER CONVERSATION (SUMMARY)\n")
+        prompt.add_history("history", history, weight=2, pin_first=True)
+        prompt.add("input", user_input, weight=2, policy=MIDDLE, role=USER)
+        return prompt.build_chat()
+
+    def _construct_archivist_prompt(self, user_input, rag_context, conversation_history, memory_summary=""):
+        history = list(conversation_history)
+        if history and history[-1]['role'] == 'user' and history[-1]['content'] == user_input:
+            history = history[:-1]
+
+        # Retrieval changes with every question, so the context travels with the question, after the cached prefix
+        prompt = self.llm.prompt_builder("Archivist")
+        prompt.add("system", self.master_prompt, policy=FIXED)
+        if memory_summary:
+            prompt.add("memory", memory_summary, policy=MIDDLE, header="\n# EARLIER CONVERSATION (SUMMARY)\n")
+        prompt.add_history("history", history, weight=2)
+        prompt.add("context", rag_context, weight=3, policy=HEAD, separator="\n---\n", role=USER)
+        prompt.add("input", user_input, policy=MIDDLE, header="\n# QUESTION\n", role=USER)
+        return prompt.build_chat()
+
+    def _construct_d1_prompt(self, state, user_input, rag_context, previous_analysis=None):
+        """previous_analysis defaults to the full accumulated report; pass the compacted one from memory to cap its size."""
+        if previous_analysis is None:
+            previous_analysis = self.accumulated_doc_content
+        prompt = self.llm.prompt_builder(f"Solvo D1 {state}")
         if state == "REQ_ANALYSIS":
-            return f"{D1_REQ_ANALYSIS_PROMPT}\n{rag_context}\n# REQUIREMENTS\n{user_input}"
+            prompt.add("system", D1_REQ_ANALYSIS_PROMPT, policy=FIXED)
+            prompt.add("context", rag_context, weight=2, policy=HEAD, separator="\n---\n")
+            prompt.add("input", user_input, weight=3, policy=MIDDLE, header="# REQUIREMENTS\n", role=USER)
         elif state == "SCOPE_IMPACT":
-            return f"{D1_SCOPE_IMPACT_PROMPT}\n{rag_context}\n# PREVIOUS ANALYSIS (CONTEXT)\n{self.accumulated_doc_content}"
+            prompt.add("system", D1_SCOPE_IMPACT_PROMPT, policy=FIXED)
+            prompt.add("context", rag_context, weight=2, policy=HEAD, separator="\n---\n")
+            prompt.add("plan", previous_analysis, weight=3, policy=MIDDLE, header="# PREVIOUS ANALYSIS (CONTEXT)\n", role=USER)
         elif state == "EPIC_BREAKDOWN":
-            return f"{D1_EPIC_BREAKDOWN_PROMPT}\n# PREVIOUS ANALYSIS (CONTEXT)\n{self.accumulated_doc_content}"
-        return ""
+            prompt.add("system", D1_EPIC_BREAKDOWN_PROMPT, policy=FIXED)
+            prompt.add("plan", previous_analysis, policy=MIDDLE, header="# PREVIOUS ANALYSIS (CONTEXT)\n", role=USER)
+        else:
+            return None, []
+        return prompt.build_chat()
 
     # --- EXECUTION LOGIC ---
 
     def execute(self, user_input, session_data):
-        if not self.llm:
+        try:
+            # Built on the first turn (shared with other agents afterwards), so failures surface here
+            self.llm
+            self.retriever
+        except Exception as e:
+            print(f"🚨 FATAL: Could not initialize agent: {e}")
+            self.state = "DONE"
             session_data["last_agent_response"] = "🚨 Agent is not initialized. Cannot proceed."
             return
 
+        # Tag this turn's LLM calls (telemetry, scheduler) with the agent and workflow stage
+        update_request_context(agent="Solvo", stage="ARCHIVIST" if self.mode == "archivist" else self.state,
+                               session_id=session_data.get("session_id"))
+
         # === WORKFLOW DISPATCHER ===
         if self.mode == "archivist":
             self._execute_archivist(user_input, session_data)
@@ -113,10 +194,11 @@ class SolvoAgent:
     def _execute_archivist(self, user_input, session_data):
         rag_context = self.retriever.get_context_for_request(user_input)
         session_data.setdefault("conversation_history", []).append({"role": "user", "content": user_input})
-        prompt = self._construct_ensemble_prompt(user_input, rag_context, session_data["conversation_history"])
+        memory_summary, history = self.memory.history(session_data, "archivist", session_data["conversation_history"])
+        system_instruction, messages = self._construct_archivist_prompt(user_input, rag_context, history, memory_summary)
         
         print("\n⏳ Archivist is thinking...")
-        response = self.llm.generate_content(prompt)
+        response = self.llm.chat(messages, system_instruction=system_instruction, on_token=stream_to_session(session_data))
         
         if response and response.text:
             session_data["last_agent_response"] = response.text
@@ -125,89 +207,166 @@ class SolvoAgent:
             session_data["last_agent_response"] = "🚨 No response received."
 
     def _execute_ensemble(self, user_input, session_data):
-        prompt_to_send = ""
-        rag_context = ""
-        
         if self.state == "ANALYZING":
-            rag_context = self.retriever.get_context_for_request(user_input)
-            session_data["rag_context"] = rag_context
-            prompt_to_send = self._construct_ensemble_prompt(user_input, rag_context, [])
-        elif self.state == "CLARIFYING":
-            rag_context = session_data.get("rag_context", "") 
-            session_data.setdefault("conversation_history", []).append({"role": "user", "content": user_input})
-            prompt_to_send = self._construct_ensemble_prompt(user_input, rag_context, session_data["conversation_history"])
+            # Retrieved once and pinned for the whole clarification loop, so it stays part of the cached prefix.
+            # The session keeps only the chunk refs; the rendered block stays on the agent.
+            rag_context, session_data["rag_refs"] = self.retriever.get_context_with_refs(user_input)
+            session_data.pop("rag_context", None)
+            self._rag_context = (session_data.get("session_id"), rag_context)
+        else:
+            rag_context = self._session_context(session_data)
+        session_data.setdefault("conversation_history", []).append({"role": "user", "content": user_input})
+        # Older turns are folded into a background summary; the original request and the latest turns stay verbatim
+        memory_summary, history = self.memory.history(session_data, "ensemble", session_data["conversation_history"], pin_first=True)
+        system_instruction, messages = self._construct_ensemble_prompt(user_input, rag_context, history, memory_summary)
         
         print("\n⏳ Solvo (Ensemble) is thinking...")
-        response = self.llm.generate_content(prompt_to_send)
-        self._handle_json_response(response, session_data, is_digital_one=False)
+        response_json, response = self.llm.chat_json(messages, system_instruction=system_instruction, on_token=stream_to_session(session_data))
+        reply = self._handle_json_response(response_json, response, session_data, is_digital_one=False)
+        if reply:
+            session_data["last_agent_response"] = reply
+
+    def _session_context(self, session_data):
+        """The pinned ensemble context: cached on the agent, else stored inline (older sessions), else rebuilt from refs."""
+        session_id = session_data.get("session_id")
+        if self._rag_context and self._rag_context[0] == session_id:
+            return self._rag_context[1]
+        rag_context = session_data.get("rag_context")
+        if not rag_context and session_data.get("rag_refs"):
+            print("♻️ Rebuilding pinned context from stored chunk refs...")
+            rag_context = self.retriever.context_from_refs(session_data["rag_refs"])
+        self._rag_context = (session_id, rag_context or "")
+        return self._rag_context[1]
 
     def _execute_digital_one(self, user_input, session_data):
-        prompt_to_send = ""
+        if not self.pipelined:
+            summaries = [self._execute_d1_stage(user_input, session_data)]
+        else:
+            # Pipelined: keep going until the report is complete (or a stage fails) and show every stage's summary.
+            # The UI takes any last_agent_response as "turn finished", so it is only written after the last stage.
+            summaries = []
+            while self.state != "DONE":
+                update_request_context(stage=self.state)
+                summaries.append(self._execute_d1_stage(user_input, session_data))
+        reply = "\n\n".join(summary for summary in summaries if summary)
+        if reply:
+            session_data["last_agent_response"] = reply
+
+    def _retrieve_stage_context(self, state, report=None):
+        """Context for a D1 stage: the accumulated report is split into segments, queried in one batch."""
+        if state not in D1_RETRIEVAL_STAGES:
+            return ""
+        report = self.accumulated_doc_content if report is None else report
+        queries = split_query_segments(report)
+        if not queries:
+            return self.retriever.get_context_for_request(report[:D1_QUERY_SEGMENT_CHARS])
+        return self.retriever.get_context_for_requests(queries)
+
+    def _prefetch_stage_context(self, state, report):
+        """Starts the retrieval for `state` in the background; _stage_context() picks it up."""
+        if state in D1_RETRIEVAL_STAGES and state not in self._prefetched:
+            print(f"🔮 Prefetching context for D1 stage {state}...")
+            self._prefetched[state] = _PREFETCH_EXECUTOR.submit(self._retrieve_stage_context, state, report)
+
+    def _prefetch_when_streamed(self, state, on_token):
+        """
+        Wraps on_token: as soon as the streamed answer's markdown_content is complete, the retrieval
+        for `state` starts, while the model is still writing the fields that follow it.
+        """
+        streamed = []
+        def watch(fragment):
+            on_token(fragment)
+            if state in self._prefetched:
+                return
+            streamed.append(fragment)
+            # The value can only have closed in a fragment that contains a quote
+            if '"' in fragment:
+                markdown = completed_json_string("".join(streamed), "markdown_content")
+                if markdown is not None:
+                    self._prefetch_stage_context(state, self.accumulated_doc_content + "\n\n" + markdown)
+        return watch
+
+    def _stage_context(self, state):
+        future = self._prefetched.pop(state, None)
+        if future is not None:
+            return future.result()
+        return self._retrieve_stage_context(state)
+
+    def _execute_d1_stage(self, user_input, session_data):
+        system_instruction, messages = None, []
         rag_context = ""
 
         if self.state == "REQ_ANALYSIS":
             print("📝 D1 Step 1: Requirement Analysis...")
             rag_context = self.retriever.get_context_for_request(user_input)
-            prompt_to_send = self._construct_d1_prompt("REQ_ANALYSIS", user_input, rag_context)
+            system_instruction, messages = self._construct_d1_prompt("REQ_ANALYSIS", user_input, rag_context)
             
         elif self.state == "SCOPE_IMPACT":
             print("🎯 D1 Step 2: Scope & Impact...")
             # Use accumulated content as context for retrieval to find deeper links
-            rag_context = self.retriever.get_context_for_request(self.accumulated_doc_content[:1000])
-            prompt_to_send = self._construct_d1_prompt("SCOPE_IMPACT", "", rag_context)
+            rag_context = self._stage_context("SCOPE_IMPACT")
+            system_instruction, messages = self._construct_d1_prompt("SCOPE_IMPACT", "", rag_context, self.memory.stage_context(session_data, self.stage_outputs))
 
         elif self.state == "EPIC_BREAKDOWN":
             print("🧩 D1 Step 3: Epic Breakdown...")
-            prompt_to_send = self._construct_d1_prompt("EPIC_BREAKDOWN", "", "")
+            system_instruction, messages = self._construct_d1_prompt("EPIC_BREAKDOWN", "", "", self.memory.stage_context(session_data, self.stage_outputs))
 
         print("\n⏳ Solvo (DigitalOne) is processing...")
-        response = self.llm.generate_content(prompt_to_send)
-        self._handle_json_response(response, session_data, is_digital_one=True)
+        on_token = stream_to_session(session_data)
+        next_state = D1_NEXT_STAGE.get(self.state)
+        if self.pipelined and next_state in D1_RETRIEVAL_STAGES:
+            on_token = self._prefetch_when_streamed(next_state, on_token)
+        response_json, response = self.llm.chat_json(messages, system_instruction=system_instruction, on_token=on_token)
+        reply = self._handle_json_response(response_json, response, session_data, is_digital_one=True)
+        if self.state != next_state:
+            # The stage did not advance (invalid output, clarifications): its prefetch is not used
+            self._prefetched.pop(next_state, None)
+        return reply
 
     # --- COMMON RESPONSE HANDLER ---
-    def _handle_json_response(self, response, session_data, is_digital_one):
+    def _handle_json_response(self, response_json, response, session_data, is_digital_one):
+        """
+        response_json is the parsed (or repaired) answer, None if it could not be recovered.
+        Returns the message for the user; the caller publishes it as last_agent_response.
+        """
         if not response or not response.text:
              self.state = "DONE"
-             session_data["last_agent_response"] = "🚨 Agent returned an empty response."
-             return
+             return "🚨 Agent returned an empty response."
 
         try:
-            response_json = extract_first_json_block(response.text)
-            if not response_json:
-                  # Fallback regex
-                  json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
-                  if json_match: response_json = json.loads(json_match.group(0))
-            
             if not response_json:
                   self.state = "DONE"
-                  session_data["last_agent_response"] = f"🚨 Invalid Output:\n\n{response.text}"
-                  return
+                  return f"🚨 Invalid Output:\n\n{response.text}"
 
             # --- D1 STATE TRANSITIONS ---
             if is_digital_one:
                 markdown_part = response_json.get("markdown_content", "")
                 self.accumulated_doc_content += "\n\n" + markdown_part
+                # Summarized in the background while the next stage runs, so later stages can send the summary instead
+                self.stage_outputs.append((self.state, markdown_part))
+                if self.state != "EPIC_BREAKDOWN":
+                    self.memory.note_stage(session_data, self.state, markdown_part)
                 
                 if self.state == "REQ_ANALYSIS":
                     self.state = "SCOPE_IMPACT"
-                    session_data["last_agent_response"] = f"✅ **Requirement Analysis Complete.**\n\n{markdown_part[:300]}...\n\n_Proceeding to Scope Analysis..._"
+                    return f"✅ **Requirement Analysis Complete.**\n\n{markdown_part[:300]}...\n\n_Proceeding to Scope Analysis..._"
                 elif self.state == "SCOPE_IMPACT":
                     self.state = "EPIC_BREAKDOWN"
-                    session_data["last_agent_response"] = f"✅ **Scope Analysis Complete.**\n\n{markdown_part[:300]}...\n\n_Proceeding to Epic Breakdown..._"
+                    return f"✅ **Scope Analysis Complete.**\n\n{markdown_part[:300]}...\n\n_Proceeding to Epic Breakdown..._"
                 elif self.state == "EPIC_BREAKDOWN":
                     self.state = "DONE"
                     # Save Final Doc
                     doc_filename = f"ProductSpec_{session_data['session_id']}.docx"
                     save_solution_to_doc({"markdown_report": self.accumulated_doc_content, "summary": "DigitalOne Product Spec"}, doc_filename, is_digital_one=True)
-                    session_data["last_agent_response"] = f"✅ **Process Complete!**\n\n📄 Generated: `{doc_filename}`"
-                return
+                    return f"✅ **Process Complete!**\n\n📄 Generated: `{doc_filename}`"
+                return None
 
             # --- ENSEMBLE STATE TRANSITIONS ---
             if "ask_questions" in response_json:
                 self.state = "CLARIFYING"
                 questions = "\n".join([f"* {q}" for q in response_json["ask_questions"]])
                 session_data.setdefault("conversation_history", []).append({"role": "assistant", "content": questions})
-                session_data["last_agent_response"] = f"🤖 **Questions:**\n\n{questions}"
+                return f"🤖 **Questions:**\n\n{questions}"
             
             elif "generate_solution" in response_json:
                 self.state = "DONE"
@@ -218,8 +377,8 @@ class SolvoAgent:
                 save_solution_to_doc(solution, doc_filename, is_digital_one=False)
                 
                 summary = f"✅ **Analysis Complete!**\n📄 Doc: `{doc_filename}`\n\n### Summary\n{solution.get('summary', 'N/A')}"
-                session_data["last_agent_response"] = summary
+                return summary
 
         except Exception as e:
             self.state = "DONE"
-            session_data["last_agent_response"] = f"🚨 Processing Error: {e}"
\ No newline at end of file
+            return f"🚨 Processing Error: {e}"
\ No newline at end of file
@@ -1,11 +1,10 @@
 import os
 import json
-import re
 import docx
 import sys
 from jira import JIRA
 # Use absolute imports from the project root and correct the typo
-from core.llm.ai_framework_adaptor import AIFrameworkAdapter
+from core.llm.ai_framework_adapter import AIFrameworkAdapter
 from agents.Solvo.prompts import STORY_CREATOR_PROMPT
 
 # --- CONFIGURATION ---
@@ -107,21 +106,18 @@ def main():
     prompt = f"{STORY_CREATOR_PROMPT}\n# FINALIZED DOCUMENT CONTENT\n\n{document_content}"
     
     print("⏳ Asking AI to analyze document and generate user stories...")
-    response = llm.generate_content(prompt)
+    story_json, response = llm.generate_json(prompt)
     
     if not response or not response.text:
         print("🚨 Agent returned an empty response. Cannot proceed.")
         return
         
     try:
-        # Find and parse the JSON response
-        json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
-        if not json_match:
+        if not story_json:
             print("🚨 Agent returned non-JSON. Raw response:")
             print(response.text)
             return
             
-        story_json = json.loads(json_match.group(0))
         stories_to_create = story_json.get("user_stories", [])
         
         if not stories_to_create:
@@ -1,59 +1,83 @@
+import os
 import json
-import re
-from core.llm.ai_framework_adaptor import AIFrameworkAdaptor
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from core.llm.ai_framework_adapter import stream_to_session
+from core.llm.scheduler import update_request_context
+from core.llm.prompt_budget import FIXED, HEAD, MIDDLE, USER
 from agents.Sutra.prompts import SUTRA_MASTER_PROMPT
-from core.rag.retriever import Retriever
+from agents.Sutra.validator import validate_result, SUTRA_OUTPUT_SCHEMA
+from agents.Sutra.file_tasks import extract_file_tasks
+from core.services import get_services
+
+# Files generated at the same time; the shared LLM scheduler still caps what reaches the backend
+SUTRA_FILE_CONCURRENCY = int(os.getenv("SUTRA_FILE_CONCURRENCY", "4"))
+
+def format_code_output(result_json):
+    """Renders Sutra's {"files", "explanation"} JSON as the markdown shown in the UI and handed to Pramana."""
+    files = result_json.get("files", [])
+    explanation = result_json.get("explanation", "Code generated.")
+
+    formatted_output = f"### 🧵 Implementation Complete\n*{explanation}*\n\n"
+    for file in files:
+        path = file.get('path', 'Unknown')
+        code = file.get('code_content', '')
+        action = file.get('action', 'MODIFY')
+        formatted_output += f"#### {action}: `{path}`\n```java\n{code}\n```\n\n"
+    return formatted_output
 
 class SutraAgent:
     def __init__(self, db_path, collection_name, prompt_type="coder", config=None):
         self.mode = "coder"
+        self.db_path = db_path
+        self.collection_name = collection_name
         self.config = config or {}
-        
-        # 1. Initialize Retriever for Code Context
+        # Retriever and LLM come from the shared container on first use
+        self.services = get_services()
+        self._retriever_failed = False
+        self.state = "IDLE"
+
+    @property
+    def retriever(self):
+        """Code context retriever, or None when the knowledge base cannot be opened (tried once per agent)."""
+        if self._retriever_failed:
+            return None
         try:
-            self.retriever = Retriever(db_path, collection_name)
+            return self.services.retriever(self.db_path, self.collection_name, self.config.get("knowledge_base", {}))
         except Exception as e:
-            print(f"⚠️ Retrieval init failed: {e}")
-            self.retriever = None
+            print(f"⚠️ Retrieval init failed, continuing without code context: {e}")
+            self._retriever_failed = True
+            return None
 
-        # 2. Initialize Wisdom (Optional)
-        try:
-            from core.rag.retriever import Retriever as WisdomRetriever
-            self.wisdom_retriever = WisdomRetriever(db_path, "solvo_wisdom")
-        except:
-            self.wisdom_retriever = None
-
-        # 3. Initialize Brain
-        self.llm = AIFrameworkAdaptor()
-        
-        self.state = "IDLE"
+    @property
+    def llm(self):
+        return self.services.llm()
 
     def _construct_prompt(self, task, plan_context, code_context):
-        return f"""{SUTRA_MASTER_PROMPT}
-
-# 1. THE APPROVED PLAN (IMPACT ANALYSIS)
-{plan_context}
-
-# 2. EXISTING CODE CONTEXT
-{code_context}
-
-# 3. CURRENT TASK
-{task}
-"""
-
-    def _construct_reflection_prompt(self, original_code, task):
+        """
+        Returns (system_instruction, messages). The master prompt and the plan form a prefix that
+        is identical for every task on the same plan (and for the reflection turn), so the server
+        can reuse its KV cache; only the code context and task are new.
+        Sized to the model's context window: the plan is cut in the middle, code context loses its weakest chunks.
+        """
+        prompt = self.llm.prompt_builder("Sutra")
+        prompt.add("system", SUTRA_MASTER_PROMPT, policy=FIXED)
+        prompt.add("plan", plan_context, weight=2, policy=MIDDLE, header="\n# 1. THE APPROVED PLAN (IMPACT ANALYSIS)\n")
+        prompt.add("context", code_context, weight=3, policy=HEAD, separator="\n---\n", header="# 2. EXISTING CODE CONTEXT\n", role=USER)
+        prompt.add("input", task, policy=MIDDLE, header="\n# 3. CURRENT TASK\n", role=USER)
+        return prompt.build_chat()
+
+    def _construct_reflection_prompt(self, task, diagnostics):
+        # Sent as a follow-up turn: the draft is already in the conversation, right above this message
+        problems = "\n".join(f"- {d}" for d in diagnostics)
         return f"""
 # SELF-CORRECTION TASK
-You just wrote the following code for the task: "{task}"
+The code you just wrote for the task "{task}" failed validation:
 
-```java
-{original_code}
-```
+{problems}
 
-**Critique your work:**
-1. Are there any syntax errors?
-2. Did you follow the naming conventions found in the context?
-3. Is error handling present?
+**Fix exactly these problems.** Keep everything else as it is, and keep following the naming conventions found in the context.
 
 **OUTPUT:**
 Return the **FINAL, CORRECTED** JSON object with the 'files' and 'explanation' keys. Do not explain the corrections, just provide the fixed code.
@@ -63,80 +87,150 @@ Return the **FINAL, CORRECTED** JSON object with the 'files' and 'explanation' k
         """
         user_input: The specific instruction (e.g. "Implement the User.java changes")
         session_data: Contains 'uploaded_doc_content' (the plan).
+        A plan touching several files is split into per-file tasks that are generated concurrently.
         """
         self.state = "CODING"
-        
-        # 1. Retrieve specific code context
-        code_context = self.retriever.get_context_for_request(user_input, top_k=5)
-        
-        # 2. Get the Plan
+        update_request_context(agent="Sutra", stage=self.state, session_id=session_data.get("session_id"))
         plan_context = session_data.get("uploaded_doc_content", "No plan provided.")
 
-        # 3. Construct Prompt & Generate Draft
-        full_prompt = self._construct_prompt(user_input, plan_context, code_context)
-        print("\n🧵 Sutra is weaving first draft...")
-        draft_response = self.llm.generate_content(full_prompt)
-        
+        file_tasks = extract_file_tasks(session_data)
+        if len(file_tasks) > 1:
+            self._execute_per_file(user_input, plan_context, file_tasks, session_data)
+        else:
+            self._execute_single(user_input, plan_context, session_data)
+        self.state = "DONE"
+
+    def _retrieve(self, query, top_k=5):
+        retriever = self.retriever
+        return retriever.get_context_for_request(query, top_k=top_k) if retriever else ""
+
+    def _generate(self, task, plan_context, code_context, on_token=None):
+        """
+        Draft, validate locally, and reflect only if validation found problems.
+        Returns (result_json, response_text); result_json is None if unparseable.
+        """
+        system_instruction, messages = self._construct_prompt(task, plan_context, code_context)
+        draft_json, draft_response = self.llm.chat_json(messages, system_instruction=system_instruction, schema=SUTRA_OUTPUT_SCHEMA, on_token=on_token)
         if not draft_response or not draft_response.text:
+            return None, ""
+
+        diagnostics = validate_result(draft_json)
+        if not diagnostics:
+            print("✅ Sutra draft passed validation, skipping reflection.")
+            return draft_json, draft_response.text
+
+        # Reflection Loop: a follow-up turn on the draft, listing what the validator found
+        print(f"🔁 Sutra draft has {len(diagnostics)} problem(s), reflecting: {diagnostics[:3]}")
+        update_request_context(stage="REFLECTING")
+        messages = messages + [
+            {"role": "assistant", "content": draft_response.text},
+            {"role": "user", "content": self._construct_reflection_prompt(task, diagnostics)}
+        ]
+        final_json, final_response = self.llm.chat_json(messages, system_instruction=system_instruction, schema=SUTRA_OUTPUT_SCHEMA, on_token=on_token)
+
+        # Fallback to draft if reflection fails empty or unparseable
+        if final_json is None:
+            return draft_json, draft_response.text
+        remaining = validate_result(final_json)
+        if remaining:
+            print(f"⚠️ Sutra reflection left {len(remaining)} problem(s): {remaining[:3]}")
+        return final_json, final_response.text
+
+    def generate(self, user_input, plan_context, on_token=None):
+        """Single-shot generation for the whole plan. Returns (result_json, response_text)."""
+        # 1. Retrieve specific code context
+        code_context = self._retrieve(user_input)
+
+        # 2. Generate draft and reflect
+        print("\n🧵 Sutra is weaving first draft...")
+        return self._generate(user_input, plan_context, code_context, on_token=on_token)
+
+    def _execute_single(self, user_input, plan_context, session_data):
+        result_json, response_text = self.generate(user_input, plan_context, on_token=stream_to_session(session_data))
+
+        if not response_text:
             session_data["last_agent_response"] = "🚨 Sutra returned empty response."
-            self.state = "DONE"
             return
+        if not result_json:
+            # Fallback for raw text
+            session_data["last_agent_response"] = response_text
+            return
+        self._publish(result_json, session_data)
 
-        # 4. Reflection Loop (The Upgrade)
-        print("🪞 Sutra is reviewing and polishing the code...")
-        reflection_prompt = self._construct_reflection_prompt(draft_response.text, user_input)
-        final_response = self.llm.generate_content(reflection_prompt)
-        
-        # Fallback to draft if reflection fails empty
-        response_text = final_response.text if (final_response and final_response.text) else draft_response.text
-
-        # 5. Parse Output
-        try:
-            def extract_json(text):
-                text = text.strip()
-                s = text.find('{')
-                if s == -1: return None
-                balance = 0
-                escape = False
-                in_str = False
-                for i in range(s, len(text)):
-                    char = text[i]
-                    if char == '"' and not escape: in_str = not in_str
-                    if not in_str:
-                        if char == '{': balance += 1
-                        elif char == '}': balance -= 1
-                    if char == '\\' and not escape: escape = True
-                    else: escape = False
-                    if balance == 0: return json.loads(text[s:i+1])
-                return None
-
-            result_json = extract_json(response_text)
-            
+    def generate_file(self, user_input, plan_context, file_task):
+        """
+        Generates one file of the plan: file_task is {"path", "instruction"} (see extract_file_tasks).
+        Returns (result_json, response_text); result_json is None if nothing usable came back.
+        """
+        path = file_task["path"]
+        update_request_context(stage="CODING", file=path)
+        task = f"{user_input}\n\nImplement ONLY the changes for `{path}`."
+        if file_task["instruction"]:
+            task += f"\nPlanned change:\n{file_task['instruction']}"
+        task += f"\nReturn the JSON object with exactly one entry in 'files', for `{path}`."
+
+        # Focused context: the file itself and what the change touches
+        code_context = self._retrieve(f"{path} {file_task['instruction']}".strip())
+        return self._generate(task, plan_context, code_context)
+
+    def _generate_file(self, index, total, user_input, plan_context, file_task, progress):
+        path = file_task["path"]
+        result_json, response_text = self.generate_file(user_input, plan_context, file_task)
+        progress(f"{'✅' if result_json else '⚠️'} `{path}` ({index + 1}/{total})\n")
+        return path, result_json, response_text
+
+    def _execute_per_file(self, user_input, plan_context, file_tasks, session_data):
+        total = len(file_tasks)
+        print(f"\n🧵 Sutra is weaving {total} files ({min(total, SUTRA_FILE_CONCURRENCY)} at a time)...")
+        # Concurrent generations can't share one token stream, so the UI shows per-file progress instead
+        on_token = stream_to_session(session_data)
+        lock = threading.Lock()
+        def progress(line):
+            with lock:
+                on_token(line)
+        progress(f"Generating {total} files...\n")
+
+        with ThreadPoolExecutor(max_workers=min(total, SUTRA_FILE_CONCURRENCY)) as executor:
+            # Each task runs in a copy of this thread's context so scheduler/telemetry tags carry over
+            futures = [
+                executor.submit(contextvars.copy_context().run, self._generate_file, i, total, user_input, plan_context, file_task, progress)
+                for i, file_task in enumerate(file_tasks)
+            ]
+            results = []
+            for i, (file_task, future) in enumerate(zip(file_tasks, futures)):
+                # One file's error must not cost the others their results
+                try:
+                    results.append(future.result() + (None,))
+                except Exception as e:
+                    print(f"🚨 Sutra failed on `{file_task['path']}`: {e}")
+                    progress(f"🚨 `{file_task['path']}` ({i + 1}/{total}): {e}\n")
+                    results.append((file_task["path"], None, "", e))
+
+        # Merge into the single-shot output shape
+        files, explanations, failed = {}, [], []
+        for path, result_json, response_text, error in results:
             if not result_json:
-                 # Fallback for raw text
-                 session_data["last_agent_response"] = response_text
-                 self.state = "DONE"
-                 return
-
-            # Format the output for the UI
-            files = result_json.get("files", [])
-            explanation = result_json.get("explanation", "Code generated.")
-            
-            formatted_output = f"### 🧵 Implementation Complete\n*{explanation}*\n\n"
-            
-            for file in files:
-                path = file.get('path', 'Unknown')
-                code = file.get('code_content', '')
-                action = file.get('action', 'MODIFY')
-                formatted_output += f"#### {action}: `{path}`\n```java\n{code}\n```\n\n"
+                failed.append(f"`{path}` ({error})" if error else f"`{path}`")
+                continue
+            for file in result_json.get("files", []):
+                files[file.get("path", path)] = file
+            if result_json.get("explanation"):
+                explanations.append(f"`{path}`: {result_json['explanation']}")
+        if failed:
+            explanations.append("Could not generate: " + ", ".join(failed))
+
+        if not files:
+            session_data["last_agent_response"] = "🚨 Sutra returned empty response."
+            return
+        self._publish({"files": list(files.values()), "explanation": " ".join(explanations) or "Code generated."}, session_data)
 
+    def _publish(self, result_json, session_data):
+        try:
+            formatted_output = format_code_output(result_json)
             session_data["last_agent_response"] = formatted_output
             
             # Store code for Pramana (QA) to pick up later
             session_data["generated_code_context"] = formatted_output
-            
-            self.state = "DONE"
 
         except Exception as e:
-            session_data["last_agent_response"] = f"🚨 Sutra Error: {e}\nRaw: {response_text}"
-            self.state = "DONE"
\ No newline at end of file
+            session_data["last_agent_response"] = f"🚨 Sutra Error: {e}\nRaw: {json.dumps(result_json)}"
@@ -0,0 +1,33 @@
+import re
+
+# Source-file paths mentioned in a free-text plan (longest extensions first so .cpp wins over .c)
+CODE_EXTENSIONS = ["java", "py", "cpp", "hpp", "cc", "c", "h", "ppc", "pc", "ph", "cbl", "cob", "pco", "sh", "ksh", "js", "ts", "xml", "sql"]
+_EXTENSIONS = "|".join(sorted(CODE_EXTENSIONS, key=len, reverse=True))
+# A path needs a directory (src/app.py) or, for a bare file name, inline-code backticks (`app.py`):
+# prose such as "Node.js" or "java.sql.Timestamp" is neither. A dotted name that goes on (.Timestamp) is not a file.
+FILE_PATH_PATTERN = re.compile(
+    r'(?<![\w/.-])((?:[\w.-]+/)+[\w-]+\.(?:' + _EXTENSIONS + r'))(?!\w|\.\w)'
+    r'|`([\w-]+\.(?:' + _EXTENSIONS + r'))`'
+)
+
+def extract_file_tasks(session_data):
+    """
+    Splits the approved plan into per-file tasks: [{"path", "instruction"}].
+    Uses Solvo's structured code_changes when available, otherwise file paths found in the plan text.
+    """
+    solution = session_data.get("final_solution") or {}
+    tasks, seen = [], set()
+    for change in solution.get("code_changes", []) if isinstance(solution, dict) else []:
+        path = change.get("file_path")
+        if path and path not in seen:
+            seen.add(path)
+            tasks.append({"path": path, "instruction": change.get("diff", "")})
+    if tasks:
+        return tasks
+
+    for match in FILE_PATH_PATTERN.finditer(session_data.get("uploaded_doc_content") or ""):
+        path = match.group(1) or match.group(2)
+        if path not in seen:
+            seen.add(path)
+            tasks.append({"path": path, "instruction": ""})
+    return tasks
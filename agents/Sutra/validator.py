@@ -0,0 +1,120 @@
+import os
+
+# Tree-sitter grammar per file extension. C++ sources get the C++ grammar (the C grammar turns every
+# class, namespace and template into an ERROR node). '.h' is left out: it may be C or C++.
+# Pro*C and COBOL have no grammar.
+TREE_SITTER_GRAMMARS = {
+    ".java": "java",
+    ".py": "python",
+    ".c": "c",
+    ".cpp": "cpp", ".hpp": "cpp", ".cc": "cpp", ".cxx": "cpp", ".hh": "cpp", ".h++": "cpp",
+    ".sh": "bash", ".ksh": "bash", ".bash": "bash",
+}
+VALID_ACTIONS = ("CREATE", "MODIFY")
+
+# Requested from providers that support constrained output; check_schema() verifies it either way
+SUTRA_OUTPUT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "files": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "path": {"type": "string"},
+                    "action": {"type": "string", "enum": list(VALID_ACTIONS)},
+                    "code_content": {"type": "string"}
+                },
+                "required": ["path", "action", "code_content"]
+            }
+        },
+        "explanation": {"type": "string"}
+    },
+    "required": ["files", "explanation"]
+}
+MAX_DIAGNOSTICS_PER_FILE = 10
+
+_PARSERS = {}
+
+def grammar_for(path):
+    """Tree-sitter grammar name for a file path, or None when its syntax is not checked."""
+    return TREE_SITTER_GRAMMARS.get(os.path.splitext(path)[1].lower())
+
+def _get_parser(grammar):
+    """Cached tree-sitter parser for a grammar name, or None when unavailable."""
+    if not grammar:
+        return None
+    if grammar not in _PARSERS:
+        try:
+            from tree_sitter_languages import get_parser
+            _PARSERS[grammar] = get_parser(grammar)
+        except Exception as e:
+            print(f"⚠️ Syntax check unavailable for {grammar}: {e}")
+            _PARSERS[grammar] = None
+    return _PARSERS[grammar]
+
+def check_schema(result_json):
+    """Diagnostics for a parsed Sutra response that does not match the 'files' / 'explanation' format."""
+    if not isinstance(result_json, dict):
+        return ["Response is not a JSON object."]
+    files = result_json.get("files")
+    if not isinstance(files, list) or not files:
+        return ["'files' must be a non-empty list."]
+
+    diagnostics = []
+    for i, file in enumerate(files):
+        if not isinstance(file, dict):
+            diagnostics.append(f"files[{i}] is not an object.")
+            continue
+        if not isinstance(file.get("path"), str) or not file["path"].strip():
+            diagnostics.append(f"files[{i}] has no 'path'.")
+        if not isinstance(file.get("code_content"), str) or not file["code_content"].strip():
+            diagnostics.append(f"files[{i}] ({file.get('path', '?')}) has no 'code_content'.")
+        if file.get("action", "MODIFY") not in VALID_ACTIONS:
+            diagnostics.append(f"files[{i}] ({file.get('path', '?')}) has action '{file.get('action')}'; expected CREATE or MODIFY.")
+    if "explanation" in result_json and not isinstance(result_json["explanation"], str):
+        diagnostics.append("'explanation' must be a string.")
+    return diagnostics
+
+def check_syntax(path, code):
+    """
+    Parses `code` with the tree-sitter grammar for `path` and reports ERROR and MISSING nodes
+    as 'path:line:col: ...'. Files without a grammar (or without tree-sitter installed) pass.
+    """
+    parser = _get_parser(grammar_for(path))
+    if parser is None:
+        return []
+
+    source = bytes(code, "utf8")
+    tree = parser.parse(source)
+    if not tree.root_node.has_error:
+        return []
+
+    diagnostics = []
+    stack = [tree.root_node]
+    while stack and len(diagnostics) < MAX_DIAGNOSTICS_PER_FILE:
+        node = stack.pop()
+        line, col = node.start_point[0] + 1, node.start_point[1] + 1
+        if node.is_missing:
+            diagnostics.append(f"{path}:{line}:{col}: missing '{node.type}'")
+        elif node.type == "ERROR":
+            snippet = source[node.start_byte:node.end_byte].decode("utf8", "replace").strip().splitlines()
+            diagnostics.append(f"{path}:{line}:{col}: syntax error near `{snippet[0][:60] if snippet else ''}`")
+            continue # Its children are part of the same error
+        if node.has_error:
+            stack.extend(reversed(node.children))
+    return diagnostics
+
+def validate_result(result_json):
+    """
+    Local check of a parsed Sutra draft (None if the response had no usable JSON) before deciding
+    whether a reflection turn is needed. An empty list means the draft can be used as is.
+    """
+    if result_json is None:
+        return ["Response contains no valid JSON object."]
+    diagnostics = check_schema(result_json)
+    if diagnostics:
+        return diagnostics
+    for file in result_json["files"]:
+        diagnostics.extend(check_syntax(file["path"], file["code_content"]))
+    return diagnostics
@@ -1,55 +1,295 @@
 import os
+import time
+import asyncio
 from .google_gemini_adapter import GeminiAdapter
 from .ollama_adapter import OllamaAdapter
+from .llm_interface import pop_usage
+from .prompt_budget import PromptBuilder
+from .router import HedgedRouter
+from .http_client import close_async_clients
+from .stub_provider import StubProvider
+from .structured_output import get_response_format, generate_json, chat_json
+from .response_cache import ResponseCache, get_response_cache
+from .telemetry import get_telemetry
+from .token_utils import estimate_tokens
 
 # Simple wrapper to match your existing code's expected response format (response.text)
 class AIResponse:
     def __init__(self, text):
         self.text = text
 
+def stream_to_session(session_data, key="streaming_response"):
+    """
+    Returns an on_token callback that accumulates partial text in session_data[key],
+    where the web UI picks it up and renders it while the agent thread is still running.
+    """
+    session_data[key] = ""
+    def on_token(fragment):
+        session_data[key] += fragment
+    return on_token
+
 class AIFrameworkAdapter:
-    def __init__(self):
-        # Configuration Strategy:
-        
-        self.provider_type = os.getenv("SPECTRA_LLM_PROVIDER", "").lower()
-        self.gemini_key = os.getenv("GEMINI_API_KEY")
-        self.provider_type = os.getenv("SPECTRA_LLM_PROVIDER", "vertex").lower()
-        
-        if self.provider_type == "vertex":
-             from .vertex_ai_adapter import VertexAIAdapter
-             print("🧠 Brain: Google Vertex AI (GCP Native)")
-             self.client = VertexAIAdapter(
-                 project_id=os.getenv("GCP_PROJECT_ID"),
-                 model_name=os.getenv("VERTEX_MODEL", "gemini-1.5-flash-001")
-             )
-        
-        # Auto-detect logic if not explicitly set
-        if not self.provider_type:
-            if self.gemini_key:
-                self.provider_type = "gemini"
-            else:
-                self.provider_type = "ollama"
+    def __init__(self, client=None):
+        """
+        Provider selection:
+        - `client`: use this LLMProvider as is (e.g. a StubProvider in tests).
+        - SPECTRA_LLM_ROUTING="ollama,gemini": hedged routing over the listed providers, in order.
+        - SPECTRA_LLM_PROVIDER: vertex, gemini, ollama or stub.
+        - Otherwise auto-detect: Vertex if GCP_PROJECT_ID is set, Gemini if GEMINI_API_KEY is set, else Ollama.
+        """
+        routing = [name.strip().lower() for name in os.getenv("SPECTRA_LLM_ROUTING", "").split(",") if name.strip()]
+
+        if client is not None:
+            self.provider_type = client.backend_name or type(client).__name__
+            self.client = client
+        elif routing:
+            self.provider_type = "router"
+            self.client = self._build_router(routing)
+        else:
+            self.provider_type = os.getenv("SPECTRA_LLM_PROVIDER", "").lower()
+            if not self.provider_type:
+                if os.getenv("GCP_PROJECT_ID"):
+                    self.provider_type = "vertex"
+                elif os.getenv("GEMINI_API_KEY"):
+                    self.provider_type = "gemini"
+                else:
+                    self.provider_type = "ollama"
+            self.client = self._build_provider(self.provider_type)
 
-        # Initialize the chosen provider
-        if self.provider_type == "gemini":
+        # Opt-in response cache (SPECTRA_LLM_CACHE=1), shared by every adapter in the process
+        self.cache = get_response_cache()
+        # Per-call metrics (data/llm_metrics.jsonl); disable with SPECTRA_LLM_METRICS=0
+        self.telemetry = get_telemetry()
+
+    def _build_provider(self, name):
+        if name == "vertex":
+            from .vertex_ai_adapter import VertexAIAdapter
+            print("🧠 Brain: Google Vertex AI (GCP Native)")
+            return VertexAIAdapter(
+                project_id=os.getenv("GCP_PROJECT_ID"),
+                model_name=os.getenv("VERTEX_MODEL", "gemini-1.5-flash-001")
+            )
+        if name == "gemini":
             print("🧠 Brain: Google Gemini (Cloud)")
-            self.client = GeminiAdapter(
-                api_key=self.gemini_key,
+            return GeminiAdapter(
+                api_key=os.getenv("GEMINI_API_KEY"),
                 model_name=os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
             )
-        else:
-            host = os.getenv("OLLAMA_HOST", "http://localhost:11434")
-            print(f"🧠 Brain: Ollama (Local/Server) [{host}]")
-            self.client = OllamaAdapter(
-                base_url=host,
-                model_name=os.getenv("OLLAMA_MODEL", "llama3:8b")
-            )
+        if name == "stub":
+            print("🧠 Brain: Stub provider (offline)")
+            return StubProvider()
+        if name != "ollama":
+            raise ValueError(f"Unknown LLM provider '{name}'. Use vertex, gemini, ollama or stub.")
+        host = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+        print(f"🧠 Brain: Ollama (Local/Server) [{host}]")
+        return OllamaAdapter(
+            base_url=host,
+            model_name=os.getenv("OLLAMA_MODEL", "llama3:8b")
+        )
+
+    def _build_router(self, names):
+        providers = []
+        for name in names:
+            try:
+                providers.append((name, self._build_provider(name)))
+            except Exception as e:
+                print(f"⚠️ Skipping provider '{name}' for routing: {e}")
+        slo = float(os.getenv("SPECTRA_LLM_HEDGE_SLO", "10"))
+        print(f"🔀 Routing: {' → '.join(name for name, _ in providers)} (hedge after {slo}s without a first token)")
+        return HedgedRouter(providers, slo_seconds=slo)
+
+    def _collect(self, fragments, on_token):
+        parts = []
+        for fragment in fragments:
+            parts.append(fragment)
+            on_token(fragment)
+        return "".join(parts)
+
+    def _cache_lookup(self, kind, content, system_instruction, use_cache):
+        """Returns (key, cached_text). key is None when the cache is disabled or bypassed."""
+        if not (self.cache and use_cache):
+            return None, None
+        key = ResponseCache.make_key(
+            self.provider_type,
+            getattr(self.client, "model_name", None),
+            getattr(self.client, "options", None),
+            system_instruction,
+            # JSON mode / schema changes what comes back for the same prompt
+            {"kind": kind, "content": content, **({"format": get_response_format()} if get_response_format() else {})}
+        )
+        cached_text = self.cache.get(key)
+        if cached_text is not None:
+            stats = self.cache.stats()
+            print(f"⚡ LLM cache hit (hit rate {stats['hit_rate']:.0%}, {stats['saved_seconds']}s saved so far)")
+        return key, cached_text
+
+    def _record(self, kind, content, system_instruction, text, latency, queue_wait=None, ttft=None, cache_hit=False, error=None):
+        """
+        Writes one telemetry record. Token counts come from the provider when it reported them.
+        prompt_tokens is the whole prompt; prompt_eval_tokens the part the server had to process (not KV-cached).
+        Returns the call's error, if any: the provider may have failed or cut the stream short after partial output.
+        """
+        usage = pop_usage()
+        error = error or usage.get("error") or (None if text else "empty_response")
+        if not self.telemetry:
+            return error
+        prompt_tokens = usage.get("prompt_tokens")
+        completion_tokens = usage.get("completion_tokens")
+        self.telemetry.record(
+            kind=kind,
+            provider=self.provider_type,
+            model=getattr(self.client, "model_name", None),
+            prompt_tokens=prompt_tokens if prompt_tokens is not None else estimate_tokens(content) + estimate_tokens(system_instruction),
+            completion_tokens=completion_tokens if completion_tokens is not None else estimate_tokens(text),
+            tokens_estimated=prompt_tokens is None or completion_tokens is None,
+            queue_wait=queue_wait if queue_wait is not None else usage.get("queue_wait"),
+            ttft=ttft,
+            latency=latency,
+            prompt_eval_seconds=usage.get("prompt_eval_seconds"),
+            prompt_eval_tokens=usage.get("prompt_eval_tokens"),
+            routed_to=usage.get("routed_to"),
+            hedges=usage.get("hedges"),
+            cache_hit=cache_hit,
+            error=error
+        )
+        return error
+
+    def _run(self, kind, content, system_instruction, on_token, use_cache):
+        """Dispatches a generate/chat call, serving it from the response cache when possible."""
+        t0 = time.perf_counter()
+        key, cached_text = self._cache_lookup(kind, content, system_instruction, use_cache)
+        if cached_text is not None:
+            if on_token:
+                on_token(cached_text)
+            self._record(kind, content, system_instruction, cached_text, time.perf_counter() - t0, cache_hit=True)
+            return AIResponse(cached_text)
+
+        pop_usage() # Discard anything left over from an earlier call on this thread
+        first_token_at = []
+        def forward(fragment):
+            if not first_token_at:
+                first_token_at.append(time.perf_counter())
+            on_token(fragment)
+
+        ticket, text_response = None, ""
+        try:
+            # Every call waits for a slot on the shared scheduler so overlapping users don't thrash the backend
+            with self.client.slot() as ticket:
+                t0 = time.perf_counter()
+                if kind == "generate":
+                    if on_token:
+                        text_response = self._collect(self.client.generate_content_stream(content, system_instruction), forward)
+                    else:
+                        text_response = self.client.generate_content(content, system_instruction)
+                else:
+                    if on_token:
+                        text_response = self._collect(self.client.chat_stream(content, system_instruction), forward)
+                    else:
+                        text_response = self.client.chat(content, system_instruction)
+        except Exception as e:
+            self._record(kind, content, system_instruction, "", time.perf_counter() - t0,
+                         queue_wait=ticket.wait_seconds if ticket else None, error=str(e))
+            raise
+
+        latency = time.perf_counter() - t0
+        error = self._record(kind, content, system_instruction, text_response, latency, queue_wait=ticket.wait_seconds,
+                             ttft=(first_token_at[0] - t0) if first_token_at else None)
+        # Partial output of a failed or cut-short call is returned, but never cached
+        if key and not error:
+            self.cache.put(key, text_response, latency)
+        return AIResponse(text_response)
+
+    async def _arun(self, kind, content, system_instruction, use_cache):
+        t0 = time.perf_counter()
+        key, cached_text = self._cache_lookup(kind, content, system_instruction, use_cache)
+        if cached_text is not None:
+            self._record(kind, content, system_instruction, cached_text, time.perf_counter() - t0, cache_hit=True)
+            return AIResponse(cached_text)
+
+        pop_usage()
+        t0 = time.perf_counter()
+        try:
+            if kind == "generate":
+                text_response = await self.client.agenerate_content(content, system_instruction)
+            else:
+                text_response = await self.client.achat(content, system_instruction)
+        except Exception as e:
+            self._record(kind, content, system_instruction, "", time.perf_counter() - t0, error=str(e))
+            raise
 
-    def generate_content(self, prompt, system_instruction=None):
-        """Standardized method called by Agents."""
-        text_response = self.client.generate_content(prompt, system_instruction)
+        # Includes the scheduler wait, which the provider reports as queue_wait
+        latency = time.perf_counter() - t0
+        error = self._record(kind, content, system_instruction, text_response, latency)
+        if key and not error:
+            self.cache.put(key, text_response, latency)
         return AIResponse(text_response)
 
-    def chat(self, messages, system_instruction=None):
-        text_response = self.client.chat(messages, system_instruction)
-        return AIResponse(text_response)
\ No newline at end of file
+    def generate_content(self, prompt, system_instruction=None, on_token=None, use_cache=True):
+        """
+        Standardized method called by Agents.
+        If on_token is given, the response is streamed and every fragment is forwarded to it.
+        Pass use_cache=False to force a fresh generation when the response cache is enabled.
+        """
+        return self._run("generate", prompt, system_instruction, on_token, use_cache)
+
+    def chat(self, messages, system_instruction=None, on_token=None, use_cache=True):
+        return self._run("chat", messages, system_instruction, on_token, use_cache)
+
+    async def agenerate_content(self, prompt, system_instruction=None, use_cache=True):
+        """
+        Async counterpart of generate_content(). In-flight requests are capped per backend
+        (SPECTRA_LLM_MAX_CONCURRENCY), so callers can gather many of them safely.
+        """
+        return await self._arun("generate", prompt, system_instruction, use_cache)
+
+    async def achat(self, messages, system_instruction=None, use_cache=True):
+        return await self._arun("chat", messages, system_instruction, use_cache)
+
+    def generate_many(self, prompts, system_instruction=None, use_cache=True):
+        """
+        Runs independent prompts concurrently and returns their responses in order.
+        Meant for agent threads, which have no running event loop of their own.
+        """
+        async def _gather():
+            try:
+                return await asyncio.gather(*(self.agenerate_content(p, system_instruction, use_cache) for p in prompts))
+            finally:
+                # The loop ends with this call; its pooled connections would otherwise never be closed
+                await close_async_clients()
+        return asyncio.run(_gather())
+
+    def generate_json(self, prompt, system_instruction=None, schema=None, on_token=None, use_cache=True):
+        """
+        generate_content() with JSON output requested from the provider (Ollama `format`, Gemini
+        response_mime_type / response_schema). Returns (parsed_object_or_None, response); a malformed
+        answer gets one short repair call instead of a full regeneration.
+        """
+        return generate_json(self, prompt, system_instruction, schema, on_token, use_cache)
+
+    def chat_json(self, messages, system_instruction=None, schema=None, on_token=None, use_cache=True):
+        return chat_json(self, messages, system_instruction, schema, on_token, use_cache)
+
+    @property
+    def context_window(self):
+        return self.client.context_window
+
+    def prompt_builder(self, name="prompt"):
+        """A PromptBuilder sized for the active model's context window."""
+        return PromptBuilder(self.context_window, name=name)
+
+    def metrics_summary(self, group_by=("agent", "stage")):
+        """p50/p95 latency, TTFT, queue wait and token totals per agent and stage, or None when metrics are off."""
+        return self.telemetry.summary(group_by) if self.telemetry else None
+
+    def cache_stats(self):
+        """Hit rate and generation time saved by the response cache, or None when it is disabled."""
+        return self.cache.stats() if self.cache else None
+
+    def generate_content_stream(self, prompt, system_instruction=None):
+        """Yields raw text fragments as the provider produces them."""
+        with self.client.slot():
+            yield from self.client.generate_content_stream(prompt, system_instruction)
+
+    def chat_stream(self, messages, system_instruction=None):
+        with self.client.slot():
+            yield from self.client.chat_stream(messages, system_instruction)
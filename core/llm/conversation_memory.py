@@ -0,0 +1,153 @@
+import os
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from .prompt_budget import FIXED, MIDDLE, USER
+from .scheduler import update_request_context, BATCH
+
+DEFAULT_KEEP_TURNS = int(os.getenv("SPECTRA_MEMORY_KEEP_TURNS", "6"))
+DEFAULT_KEEP_STAGES = int(os.getenv("SPECTRA_MEMORY_KEEP_STAGES", "1"))
+
+# Where summaries live in session_data, so they are saved and reloaded with the session
+SUMMARIES_KEY = "memory_summaries"
+
+SUMMARY_PROMPT = """You compress the working memory of an analysis assistant.
+Write a concise summary of the material below that keeps every decision, requirement, assumption,
+answered question, file or component name and open issue. Drop pleasantries and repetition.
+Return only the summary as plain markdown bullets."""
+
+_SUMMARY_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory-summary")
+
+class ConversationMemory:
+    """
+    Keeps long sessions at a roughly constant prompt size.
+
+    Conversation history: the last `keep_turns` messages stay verbatim. Older messages are folded
+    into one rolling summary, refreshed in the background whenever another `keep_turns` messages
+    have aged out. Until a refresh lands, the not-yet-summarized turns are sent verbatim, so
+    nothing is ever lost: the verbatim part therefore grows to about 2 x keep_turns messages
+    before each refresh (more only while a refresh is still running), then drops back.
+
+    Stage outputs (e.g. DigitalOne reports): each output is summarized in the background as soon as
+    it is produced; prompts get the last `keep_stages` outputs verbatim and summaries of the rest
+    (or the full text, if a summary is not ready yet).
+
+    Summaries are cached in session_data[SUMMARIES_KEY]. Background jobs never touch session_data
+    (the UI may be serializing it): they leave their results here, and the caller's thread copies
+    them in on its next call.
+    """
+
+    def __init__(self, llm, keep_turns=DEFAULT_KEEP_TURNS, keep_stages=DEFAULT_KEEP_STAGES):
+        self.llm = llm
+        self.keep_turns = max(2, keep_turns)
+        self.keep_stages = max(0, keep_stages)
+        self._pending = set()
+        self._results = {}  # (session, key) -> finished summary entry, not yet copied into session_data
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _session(session_data):
+        return session_data.get("session_id") or id(session_data)
+
+    def _summaries(self, session_data):
+        """session_data's summaries, with the results of finished background jobs copied in."""
+        session = self._session(session_data)
+        with self._lock:
+            done = {key: entry for (s, key), entry in self._results.items() if s == session}
+            for key in done:
+                del self._results[(session, key)]
+        summaries = session_data.get(SUMMARIES_KEY) or {}
+        if done or SUMMARIES_KEY not in session_data:
+            # A new dict rather than an in-place update: a save in progress keeps iterating the old one
+            summaries = {**summaries, **done}
+            session_data[SUMMARIES_KEY] = summaries
+        return summaries
+
+    def _submit(self, session_data, key, job):
+        """
+        Runs job() in the background once per (session, key); it is tagged as batch work in the
+        caller's context. A non-None return value is stored as summaries[key].
+        """
+        token = (self._session(session_data), key)
+        with self._lock:
+            if token in self._pending:
+                return
+            self._pending.add(token)
+
+        def run():
+            update_request_context(stage="SUMMARIZING", priority=BATCH)
+            try:
+                entry = job()
+                if entry is not None:
+                    with self._lock:
+                        self._results[token] = entry
+            except Exception as e:
+                print(f"⚠️ Memory summary '{key}' failed: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(token)
+
+        _SUMMARY_EXECUTOR.submit(contextvars.copy_context().run, run)
+
+    def _summarize(self, material, previous=""):
+        prompt = self.llm.prompt_builder("Memory summary")
+        prompt.add("previous", previous, policy=FIXED, header="# SUMMARY SO FAR\n" if previous else "")
+        prompt.add("material", material, policy=MIDDLE, header="# NEW MATERIAL\n", role=USER)
+        response = self.llm.generate_content(prompt.build(), system_instruction=SUMMARY_PROMPT)
+        return response.text.strip() if response and response.text else None
+
+    def history(self, session_data, name, messages, pin_first=False):
+        """
+        Returns (summary, messages): the summary of aged-out turns ("" if none yet) and the
+        messages to send verbatim. pin_first keeps the opening message verbatim forever.
+        """
+        messages = list(messages)
+        head, rest = (messages[:1], messages[1:]) if pin_first else ([], messages)
+        summaries = self._summaries(session_data)
+        cached = summaries.get(name) or {}
+        covered = cached.get("covered", 0)
+        if covered > len(rest): # History was reset
+            cached, covered = {}, 0
+
+        # Fold in aged-out turns in batches (an even count keeps user/assistant pairs together)
+        aged = len(rest) - self.keep_turns
+        aged -= aged % 2
+        if aged - covered >= self.keep_turns:
+            previous = cached.get("summary", "")
+            material = "\n".join(f"[{m['role']}]: {m['content']}" for m in rest[covered:aged])
+
+            def job():
+                summary = self._summarize(material, previous)
+                if summary:
+                    print(f"🧠 Memory '{name}': {aged} older turns summarized")
+                    return {"covered": aged, "summary": summary}
+            self._submit(session_data, name, job)
+
+        return cached.get("summary", ""), head + rest[covered:]
+
+    def note_stage(self, session_data, stage, text):
+        """Starts summarizing a finished stage output in the background."""
+        summaries = self._summaries(session_data)
+        key = f"stage:{stage}"
+        if not text or summaries.get(key, {}).get("length") == len(text):
+            return
+
+        def job():
+            summary = self._summarize(text)
+            if summary:
+                print(f"🧠 Memory: stage {stage} summarized ({len(text)} → {len(summary)} chars)")
+                return {"length": len(text), "summary": summary}
+        self._submit(session_data, key, job)
+
+    def stage_context(self, session_data, stages):
+        """stages: ordered [(stage, text)]. Returns the text to send: older stages summarized, recent ones verbatim."""
+        summaries = self._summaries(session_data)
+        recent_from = len(stages) - self.keep_stages
+        parts = []
+        for i, (stage, text) in enumerate(stages):
+            cached = summaries.get(f"stage:{stage}", {})
+            if i < recent_from and cached.get("length") == len(text):
+                parts.append(f"## {stage} (summary)\n{cached['summary']}")
+            else:
+                parts.append(text)
+        return "\n\n".join(parts)
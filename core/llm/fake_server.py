@@ -0,0 +1,215 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Canned responses in the shapes the agents parse (see the OUTPUT FORMAT sections of their prompts)
+CANNED_RESPONSES = {
+    "solvo_questions": {
+        "ask_questions": [
+            "1. Should the change apply to existing customers or only to new orders?",
+            "2. Is the new behaviour behind a feature flag?"
+        ]
+    },
+    "solvo_solution": {
+        "generate_solution": {
+            "summary": "Add a loyalty discount to the order pricing flow.",
+            "assumptions": ["Existing customers are included.", "No feature flag is required."],
+            "impact_analysis": "Impacts `billing/src/main/java/com/example/billing/PricingService.java`.",
+            "user_stories": [
+                {"title": "As a customer, I want my loyalty discount applied at checkout.", "acceptance_criteria": ["GIVEN a loyal customer WHEN pricing THEN the discount is applied"]}
+            ],
+            "code_changes": [
+                {"file_path": "billing/src/main/java/com/example/billing/PricingService.java", "diff": "+ applyLoyaltyDiscount(order);"},
+                {"file_path": "billing/src/main/java/com/example/billing/DiscountService.java", "diff": "+ public Money loyaltyDiscount(Order order) { ... }"}
+            ],
+            "doc_changes": []
+        }
+    },
+    "d1": {
+        "markdown_content": "# Analysis Report\n\n| Req ID | Requirement | Status |\n|---|---|---|\n| REQ-001 | Loyalty discount | OOB |\n"
+    },
+    "sutra": {
+        "files": [
+            {
+                "path": "billing/src/main/java/com/example/billing/DiscountService.java",
+                "action": "MODIFY",
+                "code_content": "public class DiscountService {\n    public Money loyaltyDiscount(Order order) {\n        if (order == null) { throw new IllegalArgumentException(\"order\"); }\n        return order.total().multiply(0.05);\n    }\n}\n"
+            }
+        ],
+        "explanation": "Adds the loyalty discount calculation."
+    },
+    "pramana": {
+        "test_files": [
+            {
+                "path": "billing/src/test/java/com/example/billing/DiscountServiceTest.java",
+                "code_content": "class DiscountServiceTest {\n    @Test\n    void appliesLoyaltyDiscount() { }\n}\n"
+            }
+        ],
+        "test_plan_summary": "Covers the loyalty discount calculation."
+    },
+    "archivist": "The pricing flow lives in `PricingService.applyPricing()`.\n\n**Sources:**\n- `billing/src/main/java/com/example/billing/PricingService.java`"
+}
+
+def pick_response(prompt, assistant_turns=0):
+    """Chooses a canned response from markers in the prompt (system + messages)."""
+    if '"test_files"' in prompt:
+        return CANNED_RESPONSES["pramana"]
+    if '"files"' in prompt and '"code_content"' in prompt:
+        return CANNED_RESPONSES["sutra"]
+    if '"markdown_content"' in prompt:
+        return CANNED_RESPONSES["d1"]
+    if '"ask_questions"' in prompt:
+        # Ask once, then answer with a solution on the follow-up turn
+        return CANNED_RESPONSES["solvo_solution"] if assistant_turns else CANNED_RESPONSES["solvo_questions"]
+    return CANNED_RESPONSES["archivist"]
+
+class FakeOllamaServer:
+    """
+    Stand-in for an Ollama server, for load tests without a GPU.
+    Speaks /api/generate, /api/chat (streaming NDJSON or buffered) and /api/tags.
+
+    Timing model: `first_token_delay` seconds of fixed overhead, prompt processing at
+    `prompt_tokens_per_second` for the part of the prompt not shared with the previous
+    request (a one-slot KV cache, like Ollama's), then output at `tokens_per_second`.
+    """
+
+    def __init__(self, host="127.0.0.1", port=11435, first_token_delay=0.2, tokens_per_second=50.0, prompt_tokens_per_second=2000.0):
+        self.first_token_delay = first_token_delay
+        self.tokens_per_second = tokens_per_second
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.requests = 0
+        self._last_prompt = ""
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serves in a background thread; returns self so it can be used inline."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        print(f"🧪 Fake Ollama server listening on {self.url}")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _uncached_tokens(self, prompt):
+        """Tokens that would need prompt processing, given the previous request's prompt."""
+        with self._lock:
+            self.requests += 1
+            prefix = os.path.commonprefix([prompt, self._last_prompt])
+            self._last_prompt = prompt
+        return max(1, (len(prompt) - len(prefix)) // 4)
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass # Keep load-test output readable
+
+            def _send_json(self, status, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._send_json(200, {"models": [{"name": "fake:latest"}]})
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError:
+                    self._send_json(400, {"error": "invalid JSON"})
+                    return
+
+                if self.path == "/api/generate":
+                    prompt = payload.get("prompt", "")
+                    assistant_turns = 0
+                elif self.path == "/api/chat":
+                    messages = payload.get("messages", [])
+                    prompt = "\n".join(m.get("content", "") for m in messages)
+                    assistant_turns = sum(1 for m in messages if m.get("role") == "assistant")
+                else:
+                    self._send_json(404, {"error": "not found"})
+                    return
+
+                response = pick_response(prompt, assistant_turns)
+                text = response if isinstance(response, str) else json.dumps(response, indent=2)
+                prompt_eval_count = server._uncached_tokens(prompt)
+                prompt_eval_seconds = prompt_eval_count / server.prompt_tokens_per_second
+                time.sleep(server.first_token_delay + prompt_eval_seconds)
+
+                # ~4 characters per token
+                tokens = [text[i:i + 4] for i in range(0, len(text), 4)]
+                stats = {
+                    "done": True,
+                    "prompt_eval_count": prompt_eval_count,
+                    "prompt_eval_duration": int(prompt_eval_seconds * 1e9),
+                    "eval_count": len(tokens)
+                }
+                is_chat = self.path == "/api/chat"
+                wrap = (lambda t: {"message": {"role": "assistant", "content": t}}) if is_chat else (lambda t: {"response": t})
+
+                if not payload.get("stream", True):
+                    time.sleep(len(tokens) / server.tokens_per_second)
+                    self._send_json(200, {"model": payload.get("model"), **wrap(text), **stats})
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i, token in enumerate(tokens):
+                    if i:
+                        time.sleep(1.0 / server.tokens_per_second)
+                    self._write_chunk({"model": payload.get("model"), **wrap(token), "done": False})
+                self._write_chunk({"model": payload.get("model"), **wrap(""), **stats})
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _write_chunk(self, obj):
+                line = (json.dumps(obj) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(line):X}\r\n".encode("ascii") + line + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama server with canned agent responses (for load tests).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--first-token-delay", type=float, default=0.2, help="Fixed seconds before the first token.")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Output token rate.")
+    parser.add_argument("--prompt-tokens-per-second", type=float, default=2000.0, help="Prompt processing rate for uncached tokens.")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(args.host, args.port, args.first_token_delay, args.tokens_per_second, args.prompt_tokens_per_second)
+    print(f"🧪 Fake Ollama server listening on {server.url} (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+        sys.exit(0)
+
+if __name__ == "__main__":
+    main()
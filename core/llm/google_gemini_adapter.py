@@ -1,16 +1,45 @@
 import os
+import threading
+from typing import List, Dict
 import google.generativeai as genai
-from .llm_interface import LLMProvider
+from .llm_interface import LLMProvider, record_usage
+from .token_utils import usage_from_metadata
+from .structured_output import gemini_generation_config
+from .model_cache import BoundedModelCache, HistoryBuilder
+
+# genai.configure is process-global; only (re)configure when the key changes
+_CONFIGURED_KEY = None
+_CONFIGURE_LOCK = threading.Lock()
+
+def _configure_once(api_key):
+    global _CONFIGURED_KEY
+    with _CONFIGURE_LOCK:
+        if _CONFIGURED_KEY != api_key:
+            genai.configure(api_key=api_key)
+            _CONFIGURED_KEY = api_key
 
 class GeminiAdapter(LLMProvider):
-    def __init__(self, api_key=None, model_name="gemini-1.5-flash"):
+    context_window = 1048576 # gemini-1.5 models
+    backend_name = "gemini"
+
+    def __init__(self, api_key=None, model_name="gemini-1.5-flash", model_factory=None):
+        """
+        model_factory(model_name, system_instruction) builds a model handle; defaults to
+        genai.GenerativeModel. Pass a stub to exercise the adapter without cloud access.
+        """
         self.api_key = api_key or os.getenv("GEMINI_API_KEY")
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY is not set. Please set it in your environment.")
-        
-        genai.configure(api_key=self.api_key)
+
+        if model_factory is None:
+            _configure_once(self.api_key)
+            model_factory = lambda name, system_instruction: genai.GenerativeModel(name, system_instruction=system_instruction)
         self.model_name = model_name
-        
+
+        # Model handles are reused per system instruction instead of rebuilt on every call
+        self.models = BoundedModelCache(lambda system_instruction: model_factory(self.model_name, system_instruction))
+        self.history = HistoryBuilder(lambda role, content: {"role": role, "parts": [content]})
+
         # Safety settings: We block minimal content to avoid code generation issues
         self.safety_settings = [
             {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
@@ -21,41 +50,84 @@ class GeminiAdapter(LLMProvider):
 
     def generate_content(self, prompt: str, system_instruction: str = None) -> str:
         try:
-            model = genai.GenerativeModel(self.model_name, system_instruction=system_instruction)
+            model = self.models.get(system_instruction)
             response = model.generate_content(
-                prompt, 
-                safety_settings=self.safety_settings
+                prompt,
+                safety_settings=self.safety_settings,
+                generation_config=gemini_generation_config() # JSON mode when the caller asked for it
             )
+            record_usage(**usage_from_metadata(response))
             return response.text
         except Exception as e:
             print(f"🚨 Gemini Generate Error: {e}")
+            record_usage(error=str(e))
             return ""
 
     def chat(self, messages: List[Dict[str, str]], system_instruction: str = None) -> str:
         try:
-            model = genai.GenerativeModel(self.model_name, system_instruction=system_instruction)
-            
+            model = self.models.get(system_instruction)
+
             # 1. Convert OpenAI-style messages to Gemini history format
-            gemini_history = []
-            last_user_msg = ""
-            
-            for msg in messages:
-                role = "user" if msg["role"] == "user" else "model"
-                content = msg["content"]
-                
-                # Gemini's chat.send_message expects the *new* message separate from history
-                if msg == messages[-1] and msg["role"] == "user":
-                    last_user_msg = content
-                else:
-                    gemini_history.append({"role": role, "parts": [content]})
+            # (Gemini's chat.send_message expects the *new* message separate from history)
+            gemini_history, last_user_msg = self.history.build(messages)
 
             # 2. Start Chat Session
             chat = model.start_chat(history=gemini_history)
-            
+
             # 3. Send Message
-            response = chat.send_message(last_user_msg, safety_settings=self.safety_settings)
+            response = chat.send_message(last_user_msg, safety_settings=self.safety_settings, generation_config=gemini_generation_config())
+            record_usage(**usage_from_metadata(response))
             return response.text
-            
+
         except Exception as e:
             print(f"🚨 Gemini Chat Error: {e}")
-            return ""
\ No newline at end of file
+            record_usage(error=str(e))
+            return ""
+
+    def generate_content_stream(self, prompt: str, system_instruction: str = None):
+        try:
+            model = self.models.get(system_instruction)
+            for chunk in model.generate_content(prompt, safety_settings=self.safety_settings, generation_config=gemini_generation_config(), stream=True):
+                record_usage(**usage_from_metadata(chunk)) # The final chunk carries the totals
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            print(f"🚨 Gemini Stream Error: {e}")
+            record_usage(error=str(e))
+
+    def chat_stream(self, messages: List[Dict[str, str]], system_instruction: str = None):
+        try:
+            model = self.models.get(system_instruction)
+            gemini_history, last_user_msg = self.history.build(messages)
+            chat = model.start_chat(history=gemini_history)
+            for chunk in chat.send_message(last_user_msg, safety_settings=self.safety_settings, generation_config=gemini_generation_config(), stream=True):
+                record_usage(**usage_from_metadata(chunk)) # The final chunk carries the totals
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            print(f"🚨 Gemini Chat Stream Error: {e}")
+            record_usage(error=str(e))
+
+    async def _agenerate_content(self, prompt: str, system_instruction: str = None) -> str:
+        try:
+            model = self.models.get(system_instruction)
+            response = await model.generate_content_async(prompt, safety_settings=self.safety_settings, generation_config=gemini_generation_config())
+            record_usage(**usage_from_metadata(response))
+            return response.text
+        except Exception as e:
+            print(f"🚨 Gemini Async Generate Error: {e}")
+            record_usage(error=str(e))
+            return ""
+
+    async def _achat(self, messages: list, system_instruction: str = None) -> str:
+        try:
+            model = self.models.get(system_instruction)
+            gemini_history, last_user_msg = self.history.build(messages)
+            chat = model.start_chat(history=gemini_history)
+            response = await chat.send_message_async(last_user_msg, safety_settings=self.safety_settings, generation_config=gemini_generation_config())
+            record_usage(**usage_from_metadata(response))
+            return response.text
+        except Exception as e:
+            print(f"🚨 Gemini Async Chat Error: {e}")
+            record_usage(error=str(e))
+            return ""
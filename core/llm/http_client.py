@@ -0,0 +1,91 @@
+import asyncio
+import random
+import threading
+import time
+import weakref
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
+
+# event loop -> {base_url: httpx.AsyncClient}. Async clients are bound to the loop that created them.
+_ASYNC_CLIENTS = weakref.WeakKeyDictionary()
+
+def get_session(base_url, pool_size=10):
+    """
+    Returns one pooled, keep-alive Session per server, shared by every adapter in the process.
+    pool_block=True makes callers wait for a free connection instead of opening extra ones,
+    so the number of sockets to the server never exceeds pool_size.
+    """
+    key = base_url.rstrip('/')
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True, max_retries=0)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _SESSIONS[key] = session
+        return session
+
+def _failed_to_connect(error):
+    """True if the request never reached the server (refused, unresolvable host, connect timeout)."""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = error.args[0] if error.args else None
+    # requests wraps urllib3's MaxRetryError, whose reason is the underlying error
+    return isinstance(getattr(reason, "reason", reason), NewConnectionError)
+
+def post_with_retry(session, url, payload, timeout, max_retries=3, backoff=0.5, stream=False):
+    """
+    POSTs `payload` as JSON. Failures to connect (refused, connect timeout) are retried with
+    full-jitter exponential backoff. Anything after the connection was made (read timeouts, a
+    connection aborted or reset mid-request) is NOT retried: the server may already be
+    generating, and resending would only double its load.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return session.post(url, json=payload, timeout=timeout, stream=stream)
+        except requests.exceptions.ConnectionError as e:
+            if attempt >= max_retries or not _failed_to_connect(e):
+                raise
+            delay = random.uniform(0, backoff * (2 ** attempt))
+            print(f"⚠️ Connection to {url} failed ({e.__class__.__name__}). Retry {attempt + 1}/{max_retries} in {delay:.2f}s")
+            time.sleep(delay)
+
+def get_async_client(base_url, pool_size=10, timeout=(5, 300)):
+    """Async counterpart of get_session(): one pooled httpx.AsyncClient per server and event loop."""
+    loop = asyncio.get_running_loop()
+    key = base_url.rstrip('/')
+    with _SESSIONS_LOCK:
+        clients = _ASYNC_CLIENTS.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+                timeout=httpx.Timeout(timeout[1], connect=timeout[0])
+            )
+            clients[key] = client
+        return client
+
+async def close_async_clients():
+    """Closes the async clients of the running loop. Call it before a short-lived loop (asyncio.run) ends."""
+    with _SESSIONS_LOCK:
+        clients = _ASYNC_CLIENTS.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
+
+async def apost_with_retry(client, url, payload, max_retries=3, backoff=0.5):
+    """Async counterpart of post_with_retry(): only connection failures are retried."""
+    for attempt in range(max_retries + 1):
+        try:
+            return await client.post(url, json=payload)
+        except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+            if attempt >= max_retries:
+                raise
+            delay = random.uniform(0, backoff * (2 ** attempt))
+            print(f"⚠️ Connection to {url} failed ({e.__class__.__name__}). Retry {attempt + 1}/{max_retries} in {delay:.2f}s")
+            await asyncio.sleep(delay)
@@ -1,5 +1,21 @@
+import asyncio
+import contextvars
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
+from .scheduler import DEFAULT_LIMIT as DEFAULT_MAX_CONCURRENCY, get_scheduler
+
+# Usage reported by the provider for the most recent call in this thread / task (token counts, error).
+# Adapters set it, AIFrameworkAdapter reads it right after the call for telemetry.
+_LAST_USAGE = contextvars.ContextVar("spectra_llm_usage", default=None)
+
+def record_usage(**usage):
+    """Merges provider-reported fields (prompt_tokens, completion_tokens, error, ...) into the current call's usage."""
+    _LAST_USAGE.set({**(_LAST_USAGE.get() or {}), **{k: v for k, v in usage.items() if v is not None}})
+
+def pop_usage():
+    usage = _LAST_USAGE.get()
+    _LAST_USAGE.set(None)
+    return usage or {}
 
 class LLMProvider(ABC):
     """
@@ -7,6 +23,10 @@ class LLMProvider(ABC):
     Enforces a strict contract for any brain we plug into Spectra.
     """
 
+    backend_name = None # Scheduler limits are configured per backend name (SPECTRA_LLM_SCHEDULER_LIMITS)
+    max_concurrency = DEFAULT_MAX_CONCURRENCY
+    context_window = 8192 # Tokens the model accepts (prompt + output); prompts are budgeted against it
+
     @abstractmethod
     def generate_content(self, prompt: str, system_instruction: str = None) -> str:
         """
@@ -20,4 +40,54 @@ class LLMProvider(ABC):
         Handles a conversation history.
         messages: List of {"role": "user/assistant", "content": "..."}
         """
-        pass
\ No newline at end of file
+        pass
+
+    def generate_content_stream(self, prompt: str, system_instruction: str = None) -> Iterator[str]:
+        """
+        Yields the response as text fragments while it is generated.
+        Providers without native streaming yield the buffered response once.
+        """
+        yield self.generate_content(prompt, system_instruction)
+
+    def chat_stream(self, messages: List[Dict[str, str]], system_instruction: str = None) -> Iterator[str]:
+        """
+        Streaming counterpart of chat().
+        """
+        yield self.chat(messages, system_instruction)
+
+    # --- ASYNC API ---
+
+    def concurrency_key(self):
+        """Identifies the backend whose in-flight requests share one concurrency limit."""
+        return (self.backend_name or type(self).__name__, getattr(self, "model_name", None))
+
+    def slot(self):
+        """Blocking admission through the process-wide scheduler (see core.llm.scheduler)."""
+        return get_scheduler().slot(self.concurrency_key(), self.max_concurrency)
+
+    def _async_slot(self):
+        return get_scheduler().aslot(self.concurrency_key(), self.max_concurrency)
+
+    async def agenerate_content(self, prompt: str, system_instruction: str = None) -> str:
+        """
+        Async counterpart of generate_content(). At most `max_concurrency` requests per
+        backend are in flight; the rest wait in the shared scheduler queue.
+        """
+        async with self._async_slot() as ticket:
+            record_usage(queue_wait=ticket.wait_seconds)
+            return await self._agenerate_content(prompt, system_instruction)
+
+    async def achat(self, messages: List[Dict[str, str]], system_instruction: str = None) -> str:
+        """
+        Async counterpart of chat(), bounded like agenerate_content().
+        """
+        async with self._async_slot() as ticket:
+            record_usage(queue_wait=ticket.wait_seconds)
+            return await self._achat(messages, system_instruction)
+
+    async def _agenerate_content(self, prompt: str, system_instruction: str = None) -> str:
+        # Fallback for providers without a native async client: run the blocking call in a worker thread
+        return await asyncio.to_thread(self.generate_content, prompt, system_instruction)
+
+    async def _achat(self, messages: List[Dict[str, str]], system_instruction: str = None) -> str:
+        return await asyncio.to_thread(self.chat, messages, system_instruction)
@@ -0,0 +1,72 @@
+import os
+import threading
+from collections import OrderedDict
+from .scheduler import get_request_context
+
+DEFAULT_MODEL_CACHE_SIZE = int(os.getenv("SPECTRA_MODEL_CACHE_SIZE", "16"))
+DEFAULT_HISTORY_CACHE_SIZE = int(os.getenv("SPECTRA_HISTORY_CACHE_SIZE", "64"))
+
+class BoundedModelCache:
+    """
+    LRU cache of model handles keyed by system instruction.
+    `factory(system_instruction)` builds a handle on a miss; the least recently used
+    handle is dropped once more than `max_size` distinct instructions are in use.
+    """
+
+    def __init__(self, factory, max_size=DEFAULT_MODEL_CACHE_SIZE):
+        self.factory = factory
+        self.max_size = max_size
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, system_instruction=None):
+        key = system_instruction or ""
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                return model
+        # Build outside the lock: constructing a model handle can be slow
+        model = self.factory(system_instruction)
+        with self._lock:
+            model = self._models.setdefault(key, model)
+            self._models.move_to_end(key)
+            while len(self._models) > self.max_size:
+                self._models.popitem(last=False)
+        return model
+
+class HistoryBuilder:
+    """
+    Converts OpenAI-style messages into provider chat history, keeping the last user
+    message separate (it is what gets sent). Conversations only grow between turns, so the
+    converted objects of the unchanged prefix are reused and only new turns are converted.
+    One prefix is kept per session (the request context's session_id), for the `max_sessions`
+    most recently active sessions, so interleaved users do not overwrite each other's.
+    """
+
+    def __init__(self, convert, max_sessions=DEFAULT_HISTORY_CACHE_SIZE):
+        self.convert = convert  # convert(role, content) -> provider history item
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # session_id -> (keys, items)
+        self._lock = threading.Lock()
+
+    def build(self, messages):
+        last_user_msg = ""
+        if messages and messages[-1]["role"] == "user":
+            last_user_msg = messages[-1]["content"]
+            messages = messages[:-1]
+
+        session = get_request_context().get("session_id")
+        keys = [("user" if m["role"] == "user" else "model", m["content"]) for m in messages]
+        with self._lock:
+            cached_keys, cached_items = self._sessions.get(session, ([], []))
+        prefix = 0
+        while prefix < min(len(keys), len(cached_keys)) and keys[prefix] == cached_keys[prefix]:
+            prefix += 1
+        items = cached_items[:prefix] + [self.convert(role, content) for role, content in keys[prefix:]]
+        with self._lock:
+            self._sessions[session] = (keys, items)
+            self._sessions.move_to_end(session)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return list(items), last_user_msg
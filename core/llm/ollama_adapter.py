@@ -1,56 +1,164 @@
-import requests
 import os
-from .llm_interface import LLMProvider
+import json
+from .llm_interface import LLMProvider, record_usage
+from .http_client import get_session, post_with_retry, get_async_client, apost_with_retry
+from .structured_output import ollama_format
 
 class OllamaAdapter(LLMProvider):
-    def __init__(self, base_url=None, model_name="llama3:8b"):
+    backend_name = "ollama"
+
+    def __init__(self, base_url=None, model_name="llama3:8b", connect_timeout=None, read_timeout=None, pool_size=None, max_retries=None):
         # Default to localhost, but allow env var to point to your server (e.g., http://192.168.1.50:11434)
         self.base_url = base_url or os.getenv("OLLAMA_HOST", "http://localhost:11434")
         self.model_name = model_name
+        self.context_window = int(os.getenv("OLLAMA_NUM_CTX", "8192"))
+        self.options = {
+            "temperature": 0.2, # Low temp for code accuracy
+            "num_ctx": self.context_window # Larger context window for analyzing code
+        }
+        # Keep the model (and its KV cache) loaded between turns instead of Ollama's 5 minute default
+        self.keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
 
-    def generate_content(self, prompt: str, system_instruction: str = None) -> str:
+        # HTTP client: one pooled keep-alive session per server, bounded waits on a stuck server
+        self.timeout = (
+            float(connect_timeout or os.getenv("OLLAMA_CONNECT_TIMEOUT", "5")),
+            float(read_timeout or os.getenv("OLLAMA_READ_TIMEOUT", "300"))
+        )
+        self.max_retries = int(max_retries if max_retries is not None else os.getenv("OLLAMA_MAX_RETRIES", "3"))
+        self.pool_size = int(pool_size or os.getenv("OLLAMA_POOL_SIZE", "10"))
+        self.session = get_session(self.base_url, pool_size=self.pool_size)
+        self.max_concurrency = int(os.getenv("OLLAMA_MAX_CONCURRENCY", self.max_concurrency))
+
+    def _record_usage(self, data):
+        # Ollama reports token counts and durations (ns) on the final (done) message.
+        # prompt_eval_count only covers tokens that were not served from the KV cache, so it is
+        # reported as prompt_eval_tokens; the full prompt size (prompt_tokens) is estimated by the caller.
+        prompt_eval_ns = data.get("prompt_eval_duration")
+        record_usage(
+            prompt_eval_tokens=data.get("prompt_eval_count"),
+            completion_tokens=data.get("eval_count"),
+            prompt_eval_seconds=prompt_eval_ns / 1e9 if prompt_eval_ns is not None else None
+        )
+
+    def _post(self, endpoint, payload):
+        response = post_with_retry(self.session, f"{self.base_url}{endpoint}", payload, self.timeout, max_retries=self.max_retries)
+        response.raise_for_status()
+        data = response.json()
+        self._record_usage(data)
+        return data
+
+    async def _apost(self, endpoint, payload):
+        client = get_async_client(self.base_url, pool_size=self.pool_size, timeout=self.timeout)
+        response = await apost_with_retry(client, f"{self.base_url}{endpoint}", payload, max_retries=self.max_retries)
+        response.raise_for_status()
+        data = response.json()
+        self._record_usage(data)
+        return data
+
+    def concurrency_key(self):
+        # One limit per Ollama server, whichever model is loaded
+        return (self.backend_name, self.base_url)
+
+    def _stream(self, endpoint, payload, extract):
+        """Reads Ollama's NDJSON stream and yields the text fragment of every line."""
+        response = post_with_retry(self.session, f"{self.base_url}{endpoint}", payload, self.timeout, max_retries=self.max_retries, stream=True)
+        with response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    raise RuntimeError(data["error"])
+                fragment = extract(data)
+                if fragment:
+                    yield fragment
+                if data.get("done"):
+                    self._record_usage(data)
+                    break
+            else:
+                # The connection closed before the final message: what was streamed is partial
+                record_usage(error="stream ended before the final message")
+
+    def _with_format(self, payload):
+        # JSON mode ("json") or a JSON schema, when the caller asked for structured output
+        fmt = ollama_format()
+        if fmt:
+            payload["format"] = fmt
+        return payload
+
+    def _generate_payload(self, prompt, system_instruction, stream):
         full_prompt = prompt
         # Ollama raw mode often handles system prompts better when prepended
         if system_instruction:
             full_prompt = f"System: {system_instruction}\n\nUser: {prompt}"
 
-        payload = {
+        return self._with_format({
             "model": self.model_name,
             "prompt": full_prompt,
-            "stream": False,
-            "options": {
-                "temperature": 0.2, # Low temp for code accuracy
-                "num_ctx": 8192     # Larger context window for analyzing code
-            }
-        }
-        
-        try:
-            response = requests.post(f"{self.base_url}/api/generate", json=payload)
-            response.raise_for_status()
-            return response.json().get("response", "")
-        except Exception as e:
-            print(f"🚨 Ollama Connection Error ({self.base_url}): {e}")
-            return ""
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": self.options
+        })
 
-    def chat(self, messages: list, system_instruction: str = None) -> str:
+    def _chat_payload(self, messages, system_instruction, stream):
         # Prepend system instruction if it exists
         chat_messages = list(messages) # Copy to avoid modifying original
         if system_instruction:
             chat_messages.insert(0, {"role": "system", "content": system_instruction})
 
-        payload = {
+        return self._with_format({
             "model": self.model_name,
             "messages": chat_messages,
-            "stream": False,
-             "options": {
-                "temperature": 0.2
-            }
-        }
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": self.options # Same num_ctx as generate, otherwise Ollama reloads the model
+        })
 
+    def generate_content(self, prompt: str, system_instruction: str = None) -> str:
         try:
-            response = requests.post(f"{self.base_url}/api/chat", json=payload)
-            response.raise_for_status()
-            return response.json().get("message", {}).get("content", "")
+            return self._post("/api/generate", self._generate_payload(prompt, system_instruction, False)).get("response", "")
+        except Exception as e:
+            print(f"🚨 Ollama Connection Error ({self.base_url}): {e}")
+            record_usage(error=str(e))
+            return ""
+
+    def chat(self, messages: list, system_instruction: str = None) -> str:
+        try:
+            return self._post("/api/chat", self._chat_payload(messages, system_instruction, False)).get("message", {}).get("content", "")
+        except Exception as e:
+            print(f"🚨 Ollama Chat Error: {e}")
+            record_usage(error=str(e))
+            return ""
+
+    def generate_content_stream(self, prompt: str, system_instruction: str = None):
+        try:
+            yield from self._stream("/api/generate", self._generate_payload(prompt, system_instruction, True), lambda d: d.get("response", ""))
+        except Exception as e:
+            print(f"🚨 Ollama Stream Error ({self.base_url}): {e}")
+            record_usage(error=str(e))
+
+    def chat_stream(self, messages: list, system_instruction: str = None):
+        try:
+            yield from self._stream("/api/chat", self._chat_payload(messages, system_instruction, True), lambda d: d.get("message", {}).get("content", ""))
+        except Exception as e:
+            print(f"🚨 Ollama Chat Stream Error: {e}")
+            record_usage(error=str(e))
+
+    async def _agenerate_content(self, prompt: str, system_instruction: str = None) -> str:
+        try:
+            data = await self._apost("/api/generate", self._generate_payload(prompt, system_instruction, False))
+            return data.get("response", "")
+        except Exception as e:
+            print(f"🚨 Ollama Connection Error ({self.base_url}): {e}")
+            record_usage(error=str(e))
+            return ""
+
+    async def _achat(self, messages: list, system_instruction: str = None) -> str:
+        try:
+            data = await self._apost("/api/chat", self._chat_payload(messages, system_instruction, False))
+            return data.get("message", {}).get("content", "")
         except Exception as e:
             print(f"🚨 Ollama Chat Error: {e}")
-            return ""
\ No newline at end of file
+            record_usage(error=str(e))
+            return ""
@@ -0,0 +1,174 @@
+import os
+from .token_utils import estimate_tokens, CHARS_PER_TOKEN
+
+# Truncation policies
+FIXED = "fixed"   # Never trimmed (master prompts, short instructions)
+HEAD = "head"     # Keep the beginning: ranked RAG chunks, where the best matches come first
+TAIL = "tail"     # Keep the end: conversation history, where the latest turns matter most
+MIDDLE = "middle" # Keep both ends and cut the middle: plans and uploaded documents
+
+DEFAULT_OUTPUT_RESERVE = int(os.getenv("SPECTRA_LLM_OUTPUT_RESERVE", "2048"))
+TRIM_MARKER = "\n[... trimmed to fit the context window ...]\n"
+
+# Where a section goes in build_chat(): the cacheable system prefix, the history messages, or the latest user message
+SYSTEM = "system"
+HISTORY = "history"
+USER = "user"
+
+class _Section:
+    def __init__(self, name, blocks, separator, weight, policy, header, role, pin_first=False):
+        self.name = name
+        self.blocks = blocks
+        self.separator = separator
+        self.weight = weight
+        self.policy = policy
+        self.header = header
+        self.role = role
+        self.pin_first = pin_first
+
+    @property
+    def text(self):
+        if self.role == HISTORY:
+            return self.separator.join(m["content"] for m in self.blocks)
+        return self.separator.join(self.blocks)
+
+class PromptBuilder:
+    """
+    Assembles a prompt from named sections so that it fits the model's context window.
+
+    FIXED sections and all headers are always kept. The remaining budget
+    (context_window - reserve_output - fixed) is shared by the other sections in proportion
+    to their weight; sections that need less than their share give the rest to the others.
+    Sections over their allowance are trimmed by their policy (whole blocks first, where
+    the section has them), and every trim is logged.
+
+    build() renders one prompt string. build_chat() returns (system_instruction, messages)
+    laid out for prefix caching: SYSTEM sections (master prompt, pinned context) first,
+    then the history turns, then the USER sections as the latest message. Everything
+    before the latest message is byte-identical from one turn to the next, so the server
+    can reuse its KV cache instead of re-encoding it.
+    """
+
+    def __init__(self, context_window, reserve_output=DEFAULT_OUTPUT_RESERVE, name="prompt"):
+        self.context_window = context_window
+        self.reserve_output = min(reserve_output, context_window // 2)
+        self.name = name
+        self.sections = []
+        self.trimmed = [] # (section, tokens_before, tokens_after) of the last build()
+
+    def add(self, name, content, weight=1, policy=HEAD, separator="\n", header="", role=SYSTEM):
+        """
+        content is a string (split into blocks on `separator`) or a list of blocks
+        (e.g. RAG chunks, conversation turns), which are joined with `separator`.
+        role (SYSTEM or USER) only matters for build_chat().
+        """
+        if content is None:
+            content = ""
+        if isinstance(content, str):
+            blocks = content.split(separator)
+        else:
+            blocks = [str(b) for b in content]
+        self.sections.append(_Section(name, blocks, separator, weight, policy, header, role))
+        return self
+
+    def add_history(self, name, messages, weight=1, pin_first=False, header=""):
+        """
+        Chat turns ({"role", "content"}). Over budget, the oldest turns are dropped whole;
+        pin_first keeps the opening turn (usually the original request).
+        """
+        self.sections.append(_Section(name, list(messages or []), "\n", weight, TAIL, header, HISTORY, pin_first))
+        return self
+
+    def _allocate(self, budget):
+        fixed = sum(estimate_tokens(s.header) for s in self.sections)
+        fixed += sum(estimate_tokens(s.text) for s in self.sections if s.policy == FIXED)
+        remaining = budget - fixed
+        if remaining < 0:
+            print(f"⚠️ Prompt budget [{self.name}]: fixed sections alone need {fixed} of {budget} tokens")
+            remaining = 0
+
+        allowance = {}
+        pending = [s for s in self.sections if s.policy != FIXED]
+        while pending:
+            total_weight = sum(s.weight for s in pending) or 1
+            fits = [s for s in pending if estimate_tokens(s.text) <= remaining * s.weight / total_weight]
+            if not fits:
+                for s in pending:
+                    allowance[id(s)] = int(remaining * s.weight / total_weight)
+                break
+            for s in fits:
+                allowance[id(s)] = estimate_tokens(s.text)
+                remaining -= allowance[id(s)]
+                pending.remove(s)
+        return allowance
+
+    def _trim_history(self, section, max_tokens):
+        messages = list(section.blocks)
+        first = 1 if section.pin_first else 0
+        while len(messages) > first and estimate_tokens("\n".join(m["content"] for m in messages)) > max_tokens:
+            messages.pop(first)
+        return messages
+
+    def _trim(self, section, max_tokens):
+        max_chars = max(0, max_tokens * CHARS_PER_TOKEN - len(TRIM_MARKER))
+        blocks = list(section.blocks)
+
+        # Drop whole blocks first so chunks and turns are never cut in half
+        if len(blocks) > 1 and section.policy in (HEAD, TAIL):
+            while len(blocks) > 1 and len(section.separator.join(blocks)) > max_chars:
+                blocks.pop() if section.policy == HEAD else blocks.pop(0)
+        text = section.separator.join(blocks)
+        if len(text) <= max_chars:
+            return text
+        if max_chars == 0:
+            return ""
+
+        if section.policy == TAIL:
+            return TRIM_MARKER + text[-max_chars:]
+        if section.policy == MIDDLE:
+            half = max_chars // 2
+            return text[:half] + TRIM_MARKER + text[-(max_chars - half):]
+        return text[:max_chars] + TRIM_MARKER
+
+    def _fit(self):
+        """Returns [(section, content)] with every section trimmed to its allowance."""
+        budget = self.context_window - self.reserve_output
+        allowance = self._allocate(budget)
+        self.trimmed = []
+
+        fitted = []
+        for s in self.sections:
+            content = s.blocks if s.role == HISTORY else s.text
+            before = estimate_tokens(s.text)
+            if s.policy != FIXED and before > allowance[id(s)]:
+                if s.role == HISTORY:
+                    content = self._trim_history(s, allowance[id(s)])
+                    after = estimate_tokens("\n".join(m["content"] for m in content))
+                else:
+                    content = self._trim(s, allowance[id(s)])
+                    after = estimate_tokens(content)
+                self.trimmed.append((s.name, before, after))
+                print(f"✂️ Prompt budget [{self.name}]: '{s.name}' trimmed {before} → {after} tokens ({s.policy}, window {self.context_window})")
+            fitted.append((s, content))
+        return fitted
+
+    def build(self):
+        parts = []
+        for s, content in self._fit():
+            if s.role == HISTORY:
+                content = "\n".join(f"[{m['role']}]: {m['content']}\n" for m in content)
+            parts.append(f"{s.header}{content}")
+        return "\n".join(parts)
+
+    def build_chat(self):
+        """Returns (system_instruction, messages) for LLM chat calls."""
+        system_parts, history, user_parts = [], [], []
+        for s, content in self._fit():
+            if s.role == HISTORY:
+                history.extend({"role": m["role"], "content": m["content"]} for m in content)
+            elif s.role == USER:
+                user_parts.append(f"{s.header}{content}")
+            else:
+                system_parts.append(f"{s.header}{content}")
+        messages = history + [{"role": "user", "content": "\n".join(user_parts)}]
+        return "\n".join(system_parts), messages
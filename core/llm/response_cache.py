@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DEFAULT_CACHE_DIR = os.path.join(PROJECT_ROOT, 'data', 'llm_cache')
+
+class ResponseCache:
+    """
+    Content-addressed, on-disk cache of LLM responses.
+    Entries live in <cache_dir>/<key[:2]>/<key>.json, expire after `ttl_seconds`, and the
+    least recently used entries are evicted once the cache grows beyond `max_bytes`.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl_seconds=7 * 24 * 3600, max_bytes=256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._total_bytes = sum(size for _, _, size in self._entries())
+
+    @staticmethod
+    def make_key(provider, model, options, system_instruction, content):
+        """Hashes everything that can change the response. `content` is a prompt string or a message list."""
+        material = json.dumps(
+            {"provider": provider, "model": model, "options": options, "system": system_instruction, "content": content},
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _entries(self):
+        """Yields (path, last_access, size) for every entry on disk."""
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                        yield path, st.st_mtime, st.st_size
+                    except OSError:
+                        continue
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        if time.time() - entry.get("created_at", 0) > self.ttl_seconds:
+            self._remove(path)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            os.utime(path, None) # Touch for LRU eviction
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+            self.saved_seconds += entry.get("generation_seconds", 0.0)
+        return entry.get("text")
+
+    def put(self, key, text, generation_seconds):
+        if not text:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        payload = json.dumps({"text": text, "created_at": time.time(), "generation_seconds": generation_seconds})
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(payload)
+            # An entry being overwritten (two callers missed on the same key, or the old one was unreadable) no longer counts
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            os.replace(tmp_path, path) # Atomic: readers never see half-written entries
+        except OSError as e:
+            print(f"⚠️ Could not write LLM cache entry: {e}")
+            return
+        with self._lock:
+            self._total_bytes += len(payload) - replaced
+            over_budget = self._total_bytes > self.max_bytes
+        if over_budget:
+            self._evict()
+
+    def _remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            with self._lock:
+                self._total_bytes -= size
+        except OSError:
+            pass
+
+    def _evict(self):
+        """Drops expired entries, then the least recently used ones until we are at 90% of max_bytes."""
+        entries = sorted(self._entries(), key=lambda e: e[1])
+        now = time.time()
+        total = sum(size for _, _, size in entries)
+        target = self.max_bytes * 0.9
+        for path, last_access, size in entries:
+            if total <= target and now - last_access <= self.ttl_seconds:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+        with self._lock:
+            self._total_bytes = total
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "saved_seconds": round(self.saved_seconds, 2),
+                "bytes": self._total_bytes
+            }
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+def get_response_cache():
+    """
+    Returns the process-wide cache when SPECTRA_LLM_CACHE is enabled, otherwise None.
+    Sharing one instance lets hit rates and saved time aggregate across agents.
+    """
+    global _CACHE
+    if os.getenv("SPECTRA_LLM_CACHE", "0").lower() not in ("1", "true", "yes", "on"):
+        return None
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = ResponseCache(
+                cache_dir=os.getenv("SPECTRA_LLM_CACHE_DIR", DEFAULT_CACHE_DIR),
+                ttl_seconds=float(os.getenv("SPECTRA_LLM_CACHE_TTL_HOURS", "168")) * 3600,
+                max_bytes=int(float(os.getenv("SPECTRA_LLM_CACHE_MAX_MB", "256")) * 1024 * 1024)
+            )
+        return _CACHE
@@ -0,0 +1,255 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager, asynccontextmanager
+from typing import List, Dict
+from .llm_interface import LLMProvider, record_usage, pop_usage
+
+class CircuitBreaker:
+    """
+    Per-provider breaker. After `failure_threshold` consecutive failures (errors, empty
+    responses or first tokens slower than the SLO) the provider is skipped for `reset_seconds`;
+    then one trial request is let through (half-open) and its outcome closes or re-opens it.
+    """
+
+    def __init__(self, failure_threshold=3, reset_seconds=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def release_trial(self):
+        """Ends a half-open trial without a verdict (its attempt was abandoned before it could prove anything)."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+class _Attempt:
+    """One provider working on a request in its own thread."""
+
+    def __init__(self, name, provider, call, slo_seconds, breaker, changed):
+        self.name = name
+        self.provider = provider
+        self.call = call
+        self.slo_seconds = slo_seconds
+        self.breaker = breaker
+        self.changed = changed # Condition shared by all attempts of the request
+        self.parts = []
+        self.first_token_at = None
+        self.done = False
+        self.error = None
+        self.usage = {}
+        self.cancelled = False
+        self.cancelled_at = None
+        self.started_at = time.perf_counter()
+
+    @property
+    def ok(self):
+        return self.done and not self.error and bool(self.parts)
+
+    def run(self):
+        # The thread starts with a copy of the caller's context, including usage the caller has not popped yet
+        pop_usage()
+        try:
+            # Each attempt queues for its own backend, so hedges count against the provider they hit
+            with self.provider.slot() as ticket:
+                record_usage(queue_wait=ticket.wait_seconds)
+                for fragment in self.call(self.provider):
+                    if self.cancelled:
+                        break
+                    with self.changed:
+                        if self.first_token_at is None:
+                            self.first_token_at = time.perf_counter()
+                        self.parts.append(fragment)
+                        self.changed.notify_all()
+            self.usage = pop_usage()
+            self.error = self.usage.get("error")
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            with self.changed:
+                self.done = True
+                self.changed.notify_all()
+            self._update_breaker()
+
+    def cancel(self):
+        self.cancelled_at = time.perf_counter()
+        self.cancelled = True
+
+    def _update_breaker(self):
+        """Judges the provider by its own SLO: an attempt is slow if its first token came later than slo_seconds after it started."""
+        if self.first_token_at is None and self.cancelled_at is not None and not self.error:
+            # Abandoned before its first token: that is only evidence against the provider when its
+            # own SLO had already run out (e.g. a hedge cancelled because the primary caught up is not)
+            if self.cancelled_at - self.started_at <= self.slo_seconds:
+                self.breaker.release_trial()
+                return
+            self.breaker.record_failure()
+            return
+        slow = self.first_token_at is None or self.first_token_at - self.started_at > self.slo_seconds
+        if not self.error and not slow:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+class _NoWait:
+    # Each attempt reports its own backend's wait as queue_wait usage
+    wait_seconds = None
+
+class HedgedRouter(LLMProvider):
+    """
+    Routes every request over an ordered list of providers.
+    The first available provider (closed breaker) gets the request. If no first token has
+    arrived within `slo_seconds`, the request is hedged to the next available provider, and so
+    on. Buffered calls return whichever attempt finishes first; streaming calls follow the
+    attempt that produces the first token (streamed text cannot be taken back). An attempt
+    that fails is replaced by the next provider immediately. Losing streams are abandoned.
+    """
+
+    backend_name = "router"
+
+    def __init__(self, providers, slo_seconds=10.0, failure_threshold=3, reset_seconds=30.0):
+        """providers: ordered list of (name, LLMProvider)."""
+        if not providers:
+            raise ValueError("HedgedRouter needs at least one provider.")
+        self.providers = list(providers)
+        self.slo_seconds = slo_seconds
+        self.breakers = {name: CircuitBreaker(failure_threshold, reset_seconds) for name, _ in self.providers}
+        self.model_name = "+".join(str(getattr(p, "model_name", name)) for name, p in self.providers)
+        # Any provider may end up serving the prompt, so budget for the smallest window
+        self.context_window = min(p.context_window for _, p in self.providers)
+
+    # The router itself does not occupy a scheduler slot; every attempt takes one on its own backend
+    @contextmanager
+    def slot(self):
+        yield _NoWait
+
+    @asynccontextmanager
+    async def _async_slot(self):
+        yield _NoWait
+
+    def breaker_states(self):
+        return {name: breaker.state for name, breaker in self.breakers.items()}
+
+    def _launch(self, attempts, pending, call, changed, reason=None):
+        """Starts the next provider whose breaker allows a request. Returns False when none is left."""
+        while pending:
+            name, provider = pending.pop(0)
+            if not self.breakers[name].allow():
+                continue
+            if attempts:
+                print(f"🔀 Hedging request to '{name}' ({reason})")
+            attempt = _Attempt(name, provider, call, self.slo_seconds, self.breakers[name], changed)
+            attempts.append(attempt)
+            # Copy the caller's context so the scheduler and telemetry see the same user / agent / stage
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run, args=(attempt.run,), daemon=True).start()
+            return True
+        return False
+
+    def _route(self, call, stream):
+        """Yields the winning attempt's text: fragment by fragment when streaming, else once at the end."""
+        changed = threading.Condition()
+        attempts, pending = [], list(self.providers)
+        if not self._launch(attempts, pending, call, changed):
+            print("🚨 All LLM providers are unavailable (circuit breakers open).")
+            record_usage(error="all providers unavailable")
+            return
+
+        deadline = time.perf_counter() + self.slo_seconds
+        leader, emitted, winner = None, 0, None
+        while True:
+            with changed:
+                if stream and leader is None:
+                    leader = next((a for a in attempts if a.first_token_at is not None), None)
+                if leader is not None:
+                    new_parts = leader.parts[emitted:]
+                    emitted += len(new_parts)
+                    if leader.done and emitted == len(leader.parts):
+                        winner = leader
+                else:
+                    winner = next((a for a in attempts if a.ok), None)
+
+                if winner is None:
+                    now = time.perf_counter()
+                    running = [a for a in attempts if not a.done]
+                    failed_over = leader is None and not running
+                    slo_missed = leader is None and now >= deadline and all(a.first_token_at is None for a in running)
+                    if failed_over or slo_missed:
+                        reason = "previous provider failed" if failed_over else f"no first token within {self.slo_seconds}s"
+                        if self._launch(attempts, pending, call, changed, reason):
+                            deadline = now + self.slo_seconds
+                        elif failed_over:
+                            break
+                        else:
+                            deadline = float("inf") # Nothing left to hedge to: wait for what is running
+                    if leader is None or not new_parts:
+                        changed.wait(timeout=max(0.01, min(deadline - now, 1.0)))
+
+            if leader is not None:
+                for fragment in new_parts:
+                    yield fragment
+            if winner is not None:
+                break
+
+        for a in attempts:
+            if a is not winner and not a.done:
+                a.cancel()
+
+        if winner is None:
+            errors = "; ".join(f"{a.name}: {a.error or 'empty response'}" for a in attempts)
+            print(f"🚨 Every routed provider failed ({errors})")
+            record_usage(error=errors)
+            return
+
+        record_usage(**{**winner.usage, "routed_to": winner.name, "hedges": len(attempts) - 1})
+        if not stream:
+            yield "".join(winner.parts)
+
+    def generate_content(self, prompt: str, system_instruction: str = None) -> str:
+        return "".join(self._route(lambda p: p.generate_content_stream(prompt, system_instruction), stream=False))
+
+    def chat(self, messages: List[Dict[str, str]], system_instruction: str = None) -> str:
+        return "".join(self._route(lambda p: p.chat_stream(messages, system_instruction), stream=False))
+
+    def generate_content_stream(self, prompt: str, system_instruction: str = None):
+        return self._route(lambda p: p.generate_content_stream(prompt, system_instruction), stream=True)
+
+    def chat_stream(self, messages: List[Dict[str, str]], system_instruction: str = None):
+        return self._route(lambda p: p.chat_stream(messages, system_instruction), stream=True)
@@ -0,0 +1,237 @@
+import os
+import time
+import asyncio
+import threading
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import contextmanager, asynccontextmanager
+
+# Priorities: lower runs first. Interactive Q&A overtakes long batch jobs (Sutra, D1 analysis).
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+DEFAULT_LIMIT = int(os.getenv("SPECTRA_LLM_MAX_CONCURRENCY", "4"))
+
+# Who is asking: {"user", "priority", "session_id", "agent", "stage"}.
+# Threads do not inherit context variables, so agent threads must set it themselves (see request_context).
+_REQUEST_CONTEXT = contextvars.ContextVar("spectra_llm_request", default={})
+
+def get_request_context():
+    return _REQUEST_CONTEXT.get()
+
+@contextmanager
+def request_context(**fields):
+    """Tags every LLM call made inside the block. Nested blocks override only the fields they set."""
+    token = _REQUEST_CONTEXT.set({**_REQUEST_CONTEXT.get(), **fields})
+    try:
+        yield
+    finally:
+        _REQUEST_CONTEXT.reset(token)
+
+def update_request_context(**fields):
+    """Changes fields (e.g. the current stage) for the rest of the current context."""
+    _REQUEST_CONTEXT.set({**_REQUEST_CONTEXT.get(), **fields})
+
+def _parse_limits(spec):
+    """'ollama=2,gemini=8' -> {'ollama': 2, 'gemini': 8}"""
+    limits = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            limits[name.strip()] = int(value)
+    return limits
+
+class _Ticket:
+    def __init__(self, backend, user, priority, context, notify):
+        self.backend = backend
+        self.user = user
+        self.priority = priority
+        self.context = context
+        self.notify = notify # Called (under the scheduler lock) once the ticket is granted
+        self.enqueued_at = time.perf_counter()
+        self.granted = False
+        self.wait_seconds = 0.0
+
+class _Backend:
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        # priority -> OrderedDict(user -> deque of tickets). Users are served round-robin.
+        self.queues = {}
+
+    def waiting(self):
+        return sum(len(q) for users in self.queues.values() for q in users.values())
+
+    def order(self):
+        """Tickets in the order they will be granted: by priority, then one per user in turn."""
+        ordered = []
+        for priority in sorted(self.queues):
+            users = [deque(q) for q in self.queues[priority].values()]
+            while users:
+                for q in list(users):
+                    ordered.append(q.popleft())
+                    if not q:
+                        users.remove(q)
+        return ordered
+
+class LLMScheduler:
+    """
+    Process-wide admission control for LLM calls.
+    Each backend (e.g. one Ollama server) has a concurrency limit; callers beyond it queue up.
+    Queued calls are granted by priority, and round-robin across users within a priority,
+    so one user's long batch job cannot starve everyone else.
+    """
+
+    def __init__(self, default_limit=DEFAULT_LIMIT, limits=None):
+        self.default_limit = default_limit
+        self.limits = limits if limits is not None else _parse_limits(os.getenv("SPECTRA_LLM_SCHEDULER_LIMITS"))
+        self._backends = {}
+        self._lock = threading.Lock()
+
+    def _backend(self, key, limit):
+        backend = self._backends.get(key)
+        if backend is None:
+            name = key[0] if isinstance(key, tuple) else key
+            backend = _Backend(self.limits.get(name, limit or self.default_limit))
+            self._backends[key] = backend
+        return backend
+
+    def _enqueue(self, key, limit, notify):
+        context = get_request_context()
+        with self._lock:
+            backend = self._backend(key, limit)
+            ticket = _Ticket(key, context.get("user", "anonymous"), context.get("priority", BATCH), context, notify)
+            users = backend.queues.setdefault(ticket.priority, OrderedDict())
+            users.setdefault(ticket.user, deque()).append(ticket)
+            self._dispatch(backend)
+        return ticket
+
+    def _dispatch(self, backend):
+        """Grants queued tickets while the backend has free slots. Caller holds the lock."""
+        while backend.active < backend.limit:
+            ticket = self._pop_next(backend)
+            if ticket is None:
+                return
+            backend.active += 1
+            ticket.granted = True
+            ticket.wait_seconds = time.perf_counter() - ticket.enqueued_at
+            ticket.notify()
+
+    def _pop_next(self, backend):
+        for priority in sorted(backend.queues):
+            users = backend.queues[priority]
+            if not users:
+                continue
+            user, queue = next(iter(users.items()))
+            ticket = queue.popleft()
+            if queue:
+                users.move_to_end(user) # Next turn goes to the next user
+            else:
+                del users[user]
+            return ticket
+        return None
+
+    def _cancel(self, ticket):
+        """Drops a ticket that stopped waiting; releases its slot if it was already granted."""
+        with self._lock:
+            backend = self._backends[ticket.backend]
+            if ticket.granted:
+                backend.active -= 1
+            else:
+                users = backend.queues.get(ticket.priority, {})
+                queue = users.get(ticket.user)
+                if queue and ticket in queue:
+                    queue.remove(ticket)
+                    if not queue:
+                        del users[ticket.user]
+            self._dispatch(backend)
+
+    def _release(self, ticket):
+        with self._lock:
+            backend = self._backends[ticket.backend]
+            backend.active -= 1
+            self._dispatch(backend)
+
+    @contextmanager
+    def slot(self, key, limit=None):
+        """Blocks until the backend has room for this call. Yields the ticket (see wait_seconds)."""
+        event = threading.Event()
+        ticket = self._enqueue(key, limit, event.set)
+        try:
+            event.wait()
+        except BaseException:
+            self._cancel(ticket)
+            raise
+        try:
+            yield ticket
+        finally:
+            self._release(ticket)
+
+    @asynccontextmanager
+    async def aslot(self, key, limit=None):
+        """Async counterpart of slot(): waits without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def notify():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        ticket = self._enqueue(key, limit, notify)
+        try:
+            await future
+        except BaseException:
+            self._cancel(ticket)
+            raise
+        try:
+            yield ticket
+        finally:
+            self._release(ticket)
+
+    def position(self, session_id):
+        """
+        Returns (position, waiting, backend) for the first queued call of a session, 1-based,
+        or None when the session has nothing waiting.
+        """
+        with self._lock:
+            for key, backend in self._backends.items():
+                ordered = backend.order()
+                for i, ticket in enumerate(ordered):
+                    if ticket.context.get("session_id") == session_id:
+                        return i + 1, len(ordered), key
+        return None
+
+    def snapshot(self):
+        """Per-backend limit, in-flight count and queue (in grant order) for dashboards and load tests."""
+        now = time.perf_counter()
+        with self._lock:
+            return {
+                str(key): {
+                    "limit": backend.limit,
+                    "active": backend.active,
+                    "waiting": backend.waiting(),
+                    "queue": [
+                        {
+                            "position": i + 1,
+                            "user": t.user,
+                            "priority": PRIORITY_NAMES.get(t.priority, t.priority),
+                            "agent": t.context.get("agent"),
+                            "stage": t.context.get("stage"),
+                            "waited_seconds": round(now - t.enqueued_at, 2)
+                        }
+                        for i, t in enumerate(backend.order())
+                    ]
+                }
+                for key, backend in self._backends.items()
+            }
+
+_SCHEDULER = None
+_SCHEDULER_LOCK = threading.Lock()
+
+def get_scheduler():
+    """Returns the process-wide scheduler shared by every adapter."""
+    global _SCHEDULER
+    with _SCHEDULER_LOCK:
+        if _SCHEDULER is None:
+            _SCHEDULER = LLMScheduler()
+        return _SCHEDULER
@@ -0,0 +1,105 @@
+import re
+import json
+from contextvars import ContextVar
+from contextlib import contextmanager
+
+# Ask the provider for a JSON object (any shape). Pass a JSON schema dict instead to constrain the shape.
+JSON = "json"
+
+# The structured-output request of the calls made in the current context. Providers read it
+# when they build a request; like the request context, it follows calls into router and async threads.
+_RESPONSE_FORMAT = ContextVar("spectra_llm_response_format", default=None)
+
+REPAIR_PROMPT = """The text below was supposed to be one valid JSON object, but it does not parse ({error}).
+Return ONLY the corrected JSON object: same keys and content, fixed syntax (quotes, escapes, commas, brackets).
+Do not add commentary or markdown fences."""
+
+_DECODER = json.JSONDecoder()
+_FENCED_OBJECT = re.compile(r"```[\w-]*\s*\{")
+
+def get_response_format():
+    return _RESPONSE_FORMAT.get()
+
+@contextmanager
+def response_format(fmt=JSON):
+    """Makes every LLM call inside the block request JSON output (JSON) or a schema-shaped object (a dict)."""
+    token = _RESPONSE_FORMAT.set(fmt)
+    try:
+        yield
+    finally:
+        _RESPONSE_FORMAT.reset(token)
+
+def ollama_format():
+    """Value of the Ollama request's `format` field, or None."""
+    fmt = get_response_format()
+    return "json" if fmt == JSON else fmt
+
+def gemini_generation_config():
+    """generation_config for Gemini / Vertex calls, or None."""
+    fmt = get_response_format()
+    if fmt is None:
+        return None
+    config = {"response_mime_type": "application/json"}
+    if isinstance(fmt, dict):
+        config["response_schema"] = fmt
+    return config
+
+def _json_start(text):
+    """Where the answer's object starts: inside the first markdown fence if there is one, else at the first '{'."""
+    fenced = _FENCED_OBJECT.search(text)
+    return fenced.end() - 1 if fenced else text.find("{")
+
+def extract_json(text):
+    """
+    Returns the JSON object the answer consists of (prose and markdown fences around it are fine), or None.
+    Only that one object is decoded: when it is malformed, a nested object that happens to parse must
+    not stand in for it, so the caller gets None and can ask for a repair. One linear pass.
+    """
+    if not text:
+        return None
+    start = _json_start(text)
+    if start == -1:
+        return None
+    try:
+        value, _ = _DECODER.raw_decode(text, start)
+    except json.JSONDecodeError:
+        return None
+    return value if isinstance(value, dict) else None
+
+def _parse_error(text):
+    try:
+        _DECODER.raw_decode(text, max(_json_start(text), 0))
+    except json.JSONDecodeError as e:
+        return str(e)
+    return "no JSON object found"
+
+def repair_json(llm, text, schema=None):
+    """Asks the model to fix the syntax of a malformed JSON answer (much shorter than re-running the task)."""
+    print("🩹 Response is not valid JSON, asking for a repair...")
+    system_instruction = REPAIR_PROMPT.format(error=_parse_error(text))
+    with response_format(schema or JSON):
+        response = llm.generate_content(text, system_instruction=system_instruction)
+    result = extract_json(response.text if response else "")
+    if result is None:
+        print("🚨 JSON repair failed.")
+    return result
+
+def _request_json(llm, call, schema, repair):
+    with response_format(schema or JSON):
+        response = call()
+    text = response.text if response else ""
+    result = extract_json(text)
+    if result is None and text and repair:
+        result = repair_json(llm, text, schema)
+    return result, response
+
+def generate_json(llm, prompt, system_instruction=None, schema=None, on_token=None, use_cache=True, repair=True):
+    """
+    generate_content() in JSON mode. Returns (parsed_object_or_None, response).
+    Unparseable output gets one repair round-trip before giving up.
+    """
+    return _request_json(llm, lambda: llm.generate_content(prompt, system_instruction=system_instruction, on_token=on_token, use_cache=use_cache), schema, repair)
+
+def chat_json(llm, messages, system_instruction=None, schema=None, on_token=None, use_cache=True, repair=True):
+    """chat() counterpart of generate_json()."""
+    return _request_json(llm, lambda: llm.chat(messages, system_instruction=system_instruction, on_token=on_token, use_cache=use_cache), schema, repair)
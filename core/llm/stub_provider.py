@@ -0,0 +1,46 @@
+import os
+import time
+from typing import List, Dict
+from .llm_interface import LLMProvider, record_usage
+from .token_utils import estimate_tokens
+
+class StubProvider(LLMProvider):
+    """
+    Offline provider with injectable latency, for routing, scheduling and load tests.
+    Waits `first_token_delay` seconds, then streams `response` word by word every
+    `token_delay` seconds. With `fail=True` it reports an error and returns nothing.
+    """
+
+    backend_name = "stub"
+
+    def __init__(self, model_name="stub", response='{"summary": "stub response"}', first_token_delay=None, token_delay=None, fail=False):
+        self.model_name = model_name
+        self.response = response
+        self.first_token_delay = float(first_token_delay if first_token_delay is not None else os.getenv("SPECTRA_STUB_FIRST_TOKEN_DELAY", "0.2"))
+        self.token_delay = float(token_delay if token_delay is not None else os.getenv("SPECTRA_STUB_TOKEN_DELAY", "0.01"))
+        self.fail = fail
+
+    def _tokens(self, content):
+        time.sleep(self.first_token_delay)
+        if self.fail:
+            print(f"🚨 Stub provider '{self.model_name}' failed (injected)")
+            record_usage(error="injected failure")
+            return
+        words = self.response.split(" ")
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(self.token_delay)
+            yield word if i == 0 else " " + word
+        record_usage(prompt_tokens=estimate_tokens(content), completion_tokens=estimate_tokens(self.response))
+
+    def generate_content(self, prompt: str, system_instruction: str = None) -> str:
+        return "".join(self._tokens(prompt))
+
+    def chat(self, messages: List[Dict[str, str]], system_instruction: str = None) -> str:
+        return "".join(self._tokens(messages))
+
+    def generate_content_stream(self, prompt: str, system_instruction: str = None):
+        return self._tokens(prompt)
+
+    def chat_stream(self, messages: List[Dict[str, str]], system_instruction: str = None):
+        return self._tokens(messages)
@@ -0,0 +1,99 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from core.utils.stats import summarize_latencies
+from .scheduler import get_request_context
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DEFAULT_METRICS_PATH = os.path.join(PROJECT_ROOT, 'data', 'llm_metrics.jsonl')
+
+class LLMTelemetry:
+    """
+    Per-call LLM metrics. Every record is appended as one JSON line to `path` (never rewritten)
+    and the most recent `max_records` are kept in memory for p50/p95 summaries.
+    """
+
+    def __init__(self, path=DEFAULT_METRICS_PATH, max_records=5000):
+        self.path = path
+        self.records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+        if self.path:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+    def record(self, **fields):
+        """Stores one call. Agent, stage, session and user are taken from the request context."""
+        context = get_request_context()
+        record = {
+            "ts": time.time(),
+            "agent": context.get("agent"),
+            "stage": context.get("stage"),
+            "session_id": context.get("session_id"),
+            "user": context.get("user"),
+            **fields
+        }
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self.records.append(record)
+            if self.path:
+                try:
+                    with open(self.path, 'a') as f:
+                        f.write(line + "\n")
+                except OSError as e:
+                    print(f"⚠️ Could not write LLM metrics: {e}")
+        return record
+
+    def summary(self, group_by=("agent", "stage")):
+        """Latency, TTFT and queue-wait percentiles plus token totals, grouped by the given record fields."""
+        with self._lock:
+            records = list(self.records)
+
+        groups = {}
+        for r in records:
+            groups.setdefault(" / ".join(str(r.get(f) or "-") for f in group_by), []).append(r)
+
+        summary = {}
+        for key, rows in sorted(groups.items()):
+            summary[key] = {
+                "calls": len(rows),
+                "errors": sum(1 for r in rows if r.get("error")),
+                "cache_hits": sum(1 for r in rows if r.get("cache_hit")),
+                "prompt_tokens": sum(r.get("prompt_tokens") or 0 for r in rows),
+                # Prompt tokens the server actually processed (Ollama only); the rest came from its KV cache
+                "prompt_eval_tokens": sum(r.get("prompt_eval_tokens") or 0 for r in rows),
+                "completion_tokens": sum(r.get("completion_tokens") or 0 for r in rows),
+                "latency": summarize_latencies([r["latency"] for r in rows if r.get("latency") is not None]),
+                "ttft": summarize_latencies([r["ttft"] for r in rows if r.get("ttft") is not None]),
+                "queue_wait": summarize_latencies([r["queue_wait"] for r in rows if r.get("queue_wait") is not None]),
+                # Prompt processing time (Ollama only); near zero when the prompt prefix hit the KV cache
+                "prompt_eval": summarize_latencies([r["prompt_eval_seconds"] for r in rows if r.get("prompt_eval_seconds") is not None])
+            }
+        return summary
+
+def format_summary(summary):
+    """Plain-text table of summary() output for CLIs and logs."""
+    lines = [f"{'group':<40} {'calls':>6} {'err':>4} {'p50 s':>7} {'p95 s':>7} {'ttft p50':>9} {'wait p95':>9} {'eval p50':>9} {'tok in':>8} {'tok eval':>8} {'tok out':>8}"]
+    fmt = lambda v: f"{v:.2f}" if v is not None else "-"
+    for key, s in summary.items():
+        lines.append(
+            f"{key[:40]:<40} {s['calls']:>6} {s['errors']:>4} {fmt(s['latency']['p50']):>7} {fmt(s['latency']['p95']):>7} "
+            f"{fmt(s['ttft']['p50']):>9} {fmt(s['queue_wait']['p95']):>9} {fmt(s['prompt_eval']['p50']):>9} {s['prompt_tokens']:>8} {s['prompt_eval_tokens']:>8} {s['completion_tokens']:>8}"
+        )
+    return "\n".join(lines)
+
+_TELEMETRY = None
+_TELEMETRY_LOCK = threading.Lock()
+
+def get_telemetry():
+    """
+    Returns the process-wide telemetry sink, or None when SPECTRA_LLM_METRICS=0.
+    The log location can be changed with SPECTRA_LLM_METRICS_PATH.
+    """
+    global _TELEMETRY
+    if os.getenv("SPECTRA_LLM_METRICS", "1").lower() in ("0", "false", "no", "off"):
+        return None
+    with _TELEMETRY_LOCK:
+        if _TELEMETRY is None:
+            _TELEMETRY = LLMTelemetry(path=os.getenv("SPECTRA_LLM_METRICS_PATH", DEFAULT_METRICS_PATH))
+        return _TELEMETRY
@@ -0,0 +1,26 @@
+import json
+
+# Rough average for English prose and code with BPE tokenizers; good enough for budgeting and metrics
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(content):
+    """Local token estimate for a prompt string or a list of chat messages."""
+    if not content:
+        return 0
+    if not isinstance(content, str):
+        content = json.dumps(content, default=str)
+    return max(1, len(content) // CHARS_PER_TOKEN)
+
+def usage_from_metadata(response):
+    """
+    Token counts from a google.generativeai / Vertex AI response (or stream chunk).
+    Returns an empty dict when the response carries no usage metadata.
+    """
+    metadata = getattr(response, "usage_metadata", None)
+    if metadata is None:
+        return {}
+    prompt_tokens = getattr(metadata, "prompt_token_count", None)
+    completion_tokens = getattr(metadata, "candidates_token_count", None)
+    if not prompt_tokens and not completion_tokens:
+        return {}
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
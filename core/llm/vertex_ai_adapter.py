@@ -1,16 +1,44 @@
 import os
+import threading
 import vertexai
-from vertexai.generative_models import GenerativeModel, SafetySetting
-from .llm_interface import LLMProvider
+from vertexai.generative_models import GenerativeModel, SafetySetting, Content, Part
+from .llm_interface import LLMProvider, record_usage
+from .token_utils import usage_from_metadata
+from .structured_output import gemini_generation_config
+from .model_cache import BoundedModelCache, HistoryBuilder
+
+# vertexai.init is process-global; only (re)initialize when project/location change
+_INITIALIZED_FOR = None
+_INIT_LOCK = threading.Lock()
+
+def _init_once(project_id, location):
+    global _INITIALIZED_FOR
+    with _INIT_LOCK:
+        if _INITIALIZED_FOR != (project_id, location):
+            vertexai.init(project=project_id, location=location)
+            _INITIALIZED_FOR = (project_id, location)
 
 class VertexAIAdapter(LLMProvider):
-    def __init__(self, project_id=None, location="us-central1", model_name="gemini-1.5-flash-001"):
+    context_window = 1048576 # gemini-1.5 models
+    backend_name = "vertex"
+
+    def __init__(self, project_id=None, location="us-central1", model_name="gemini-1.5-flash-001", model_factory=None):
+        """
+        model_factory(model_name, system_instruction) builds a model handle; defaults to
+        GenerativeModel. Pass a stub to exercise the adapter without cloud access.
+        """
         self.project_id = project_id or os.getenv("GCP_PROJECT_ID")
         self.location = location or os.getenv("GCP_LOCATION", "us-central1")
         
-        # Initialize Vertex AI SDK
-        vertexai.init(project=self.project_id, location=self.location)
+        # Initialize Vertex AI SDK (once per process)
+        if model_factory is None:
+            _init_once(self.project_id, self.location)
+            model_factory = lambda name, system_instruction: GenerativeModel(name, system_instruction=[system_instruction] if system_instruction else None)
         self.model_name = model_name
+
+        # Model handles are reused per system instruction instead of rebuilt on every call
+        self.models = BoundedModelCache(lambda system_instruction: model_factory(self.model_name, system_instruction))
+        self.history = HistoryBuilder(lambda role, content: Content(role=role, parts=[Part.from_text(content)]))
         
         # Enterprise-grade safety settings (configurable)
         self.safety_settings = [
@@ -34,34 +62,79 @@ class VertexAIAdapter(LLMProvider):
 
     def generate_content(self, prompt: str, system_instruction: str = None) -> str:
         try:
-            model = GenerativeModel(self.model_name, system_instruction=[system_instruction] if system_instruction else None)
+            model = self.models.get(system_instruction)
             response = model.generate_content(
                 prompt,
-                safety_settings=self.safety_settings
+                safety_settings=self.safety_settings,
+                generation_config=gemini_generation_config() # JSON mode when the caller asked for it
             )
+            record_usage(**usage_from_metadata(response))
             return response.text
         except Exception as e:
             print(f"🚨 Vertex AI Error: {e}")
+            record_usage(error=str(e))
             return ""
 
     def chat(self, messages: list, system_instruction: str = None) -> str:
         try:
-            model = GenerativeModel(self.model_name, system_instruction=[system_instruction] if system_instruction else None)
-            
-            # Convert messages to Vertex AI History format
-            history = []
-            last_msg = ""
+            model = self.models.get(system_instruction)
             
-            for msg in messages:
-                role = "user" if msg["role"] == "user" else "model"
-                if msg == messages[-1] and msg["role"] == "user":
-                    last_msg = msg["content"]
-                else:
-                    history.append({"role": role, "parts": [msg["content"]]})
+            # Convert messages to Vertex AI History format (unchanged turns are reused)
+            history, last_msg = self.history.build(messages)
 
             chat = model.start_chat(history=history)
-            response = chat.send_message(last_msg, safety_settings=self.safety_settings)
+            response = chat.send_message(last_msg, safety_settings=self.safety_settings, generation_config=gemini_generation_config())
+            record_usage(**usage_from_metadata(response))
             return response.text
         except Exception as e:
             print(f"🚨 Vertex AI Chat Error: {e}")
-            return ""
\ No newline at end of file
+            record_usage(error=str(e))
+            return ""
+
+    def generate_content_stream(self, prompt: str, system_instruction: str = None):
+        try:
+            model = self.models.get(system_instruction)
+            for chunk in model.generate_content(prompt, safety_settings=self.safety_settings, generation_config=gemini_generation_config(), stream=True):
+                record_usage(**usage_from_metadata(chunk)) # The final chunk carries the totals
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            print(f"🚨 Vertex AI Stream Error: {e}")
+            record_usage(error=str(e))
+
+    def chat_stream(self, messages: list, system_instruction: str = None):
+        try:
+            model = self.models.get(system_instruction)
+            history, last_msg = self.history.build(messages)
+            chat = model.start_chat(history=history)
+            for chunk in chat.send_message(last_msg, safety_settings=self.safety_settings, generation_config=gemini_generation_config(), stream=True):
+                record_usage(**usage_from_metadata(chunk)) # The final chunk carries the totals
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            print(f"🚨 Vertex AI Chat Stream Error: {e}")
+            record_usage(error=str(e))
+
+    async def _agenerate_content(self, prompt: str, system_instruction: str = None) -> str:
+        try:
+            model = self.models.get(system_instruction)
+            response = await model.generate_content_async(prompt, safety_settings=self.safety_settings, generation_config=gemini_generation_config())
+            record_usage(**usage_from_metadata(response))
+            return response.text
+        except Exception as e:
+            print(f"🚨 Vertex AI Async Generate Error: {e}")
+            record_usage(error=str(e))
+            return ""
+
+    async def _achat(self, messages: list, system_instruction: str = None) -> str:
+        try:
+            model = self.models.get(system_instruction)
+            history, last_msg = self.history.build(messages)
+            chat = model.start_chat(history=history)
+            response = await chat.send_message_async(last_msg, safety_settings=self.safety_settings, generation_config=gemini_generation_config())
+            record_usage(**usage_from_metadata(response))
+            return response.text
+        except Exception as e:
+            print(f"🚨 Vertex AI Async Chat Error: {e}")
+            record_usage(error=str(e))
+            return ""
@@ -0,0 +1,301 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from core.llm.scheduler import update_request_context
+
+# Node states
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+SOLVO_NODE = "solvo"
+DEFAULT_CLARIFICATION_ANSWER = "Proceed with your stated assumptions."
+SUTRA_INSTRUCTION = "Implement the planned code changes."
+PRAMANA_INSTRUCTION = "Generate unit tests for the generated code."
+
+class Node:
+    """
+    One step of a workflow graph.
+    run(inputs) receives {dependency_name: output} and returns a JSON-serializable output.
+    expand(output), if given, returns further nodes to add once this one is done (fan-out whose
+    width is only known at run time, e.g. one node per generated file).
+    """
+
+    def __init__(self, name, run, deps=(), expand=None, agent=None):
+        self.name = name
+        self.run = run
+        self.deps = list(deps)
+        self.expand = expand
+        self.agent = agent
+
+class DAGOrchestrator:
+    """
+    Runs a dependency graph on a thread pool: every node starts as soon as all of its
+    dependencies are done, and a node whose dependency failed is skipped.
+
+    With a checkpoint_path, each node's record (status, timings, output) is saved after it
+    settles. Running the same graph again with the same checkpoint restores the nodes that
+    finished last time instead of re-running them, so only the failed (and never reached)
+    nodes execute. Expansions are replayed from the restored outputs.
+
+    fingerprint identifies what the graph is run for (see workflow_fingerprint): a checkpoint
+    saved with a different fingerprint belongs to another workflow and is not restored.
+    """
+
+    def __init__(self, checkpoint_path=None, max_workers=4, fingerprint=None):
+        self.checkpoint_path = checkpoint_path
+        self.max_workers = max_workers
+        self.fingerprint = fingerprint
+        self.nodes = {}
+        self.records = {}
+        self.wall_seconds = None
+        self._checkpoint = self._load_checkpoint()
+
+    def add(self, node):
+        if node.name in self.nodes:
+            print(f"⚠️ Workflow node '{node.name}' already exists; keeping the first one.")
+            return
+        self.nodes[node.name] = node
+
+    def _load_checkpoint(self):
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return {}
+        try:
+            with open(self.checkpoint_path, 'r') as f:
+                checkpoint = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Ignoring unreadable workflow checkpoint {self.checkpoint_path}: {e}")
+            return {}
+        if checkpoint.get("fingerprint") != self.fingerprint:
+            print(f"⚠️ Ignoring workflow checkpoint {self.checkpoint_path}: it was saved for a different request or settings.")
+            return {}
+        records = checkpoint.get("records", {})
+        done = {name: r for name, r in records.items() if r.get("status") == DONE}
+        print(f"♻️ Resuming workflow: {len(done)} finished nodes restored from {self.checkpoint_path}")
+        return done
+
+    def _save_checkpoint(self):
+        if not self.checkpoint_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.checkpoint_path)), exist_ok=True)
+        # Restored records are kept too, so the checkpoint always describes the whole graph
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"fingerprint": self.fingerprint, "records": {**self._checkpoint, **self.records}}, f, indent=2, default=str)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _execute(self, node, inputs, run_started):
+        update_request_context(agent=node.agent, stage=node.name)
+        started = time.perf_counter()
+        record = {"status": DONE, "started_at": round(started - run_started, 3)}
+        try:
+            record["output"] = node.run(inputs)
+        except Exception as e:
+            record["status"] = FAILED
+            record["error"] = str(e)
+        finished = time.perf_counter()
+        record["seconds"] = round(finished - started, 3)
+        record["finished_at"] = round(finished - run_started, 3)
+        return record
+
+    def _settle(self, node, record):
+        self.records[node.name] = record
+        icon = {DONE: "✅", FAILED: "🚨", SKIPPED: "⏭️"}[record["status"]]
+        detail = record.get("error") or ("restored" if record.get("restored") else f"{record.get('seconds', 0):.2f}s")
+        print(f"{icon} Workflow node '{node.name}': {record['status']} ({detail})")
+        if record["status"] == DONE and node.expand:
+            for child in node.expand(record["output"]) or []:
+                self.add(child)
+
+    def run(self):
+        """Runs every node that can run; returns {name: record}."""
+        self.records = {}
+        run_started = time.perf_counter()
+        running = {} # future -> node
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="workflow") as executor:
+            while True:
+                changed = False
+                for name, node in list(self.nodes.items()):
+                    if name in self.records or node in running.values():
+                        continue
+                    dep_states = [self.records[d]["status"] if d in self.records else None for d in node.deps]
+                    if any(s in (FAILED, SKIPPED) for s in dep_states):
+                        self._settle(node, {"status": SKIPPED, "error": "upstream node did not finish"})
+                        changed = True
+                    elif all(s == DONE for s in dep_states):
+                        if name in self._checkpoint:
+                            self._settle(node, {**self._checkpoint[name], "restored": True})
+                            changed = True
+                        else:
+                            inputs = {d: self.records[d]["output"] for d in node.deps}
+                            # Each node runs in a copy of the caller's context (user, priority, session)
+                            future = executor.submit(contextvars.copy_context().run, self._execute, node, inputs, run_started)
+                            running[future] = node
+
+                if changed:
+                    continue
+                if not running:
+                    break
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    self._settle(running.pop(future), future.result())
+                self._save_checkpoint()
+
+        # Nodes waiting on a dependency that never appeared
+        for name, node in self.nodes.items():
+            if name not in self.records:
+                self._settle(node, {"status": SKIPPED, "error": f"missing dependency in {node.deps}"})
+        self.wall_seconds = round(time.perf_counter() - run_started, 3)
+        self._save_checkpoint()
+        return self.records
+
+    @property
+    def failed(self):
+        return [name for name, r in self.records.items() if r["status"] != DONE]
+
+    def timings(self):
+        """Per-node seconds and start/finish offsets, plus wall time and achieved parallelism."""
+        busy = sum(r.get("seconds", 0) for r in self.records.values() if not r.get("restored"))
+        return {
+            "wall_seconds": self.wall_seconds,
+            "node_seconds": round(busy, 3),
+            "parallelism": round(busy / self.wall_seconds, 2) if self.wall_seconds else None,
+            "nodes": {
+                name: {k: r.get(k) for k in ("status", "seconds", "started_at", "finished_at", "restored", "error")}
+                for name, r in self.records.items()
+            }
+        }
+
+def format_timings(timings):
+    """Plain-text table of timings() for CLIs and logs."""
+    lines = [f"{'node':<60} {'status':<8} {'seconds':>8} {'start':>8} {'end':>8}"]
+    fmt = lambda v: f"{v:.2f}" if isinstance(v, (int, float)) else "-"
+    for name, t in sorted(timings["nodes"].items(), key=lambda item: item[1].get("started_at") or 0):
+        status = "restored" if t.get("restored") else t["status"]
+        lines.append(f"{name[:60]:<60} {status:<8} {fmt(t.get('seconds')):>8} {fmt(t.get('started_at')):>8} {fmt(t.get('finished_at')):>8}")
+    lines.append(f"Wall {fmt(timings['wall_seconds'])}s · node time {fmt(timings['node_seconds'])}s · parallelism {timings['parallelism']}")
+    return "\n".join(lines)
+
+def workflow_fingerprint(*parts):
+    """Hash of what a workflow runs for (e.g. request, db path, collection, profile), for DAGOrchestrator."""
+    return hashlib.sha256(json.dumps(parts, default=str).encode("utf-8")).hexdigest()
+
+def run_solvo_session(request, db_path, collection_name, config=None, session_id=None,
+                      clarification_answer=DEFAULT_CLARIFICATION_ANSWER, max_clarifications=3):
+    """
+    Drives Solvo without a user: its clarifying questions get `clarification_answer` (a string, or a
+    callable that receives the questions) until it is DONE or `max_clarifications` replies were sent.
+    DigitalOne advances one stage per turn, so the same loop carries it to the final report.
+    Returns (agent, session_data, turns).
+    """
+    from agents.Solvo.agent import SolvoAgent
+    solvo = SolvoAgent(db_path, collection_name, "solvo", config or {})
+    session_data = {"session_id": session_id or f"workflow_{uuid.uuid4().hex[:8]}", "conversation_history": [], "rag_refs": None, "final_solution": None}
+    solvo.execute(request, session_data)
+    turns = 0
+    while solvo.state != "DONE" and turns < max_clarifications:
+        questions = session_data.get("last_agent_response", "")
+        answer = clarification_answer(questions) if callable(clarification_answer) else clarification_answer
+        solvo.execute(answer, session_data)
+        turns += 1
+    return solvo, session_data, turns
+
+def build_delivery_chain(orchestrator, request, db_path, collection_name, config=None, session_id=None,
+                         clarification_answer=DEFAULT_CLARIFICATION_ANSWER, max_clarifications=3):
+    """
+    Adds the Solvo → Sutra (one node per planned file) → Pramana (one node per generated file)
+    graph for `request` to `orchestrator`. clarification_answer is a string, or a callable that
+    receives Solvo's questions and returns the reply.
+    """
+    config = config or {}
+    session_id = session_id or f"workflow_{uuid.uuid4().hex[:8]}"
+
+    def run_solvo(inputs):
+        _, session_data, turns = run_solvo_session(request, db_path, collection_name, config, session_id,
+                                                   clarification_answer, max_clarifications)
+        solution = session_data.get("final_solution")
+        if not solution:
+            raise RuntimeError((session_data.get("last_agent_response") or "Solvo produced no solution")[:300])
+        return {"final_solution": solution, "plan": json.dumps(solution, indent=2), "clarification_turns": turns}
+
+    def run_sutra(file_task):
+        def run(inputs):
+            from agents.Sutra.agent import SutraAgent
+            plan = inputs[SOLVO_NODE]["plan"]
+            sutra = SutraAgent(db_path, collection_name, "coder", config)
+            if file_task is None:
+                result_json, response_text = sutra.generate(SUTRA_INSTRUCTION, plan)
+            else:
+                result_json, response_text = sutra.generate_file(SUTRA_INSTRUCTION, plan, file_task)
+            if not result_json:
+                raise RuntimeError(f"Sutra returned no usable code: {(response_text or 'empty response')[:200]}")
+            return result_json
+        return run
+
+    def run_pramana(file, explanation, sutra_name):
+        def run(inputs):
+            from agents.Pramana.agent import PramanaAgent
+            from agents.Sutra.agent import format_code_output
+            code = format_code_output({"files": [file], "explanation": explanation})
+            result_json, response = PramanaAgent(db_path, collection_name, "qa", config).generate_tests(
+                code, inputs[SOLVO_NODE]["plan"], PRAMANA_INSTRUCTION)
+            if not result_json:
+                raise RuntimeError(f"Pramana returned no usable tests: {(response.text if response else 'empty response')[:200]}")
+            # Which Sutra node's version of the file was tested (collect_artifacts reports that one)
+            return {**result_json, "sutra_node": sutra_name}
+        return run
+
+    def expand_sutra(sutra_name):
+        # A path generated by several Sutra nodes is tested once, for the node that settles first
+        def expand(output):
+            return [
+                Node(f"pramana:{file['path']}", run_pramana(file, output.get("explanation", ""), sutra_name), deps=[SOLVO_NODE, sutra_name], agent="Pramana")
+                for file in output.get("files", []) if file.get("path")
+            ]
+        return expand
+
+    def expand_solvo(output):
+        from agents.Sutra.file_tasks import extract_file_tasks
+        file_tasks = extract_file_tasks({"final_solution": output["final_solution"], "uploaded_doc_content": output["plan"]})
+        if not file_tasks:
+            return [Node("sutra", run_sutra(None), deps=[SOLVO_NODE], expand=expand_sutra("sutra"), agent="Sutra")]
+        return [
+            Node(f"sutra:{task['path']}", run_sutra(task), deps=[SOLVO_NODE], expand=expand_sutra(f"sutra:{task['path']}"), agent="Sutra")
+            for task in file_tasks
+        ]
+
+    orchestrator.add(Node(SOLVO_NODE, run_solvo, expand=expand_solvo, agent="Solvo"))
+    return orchestrator
+
+def collect_artifacts(records):
+    """
+    The chain's results from orchestrator records: the solution, generated files and test files.
+    A path generated by more than one Sutra node is reported once: the version that was tested, else the first.
+    """
+    artifacts = {"final_solution": None, "files": [], "test_files": [], "test_plan_summaries": []}
+    done = {name: r["output"] for name, r in records.items() if r.get("status") == DONE and r.get("output")}
+    tested = {}  # path -> Sutra node whose version Pramana tested
+    for name, output in done.items():
+        if name == SOLVO_NODE:
+            artifacts["final_solution"] = output["final_solution"]
+        elif name.startswith("pramana:"):
+            tested[name[len("pramana:"):]] = output.get("sutra_node")
+            artifacts["test_files"].extend(output.get("test_files", []))
+            if output.get("test_plan_summary"):
+                artifacts["test_plan_summaries"].append(output["test_plan_summary"])
+
+    files = {}
+    for name, output in done.items():
+        if not name.startswith("sutra"):
+            continue
+        for file in output.get("files", []):
+            path = file.get("path")
+            if path not in files or tested.get(path) == name:
+                files[path] = file
+    artifacts["files"] = list(files.values())
+    return artifacts
@@ -1,6 +1,23 @@
+import os
 import regex as re
 from tree_sitter_languages import get_parser, get_language
 
+# File extension -> language key understood by chunk_code_by_functions
+EXTENSION_LANGUAGES = {
+    ".py": "python",
+    ".c": "c", ".h": "c", ".cpp": "c", ".hpp": "c", ".cc": "c",
+    ".pc": "proc", ".ppc": "proc", ".ph": "proc",
+    ".cbl": "cobol", ".cob": "cobol", ".pco": "cobol",
+    ".sh": "shell", ".bash": "shell", ".zsh": "shell", ".ksh": "shell",
+    ".md": "document", ".txt": "document", ".rst": "document",
+    ".java": "java",
+}
+
+def detect_language(file_path, default=None):
+    """Maps a file path to a language key based on its extension."""
+    _, ext = os.path.splitext(file_path)
+    return EXTENSION_LANGUAGES.get(ext.lower(), default)
+
 def _chunk_cobol_file(file_path, file_content):
     """
     A specialized chunker for COBOL (.cbl, .cob) and Pro*COBOL (.pco) files.
@@ -0,0 +1,196 @@
+import os
+import json
+import random
+import time
+import chromadb
+from sentence_transformers import SentenceTransformer
+from core.utils.stats import summarize_latencies
+
+STAGES = ["encode", "vector_query", "keyword_search", "merge"]
+
+# --- EVAL SET ---
+
+def load_eval_queries(queries_path):
+    """
+    Loads a JSONL eval set. Each line looks like:
+    {"query": "...", "expected_files": ["billing/Discount.java"], "expected_symbols": ["applyDiscount"]}
+    An optional "filters" dict (e.g. {"language": "cobol"}) is passed through to the Retriever.
+    """
+    cases = []
+    with open(queries_path, 'r') as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                case = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"⚠️ Skipping line {line_no}: invalid JSON ({e})")
+                continue
+            if not case.get("query") or not (case.get("expected_files") or case.get("expected_symbols")):
+                print(f"⚠️ Skipping line {line_no}: needs 'query' and 'expected_files' or 'expected_symbols'")
+                continue
+            cases.append(case)
+    return cases
+
+def _normalize_path(path):
+    return path.replace('\\', '/').lower()
+
+def _matched_targets(chunk, case):
+    """Returns the set of expected files/symbols satisfied by a single retrieved chunk."""
+    matched = set()
+    file_path = _normalize_path(chunk["metadata"].get("file_path", ""))
+    for expected in case.get("expected_files", []):
+        if file_path.endswith(_normalize_path(expected)):
+            matched.add(("file", expected))
+    for symbol in case.get("expected_symbols", []):
+        if symbol in chunk["document"]:
+            matched.add(("symbol", symbol))
+    return matched
+
+# --- EVALUATION ---
+
+def evaluate(retriever, cases, k_values=(1, 5, 10), top_k=15, warmup=1):
+    """
+    Runs every eval case through `retriever.retrieve` and returns a report with
+    recall@k, MRR and latency percentiles (total and per stage).
+    """
+    for case in cases[:warmup]:
+        # Warm up the embedding model so the first query does not skew the latencies
+        retriever.retrieve(case["query"], top_k=top_k)
+
+    recall_sums = {k: 0.0 for k in k_values}
+    reciprocal_ranks = []
+    totals = []
+    stage_times = {stage: [] for stage in STAGES}
+    per_query = []
+
+    for case in cases:
+        timings = {}
+        t0 = time.perf_counter()
+        chunks = retriever.retrieve(case["query"], top_k=top_k, timings=timings, filters=case.get("filters"))
+        totals.append(time.perf_counter() - t0)
+        for stage in STAGES:
+            stage_times[stage].append(timings.get(stage, 0.0))
+
+        targets = {("file", f) for f in case.get("expected_files", [])} | {("symbol", s) for s in case.get("expected_symbols", [])}
+        found_by_rank = []
+        first_rank = None
+        found = set()
+        for rank, chunk in enumerate(chunks, 1):
+            matched = _matched_targets(chunk, case)
+            if matched and first_rank is None:
+                first_rank = rank
+            found |= matched
+            found_by_rank.append(set(found))
+
+        for k in k_values:
+            hits = found_by_rank[min(k, len(found_by_rank)) - 1] if found_by_rank else set()
+            recall_sums[k] += len(hits & targets) / len(targets)
+        reciprocal_ranks.append(1.0 / first_rank if first_rank else 0.0)
+        per_query.append({"query": case["query"], "first_relevant_rank": first_rank, "retrieved": len(chunks)})
+
+    n = len(cases) or 1
+    return {
+        "queries": len(cases),
+        "top_k": top_k,
+        "recall": {f"@{k}": recall_sums[k] / n for k in k_values},
+        "mrr": sum(reciprocal_ranks) / n,
+        "latency": summarize_latencies(totals),
+        "stages": {stage: summarize_latencies(stage_times[stage]) for stage in STAGES},
+        "per_query": per_query
+    }
+
+def format_report(report):
+    """Human-readable summary of an `evaluate` report."""
+    def ms(value):
+        return "-" if value is None else f"{value * 1000:8.1f}"
+
+    lines = [f"📊 Retrieval Evaluation ({report['queries']} queries, top_k={report['top_k']})", ""]
+    for label, value in report["recall"].items():
+        lines.append(f"  Recall{label:<5} {value:.3f}")
+    lines.append(f"  MRR         {report['mrr']:.3f}")
+    lines.append("")
+    lines.append(f"  {'Stage':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, summary in list(report["stages"].items()) + [("total", report["latency"])]:
+        lines.append(f"  {stage:<16}{ms(summary['p50']):>10}{ms(summary['p95']):>10}{ms(summary['p99']):>10}")
+    return "\n".join(lines)
+
+# --- SYNTHETIC COLLECTION (Offline Regression Checks) ---
+
+SYNTHETIC_MODULES = {
+    "billing": ["invoice", "discount", "tax", "payment"],
+    "orders": ["cart", "shipment", "refund", "checkout"],
+    "customers": ["profile", "address", "loyalty", "consent"],
+}
+
+def _java_source(module, entity, rng):
+    cls = entity.capitalize() + "Service"
+    methods = [f"{verb}{entity.capitalize()}" for verb in rng.sample(["calculate", "validate", "apply", "load", "persist", "cancel"], 3)]
+    body = "\n\n".join(
+        f"    /** {m} handles the {entity} rules for the {module} module. */\n"
+        f"    public void {m}(String accountId) {{\n        log.info(\"{m} \" + accountId);\n    }}"
+        for m in methods
+    )
+    return cls, methods, f"package com.spectra.{module};\n\npublic class {cls} {{\n{body}\n}}\n"
+
+def _cobol_source(module, entity):
+    program = f"{module[:3].upper()}{entity[:4].upper()}01"
+    paragraph = f"PROCESS-{entity.upper()}"
+    return program, paragraph, (
+        "       IDENTIFICATION DIVISION.\n"
+        f"       PROGRAM-ID. {program}.\n"
+        "       DATA DIVISION.\n"
+        "       WORKING-STORAGE SECTION.\n"
+        f"       01 WS-{entity.upper()}-TOTAL PIC 9(7)V99.\n"
+        "       PROCEDURE DIVISION.\n"
+        f"       {paragraph} SECTION.\n"
+        f"           DISPLAY 'PROCESSING {entity.upper()} FOR {module.upper()}'.\n"
+        "           STOP RUN.\n"
+    )
+
+def build_synthetic_corpus(target_dir, seed=42):
+    """
+    Writes a small, deterministic multi-language codebase into `target_dir` and returns
+    the matching eval cases (query + expected files/symbols).
+    """
+    rng = random.Random(seed)
+    cases = []
+    for module, entities in SYNTHETIC_MODULES.items():
+        for entity in entities:
+            cls, methods, java = _java_source(module, entity, rng)
+            java_rel = f"{module}/src/main/java/com/spectra/{module}/{cls}.java"
+            program, paragraph, cobol = _cobol_source(module, entity)
+            cobol_rel = f"{module}/cobol/{program}.cbl"
+
+            for rel, content in ((java_rel, java), (cobol_rel, cobol)):
+                path = os.path.join(target_dir, rel)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'w') as f:
+                    f.write(content)
+
+            cases.append({"query": f"Where is {methods[0]} implemented?", "expected_files": [java_rel], "expected_symbols": [methods[0]]})
+            cases.append({"query": f"How does the {module} module handle {entity} rules?", "expected_files": [java_rel]})
+            cases.append({"query": f"Which COBOL program processes {entity} for {module}?", "expected_files": [cobol_rel], "expected_symbols": [paragraph]})
+    return cases
+
+def build_synthetic_collection(db_path, collection_name, corpus_dir, seed=42):
+    """
+    Generates the synthetic corpus, indexes it into a local Chroma collection with the
+    cached embedding model and returns the eval cases. Runs fully offline.
+    """
+    from .indexer import process_codebase_generator, upload_batch_to_chromadb, update_collection_modules, EMBEDDING_MODEL_NAME, MODEL_CACHE_PATH
+
+    cases = build_synthetic_corpus(corpus_dir, seed=seed)
+    embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME, cache_folder=MODEL_CACHE_PATH, local_files_only=True)
+    client = chromadb.PersistentClient(path=db_path)
+    try:
+        client.delete_collection(collection_name)
+    except Exception:
+        pass
+    collection = client.create_collection(name=collection_name)
+
+    for texts, metas, ids in process_codebase_generator(corpus_dir, [], [], 0, batch_size=500):
+        upload_batch_to_chromadb(collection, embedding_model, texts, metas, ids)
+        update_collection_modules(collection, metas)
+    print(f"✅ Synthetic collection '{collection_name}' ready with {collection.count()} chunks.")
+    return cases
@@ -0,0 +1,184 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .retriever import Retriever, format_context, merge_ranked, make_context_refs, chunks_from_refs, collection_version
+
+# Score of the first keyword hit of a collection; later hits decay by rank (KEYWORD_SCORE * 10 / (10 + rank)).
+# Below 1.0 so that a close semantic match still outranks an incidental keyword match.
+KEYWORD_SCORE = float(os.getenv("SPECTRA_FEDERATED_KEYWORD_SCORE", "0.8"))
+KEYWORD_RANK_DECAY = 10
+
+class FederatedRetriever:
+    """
+    Queries several collections in parallel from a single query embedding, scores
+    their hits on one scale and merges the results under one budget. Exposes the same
+    retrieve / format_context / get_context_for_request API as Retriever.
+    """
+
+    def __init__(self, db_path, collections, code_languages=None, infer_filters=False):
+        """
+        collections: list of collection names or {"name": ..., "weight": ...} dicts.
+        The first entry is the primary collection. Missing secondary collections are skipped.
+        """
+        self.db_path = db_path
+        self.members = []  # (retriever, weight)
+
+        for i, entry in enumerate(collections):
+            spec = entry if isinstance(entry, dict) else {"name": entry}
+            try:
+                retriever = Retriever(db_path, spec["name"], code_languages=code_languages, infer_filters=infer_filters)
+                self.members.append((retriever, float(spec.get("weight", 1.0))))
+            except Exception as e:
+                if i == 0:
+                    raise
+                print(f"⚠️ Skipping collection '{spec['name']}' in federated retrieval: {e}")
+
+        self.collection_name = self.members[0][0].collection_name
+        self.collection = self.members[0][0].collection
+        self.executor = ThreadPoolExecutor(max_workers=len(self.members), thread_name_prefix="federated-retriever")
+
+    @staticmethod
+    def _normalize(chunks, weight, space="l2"):
+        """
+        Turns each chunk's vector distance into an absolute similarity in [0, 1], so scores
+        from different collections are comparable, then applies the collection's weight.
+        `space` is the collection's hnsw:space: cosine and ip distances are 1 - similarity;
+        Chroma's l2 is the squared distance, 2 - 2 * cosine for normalized embeddings.
+        Keyword hits have no distance and are scored by their rank among the keyword hits.
+        """
+        keyword_rank = 0
+        for chunk in chunks:
+            if chunk["distance"] is None:
+                score = KEYWORD_SCORE * KEYWORD_RANK_DECAY / (KEYWORD_RANK_DECAY + keyword_rank)
+                keyword_rank += 1
+            elif space == "l2":
+                score = 1.0 - chunk["distance"] / 2.0
+            else:
+                score = 1.0 - chunk["distance"]
+            chunk["score"] = min(max(score, 0.0), 1.0) * weight
+        return chunks
+
+    def _fan_out(self, queries, top_k, filters, query_embeddings):
+        """
+        Runs the queries against every collection in parallel (one batched retrieval per collection).
+        Returns (for each query, the scored chunks of all collections) and each member's stage timings.
+        """
+        def run(member):
+            retriever, weight = member
+            member_timings = {}
+            per_query = retriever.retrieve_batch(queries, top_k=top_k, timings=member_timings, filters=filters, query_embeddings=query_embeddings)
+            space = (retriever.collection.metadata or {}).get("hnsw:space", "l2")
+            for chunks in per_query:
+                for chunk in chunks:
+                    chunk["collection"] = retriever.collection_name
+                self._normalize(chunks, weight, space)
+            return per_query, member_timings
+
+        candidates = [[] for _ in queries]
+        member_timings = []
+        for future in [self.executor.submit(run, m) for m in self.members]:
+            try:
+                per_query, t = future.result()
+            except Exception as e:
+                print(f"    Warning: Federated query failed for one collection: {e}")
+                continue
+            member_timings.append(t)
+            for i, chunks in enumerate(per_query):
+                candidates[i].extend(chunks)
+        return candidates, member_timings
+
+    @staticmethod
+    def _merge(candidates, top_k):
+        """One budget across collections: best scores first, duplicates dropped."""
+        seen_content = set()
+        merged = []
+        for chunk in sorted(candidates, key=lambda c: c["score"], reverse=True):
+            if chunk["document"] not in seen_content:
+                merged.append(chunk)
+                seen_content.add(chunk["document"])
+        return merged[:int(top_k * 1.5)]
+
+    def retrieve(self, business_request, top_k=15, timings=None, filters=None, query_embedding=None):
+        timings = timings if timings is not None else {}
+
+        # 1. Encode once for every collection
+        primary = self.members[0][0]
+        t0 = time.perf_counter()
+        if query_embedding is None:
+            query_embedding = primary.encode(business_request)
+        timings["encode"] = time.perf_counter() - t0
+
+        # 2. Fan out
+        candidates, member_timings = self._fan_out([business_request], top_k, filters, [query_embedding])
+
+        # Collections run concurrently, so the slowest one bounds each stage
+        for stage in ("vector_query", "keyword_search"):
+            timings[stage] = max((t.get(stage, 0.0) for t in member_timings), default=0.0)
+
+        # 3. Merge under one budget
+        t0 = time.perf_counter()
+        merged = self._merge(candidates[0], top_k)
+        timings["merge"] = time.perf_counter() - t0
+        return merged
+
+    def retrieve_many(self, queries, top_k=15, filters=None):
+        """Encoded once, one batched query per collection; each query's results merged, then merge_ranked()."""
+        queries = list(queries)
+        embeddings = list(self.members[0][0].embedding_model.encode(queries)) if queries else []
+        candidates, _ = self._fan_out(queries, top_k, filters, embeddings)
+        return merge_ranked([self._merge(chunks, top_k) for chunks in candidates], int(top_k * 1.5))
+
+    def format_context(self, chunks):
+        return format_context(chunks)
+
+    def context_refs(self, chunks):
+        used = {chunk.get("collection") for chunk in chunks}
+        versions = {r.collection_name: collection_version(r.collection) for r, _ in self.members if r.collection_name in used}
+        return make_context_refs(chunks, self.collection_name, versions)
+
+    def context_from_refs(self, refs):
+        try:
+            fetchers = {r.collection_name: (r.fetch, collection_version(r.collection)) for r, _ in self.members}
+            return self.format_context(chunks_from_refs(refs, fetchers))
+        except Exception as e:
+            print(f"🚨 Error rebuilding context from refs: {e}")
+            return "# CONTEXT RETRIEVAL FAILED\n"
+
+    def get_context_with_refs(self, business_request, top_k=15, filters=None):
+        print(f"Retrieving federated context ({len(self.members)} collections) for: '{business_request}'")
+        try:
+            chunks = self.retrieve(business_request, top_k=top_k, filters=filters)
+            return self.format_context(chunks), self.context_refs(chunks)
+        except Exception as e:
+            print(f"🚨 Error during context retrieval: {e}")
+            return "# CONTEXT RETRIEVAL FAILED\n", None
+
+    def get_context_for_request(self, business_request, top_k=15, filters=None):
+        print(f"Retrieving federated context ({len(self.members)} collections) for: '{business_request}'")
+        try:
+            chunks = self.retrieve(business_request, top_k=top_k, filters=filters)
+            return self.format_context(chunks)
+        except Exception as e:
+            print(f"🚨 Error during context retrieval: {e}")
+            return "# CONTEXT RETRIEVAL FAILED\n"
+
+    def get_context_for_requests(self, queries, top_k=15, filters=None):
+        print(f"Retrieving federated context ({len(self.members)} collections) for {len(queries)} queries (batched)")
+        try:
+            chunks = self.retrieve_many(queries, top_k=top_k, filters=filters)
+            return self.format_context(chunks)
+        except Exception as e:
+            print(f"🚨 Error during context retrieval: {e}")
+            return "# CONTEXT RETRIEVAL FAILED\n"
+
+def create_retriever(db_path, collection_name, kb_config=None):
+    """
+    Builds the retriever described by a profile's `knowledge_base` section.
+    If it lists extra `collections`, they are federated with the selected collection.
+    """
+    kb_config = kb_config or {}
+    options = {"code_languages": kb_config.get("code_languages"), "infer_filters": kb_config.get("infer_filters", False)}
+    extra = [c for c in kb_config.get("collections", []) if (c.get("name") if isinstance(c, dict) else c) != collection_name]
+    if not extra:
+        return Retriever(db_path, collection_name, **options)
+    return FederatedRetriever(db_path, [collection_name] + extra, **options)
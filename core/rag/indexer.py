@@ -6,7 +6,7 @@ import sys
 import time
 from collections import Counter
 from sentence_transformers import SentenceTransformer
-from .chunker import chunk_code_by_functions
+from .chunker import chunk_code_by_functions, detect_language
 import subprocess
 import tempfile
 import shutil
@@ -273,6 +273,41 @@ def fetch_confluence_documents(config):
         return fetch_confluence_documents_via_scraping(conf_config)
 
 
+def build_file_metadata(codebase_path, file_path, language):
+    """
+    File-level metadata attached to every chunk so queries can be pre-filtered
+    with Chroma `where` clauses (language, top-level module, package path, mtime).
+    """
+    relative_path = os.path.relpath(file_path, codebase_path).replace(os.sep, '/')
+    parts = relative_path.split('/')
+    return {
+        "language": language,
+        "module": parts[0] if len(parts) > 1 else "",
+        "package": '/'.join(parts[:-1]),
+        "relative_path": relative_path,
+        "mtime": int(os.path.getmtime(file_path))
+    }
+
+def update_collection_modules(collection, chunk_metadatas):
+    """
+    Records the set of indexed top-level modules on the collection metadata,
+    so the Retriever can infer module filters without scanning every chunk.
+    """
+    modules = {m.get("module") for m in chunk_metadatas if m.get("module")}
+    if not modules:
+        return
+    # hnsw:* keys cannot be modified after creation, so only carry over our own keys
+    metadata = {k: v for k, v in (collection.metadata or {}).items() if not k.startswith("hnsw:")}
+    known = {m for m in metadata.get("modules", "").split(",") if m}
+    if modules <= known:
+        return
+    metadata["modules"] = ",".join(sorted(known | modules))
+    try:
+        collection.modify(metadata=metadata)
+    except Exception as e:
+        print(f"⚠️ Could not record module list on collection: {e}")
+
+
 def process_codebase_generator(codebase_path, blacklisted_extensions, ignored_dirs, start_id_counter, batch_size=1000):
     """
     Generator that yields batches of chunks from the codebase.
@@ -302,17 +337,13 @@ def process_codebase_generator(codebase_path, blacklisted_extensions, ignored_di
             
             if ext_lower in BLACKLISTED_EXTENSIONS: continue
             
-            # Determine language
-            language = "java" 
-            if ext_lower == ".py": language = "python"
-            elif ext_lower in [".c", ".h", ".cpp", ".hpp", ".cc"]: language = "c"
-            elif ext_lower in [".pc", ".ppc", ".ph"]: language = "proc"
-            elif ext_lower in [".cbl", ".cob", ".pco"]: language = "cobol"
-            elif ext_lower in [".sh", ".bash", ".zsh", ".ksh"]: language = "shell"
-            elif ext_lower in [".md", ".txt", ".rst"]: language = "document"
+            # Determine language (unknown extensions keep the Java chunker)
+            detected_language = detect_language(file_path)
+            language = detected_language or "java"
             
             try:
                 file_size = os.path.getsize(file_path)
+                file_metadata = build_file_metadata(codebase_path, file_path, detected_language or "other")
                 if file_size > 1 * 1024 * 1024:
                     print(f"DEBUG: Processing large file ({file_size} bytes): {file_path}")
 
@@ -323,7 +354,7 @@ def process_codebase_generator(codebase_path, blacklisted_extensions, ignored_di
                     chunks_with_metadata = chunk_code_by_functions(file_path, content, language=language)
                     for chunk_data in chunks_with_metadata:
                         chunk_texts.append(chunk_data["text_chunk"])
-                        chunk_metadatas.append(chunk_data["metadata"])
+                        chunk_metadatas.append({**chunk_data["metadata"], **file_metadata})
                         chunk_ids.append(f"chunk_{chunk_id_counter}")
                         chunk_id_counter += 1
                 
@@ -1,6 +1,9 @@
 import chromadb
 from sentence_transformers import SentenceTransformer
 import os
+import re
+import time
+import threading
 
 # --- Constants ---
 # Set to offline mode
@@ -8,104 +11,365 @@ os.environ['TRANSFORMERS_OFFLINE'] = '1'
 EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
 MODEL_CACHE_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'model_cache')
 
-class Retriever:
-    def __init__(self, db_path, collection_name):
-        self.db_path = db_path
-        self.collection_name = collection_name
-        
-        try:
-            self.client = chromadb.PersistentClient(path=self.db_path)
-            self.collection = self.client.get_collection(name=self.collection_name)
-            
+# Filter out common English words (optional, but good for noise reduction)
+COMMON_WORDS = {"what", "where", "when", "function", "code", "file", "does", "this", "help", "find", "show", "tell"}
+
+# Query phrases that signal a language. Only languages listed in the profile's code_languages are inferred.
+LANGUAGE_HINTS = {
+    "cobol": [r'(?i)\bcobol\b', r'(?i)\bcopybooks?\b', r'(?i)\bprocedure division\b'],
+    "proc": [r'(?i)\bpro\*c\b', r'(?i)\bexec sql\b'],
+    "java": [r'(?i)\bjava\b'],
+    "python": [r'(?i)\bpython\b'],
+    "c": [r'(?<![\w*])C(?![\w+#])'],
+    "shell": [r'(?i)\bshell scripts?\b', r'(?i)\b(?:bash|ksh)\b'],
+}
+
+def build_where(filters):
+    """
+    Converts a simple filter dict into a Chroma `where` clause.
+    e.g. {"language": ["cobol", "proc"], "module": "billing"} ->
+         {"$and": [{"language": {"$in": ["cobol", "proc"]}}, {"module": "billing"}]}
+    """
+    clauses = []
+    for key, value in (filters or {}).items():
+        if value in (None, "", [], ()):
+            continue
+        if isinstance(value, (list, tuple, set)):
+            values = sorted(value)
+            clauses.append({key: values[0]} if len(values) == 1 else {key: {"$in": values}})
+        else:
+            # Scalars and pre-built operator dicts ({"$gte": ...}) pass straight through
+            clauses.append({key: value})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+_EMBEDDING_MODEL = None
+_CLIENTS = {}
+_CACHE_LOCK = threading.Lock()
+
+def get_embedding_model():
+    """Loads the local embedding model once per process and shares it across Retrievers."""
+    global _EMBEDDING_MODEL
+    with _CACHE_LOCK:
+        if _EMBEDDING_MODEL is None:
             abs_cache_path = os.path.abspath(MODEL_CACHE_PATH)
             print(f"Loading local embedding model: {EMBEDDING_MODEL_NAME} from {abs_cache_path}")
-            
             # Use local_files_only to prevent network calls
-            self.embedding_model = SentenceTransformer(
-                EMBEDDING_MODEL_NAME, 
+            _EMBEDDING_MODEL = SentenceTransformer(
+                EMBEDDING_MODEL_NAME,
                 cache_folder=abs_cache_path,
                 local_files_only=True
             )
+        return _EMBEDDING_MODEL
+
+def get_client(db_path):
+    """Returns one Chroma client per database path for the whole process."""
+    key = os.path.abspath(db_path)
+    with _CACHE_LOCK:
+        if key not in _CLIENTS:
+            _CLIENTS[key] = chromadb.PersistentClient(path=db_path)
+        return _CLIENTS[key]
+
+def format_context(chunks):
+    """Renders retrieved chunks as the markdown context block consumed by the agents."""
+    if not chunks:
+        print("⚠️ No relevant context found in ChromaDB.")
+        return "# CONTEXT\nNo relevant context found.\n"
+
+    context_block = "# CONTEXT FROM EXISTING APPLICATION\n\n---\n"
+    print(f"✅ Retrieved {len(chunks)} relevant chunks (Merged Semantic + Keyword). Sources:")
+    for chunk in chunks:
+        metadata = chunk["metadata"]
+        file_path = metadata.get('file_path') or metadata.get('source', 'Unknown Path')
+        print(f"   - {file_path} (Type: {metadata.get('type', 'N/A')})")
+        context_block += f"### FILE: {file_path}\n```\n{chunk['document']}\n```\n---\n"
+    return context_block
+
+def collection_version(collection):
+    """Identifies one build of a collection: re-creating or re-indexing it changes the version."""
+    try:
+        return f"{collection.id}:{collection.count()}"
+    except Exception:
+        return None
+
+def make_context_refs(chunks, default_collection, versions):
+    """
+    Compact record of a retrieval (chunk ids, scores, collection versions) that is stored in
+    sessions instead of the rendered context; context_from_refs() turns it back into the same block.
+    """
+    return {
+        "collections": versions,
+        "chunks": [{
+            "id": chunk["id"],
+            "collection": chunk.get("collection", default_collection),
+            "score": chunk.get("score", chunk.get("distance")),
+            "source": chunk.get("source")
+        } for chunk in chunks]
+    }
+
+def chunks_from_refs(refs, fetchers):
+    """
+    Re-reads the chunks named in `refs`, in their original order. fetchers maps a collection name
+    to (fetch(ids) -> {id: (document, metadata)}, current version). Chunks that are gone are skipped.
+    """
+    by_collection = {}
+    for ref in refs.get("chunks", []):
+        by_collection.setdefault(ref["collection"], []).append(ref["id"])
+
+    found = {}
+    for name, ids in by_collection.items():
+        if name not in fetchers:
+            print(f"⚠️ Context refs point to collection '{name}', which is not available.")
+            continue
+        fetch, version = fetchers[name]
+        if version != refs.get("collections", {}).get(name):
+            print(f"⚠️ Collection '{name}' was re-indexed since this context was retrieved; rebuilding from the current chunks.")
+        for chunk_id, (document, metadata) in fetch(ids).items():
+            found[(name, chunk_id)] = (document, metadata)
+
+    chunks = []
+    for ref in refs.get("chunks", []):
+        hit = found.get((ref["collection"], ref["id"]))
+        if hit:
+            chunks.append({"id": ref["id"], "document": hit[0], "metadata": hit[1] or {}, "distance": None,
+                           "source": ref.get("source"), "collection": ref["collection"]})
+    missing = len(refs.get("chunks", [])) - len(chunks)
+    if missing:
+        print(f"⚠️ {missing} referenced chunks no longer exist.")
+    return chunks
+
+def merge_ranked(result_lists, limit):
+    """
+    Merges several ranked chunk lists (one per query) by taking each list's best remaining
+    hit in turn, so every query contributes its strongest matches. Duplicates are dropped.
+    """
+    seen_content = set()
+    merged = []
+    for rank in range(max((len(r) for r in result_lists), default=0)):
+        for results in result_lists:
+            if rank < len(results) and results[rank]["document"] not in seen_content:
+                merged.append(results[rank])
+                seen_content.add(results[rank]["document"])
+    return merged[:limit]
+
+class Retriever:
+    def __init__(self, db_path, collection_name, code_languages=None, infer_filters=False):
+        self.db_path = db_path
+        self.collection_name = collection_name
+        self.code_languages = set(code_languages or [])
+        self.auto_filters = infer_filters
+
+        try:
+            self.client = get_client(self.db_path)
+            self.collection = self.client.get_collection(name=self.collection_name)
+            self.embedding_model = get_embedding_model()
             print("✅ Retriever initialized successfully.")
-            
+
         except Exception as e:
             print(f"🚨 FATAL: Could not initialize retriever. DB path: '{self.db_path}'. Error: {e}")
             raise e # Re-raise the exception to halt execution
 
-    def get_context_for_request(self, business_request, top_k=15):
+    def _extract_keywords(self, business_request):
+        # Simple heuristic: look for words in the request that look like function names (snake_case or camelCase)
+        # Only match words with at least 4 chars to avoid noise
+        potential_keywords = re.findall(r'\b[a-zA-Z_][a-zA-Z0-9_]{3,}\b', business_request)
+        return [w for w in potential_keywords if w.lower() not in COMMON_WORDS]
+
+    def infer_filters(self, business_request):
+        """
+        Guesses metadata filters from the query: languages named in the request (restricted to
+        the profile's code_languages) and top-level modules recorded on the collection by the indexer.
+        """
+        filters = {}
+        languages = [
+            lang for lang, patterns in LANGUAGE_HINTS.items()
+            if lang in self.code_languages and any(re.search(p, business_request) for p in patterns)
+        ]
+        if languages:
+            filters["language"] = languages
+
+        known_modules = [m for m in ((self.collection.metadata or {}).get("modules") or "").split(",") if len(m) >= 3]
+        modules = [m for m in known_modules if re.search(rf'(?i)\b{re.escape(m)}\b', business_request)]
+        if modules:
+            filters["module"] = modules
+        return filters
+
+    def encode(self, business_request):
+        return self.embedding_model.encode(business_request)
+
+    def _where_for(self, business_request, filters):
+        """(Chroma where clause, whether it was inferred from the query) for one query."""
+        where = build_where(filters)
+        if where is None and self.auto_filters:
+            where = build_where(self.infer_filters(business_request))
+            if where is not None:
+                print(f"  🧭 Inferred retrieval filter: {where}")
+                return where, True
+        return where, False
+
+    def _vector_query(self, embeddings, where, top_k):
+        """One Chroma round-trip for several query embeddings; returns one list of semantic hits per embedding."""
+        query_kwargs = {"where": where} if where else {}
+        results = self.collection.query(
+            query_embeddings=[e.tolist() for e in embeddings],
+            n_results=top_k,
+            **query_kwargs
+        )
+        documents = results['documents'] or [[] for _ in embeddings]
+        metadatas = results['metadatas'] or [[None] * len(ids) for ids in results['ids']]
+        distances = results.get('distances') or [None for _ in embeddings]
+        hits = []
+        for ids, docs, metas, dists in zip(results['ids'], documents, metadatas, distances):
+            hits.append([
+                {"id": chunk_id, "document": doc, "metadata": meta or {}, "distance": dist, "source": "semantic"}
+                for chunk_id, doc, meta, dist in zip(ids, docs, metas, dists or [None] * len(docs))
+            ])
+        return hits
+
+    def _keyword_hits(self, business_request, where, cache):
+        """Exact matches for the function-like names in the query. `cache` shares lookups between queries."""
+        keywords = self._extract_keywords(business_request)
+        hits = []
+        if keywords:
+            print(f"  🔎 Attempting keyword search for: {keywords}")
+        for kw in keywords:
+            key = (kw, repr(where))
+            if key not in cache:
+                cache[key] = []
+                try:
+                    kw_results = self.collection.get(
+                        where_document={"$contains": kw},
+                        limit=5,
+                        include=["documents", "metadatas"],
+                        **({"where": where} if where else {})
+                    )
+                    for chunk_id, doc, meta in zip(kw_results['ids'], kw_results['documents'], kw_results['metadatas']):
+                        cache[key].append({"id": chunk_id, "document": doc, "metadata": meta or {}, "distance": None, "source": "keyword"})
+                except Exception as e:
+                    print(f"    Warning: Keyword search failed for '{kw}': {e}")
+            # Copies: callers annotate their chunks (score, collection)
+            hits.extend(dict(hit) for hit in cache[key])
+        return hits
+
+    @staticmethod
+    def _merge(keyword_hits, semantic_hits, top_k):
+        seen_content = set()
+        merged = []
+        # Add keyword results first (high priority), then semantic results
+        for hit in keyword_hits + semantic_hits:
+            if hit["document"] not in seen_content:
+                merged.append(hit)
+                seen_content.add(hit["document"])
+        # Trim to top_k * 1.5 to allow for a bit more context
+        return merged[:int(top_k * 1.5)]
+
+    def retrieve(self, business_request, top_k=15, timings=None, filters=None, query_embedding=None):
+        """
+        Runs the hybrid (semantic + keyword) search and returns the merged chunks as a list of
+        {"id", "document", "metadata", "distance", "source"} dicts.
+        `filters` (e.g. {"language": "cobol"}) is pushed into the Chroma `where` clause; without it,
+        filters are inferred from the query when the Retriever was built with infer_filters=True.
+        A precomputed `query_embedding` skips the encode stage (used by FederatedRetriever).
+        If a dict is passed as `timings`, the duration (seconds) of each stage is written into it
+        under "encode", "vector_query", "keyword_search" and "merge".
+        """
+        embeddings = [query_embedding] if query_embedding is not None else None
+        return self.retrieve_batch([business_request], top_k=top_k, timings=timings, filters=filters, query_embeddings=embeddings)[0]
+
+    def retrieve_batch(self, queries, top_k=15, timings=None, filters=None, query_embeddings=None):
+        """
+        retrieve() for several queries at once, returning one chunk list per query. The queries are
+        encoded in one batch and sent to Chroma in one query (one per distinct filter); keyword
+        lookups shared by several queries run once.
+        """
+        timings = timings if timings is not None else {}
+        queries = list(queries)
+        plans = [self._where_for(q, filters) for q in queries]
+
+        # 1. Semantic Search (Vector)
+        t0 = time.perf_counter()
+        if query_embeddings is None:
+            query_embeddings = list(self.embedding_model.encode(queries)) if queries else []
+        timings["encode"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        semantic = [None] * len(queries)
+        groups = {}
+        for i, (where, _) in enumerate(plans):
+            groups.setdefault(repr(where), []).append(i)
+        for indexes in groups.values():
+            for i, hits in zip(indexes, self._vector_query([query_embeddings[i] for i in indexes], plans[indexes[0]][0], top_k)):
+                semantic[i] = hits
+        for i, (where, inferred) in enumerate(plans):
+            if inferred and not semantic[i]:
+                # A wrong guess (or an index without the new metadata) must not hide everything
+                print("  ⚠️ Inferred filter matched nothing. Falling back to an unfiltered search.")
+                plans[i] = (None, False)
+                semantic[i] = self._vector_query([query_embeddings[i]], None, top_k)[0]
+        timings["vector_query"] = time.perf_counter() - t0
+
+        # 2. Keyword Search (Extract potential function names)
+        t0 = time.perf_counter()
+        keyword_cache = {}
+        keyword = [self._keyword_hits(q, where, keyword_cache) for q, (where, _) in zip(queries, plans)]
+        timings["keyword_search"] = time.perf_counter() - t0
+
+        # 3. Merge Results (Deduplicate)
+        t0 = time.perf_counter()
+        merged = [self._merge(k, s, top_k) for k, s in zip(keyword, semantic)]
+        timings["merge"] = time.perf_counter() - t0
+        return merged
+
+    def retrieve_many(self, queries, top_k=15, filters=None):
+        """Several queries as one retrieval (see retrieve_batch()), results merged with merge_ranked()."""
+        return merge_ranked(self.retrieve_batch(queries, top_k=top_k, filters=filters), int(top_k * 1.5))
+
+    def format_context(self, chunks):
+        return format_context(chunks)
+
+    def fetch(self, ids):
+        """{id: (document, metadata)} for the given chunk ids."""
+        results = self.collection.get(ids=list(ids), include=["documents", "metadatas"])
+        return {chunk_id: (doc, meta) for chunk_id, doc, meta in zip(results['ids'], results['documents'], results['metadatas'])}
+
+    def context_refs(self, chunks):
+        return make_context_refs(chunks, self.collection_name, {self.collection_name: collection_version(self.collection)})
+
+    def context_from_refs(self, refs):
+        """Rebuilds the context block recorded by get_context_with_refs()."""
+        try:
+            chunks = chunks_from_refs(refs, {self.collection_name: (self.fetch, collection_version(self.collection))})
+            return self.format_context(chunks)
+        except Exception as e:
+            print(f"🚨 Error rebuilding context from refs: {e}")
+            return "# CONTEXT RETRIEVAL FAILED\n"
+
+    def get_context_with_refs(self, business_request, top_k=15, filters=None):
+        """get_context_for_request() that also returns the refs to rebuild it later (None if retrieval failed)."""
         print(f"Retrieving context for: '{business_request}'")
         try:
-            # 1. Semantic Search (Vector)
-            query_embedding = self.embedding_model.encode(business_request)
-            semantic_results = self.collection.query(
-                query_embeddings=[query_embedding.tolist()],
-                n_results=top_k
-            )
+            chunks = self.retrieve(business_request, top_k=top_k, filters=filters)
+            return self.format_context(chunks), self.context_refs(chunks)
+        except Exception as e:
+            print(f"🚨 Error during context retrieval: {e}")
+            return "# CONTEXT RETRIEVAL FAILED\n", None
 
-            # 2. Keyword Search (Extract potential function names)
-            # Simple heuristic: look for words in the request that look like function names (snake_case or camelCase)
-            import re
-            # Only match words with at least 4 chars to avoid noise
-            potential_keywords = re.findall(r'\b[a-zA-Z_][a-zA-Z0-9_]{3,}\b', business_request)
-            # Filter out common English words (optional, but good for noise reduction)
-            common_words = {"what", "where", "when", "function", "code", "file", "does", "this", "help", "find", "show", "tell"}
-            keywords = [w for w in potential_keywords if w.lower() not in common_words]
-            
-            keyword_docs = []
-            keyword_metas = []
-            
-            if keywords:
-                print(f"  🔎 Attempting keyword search for: {keywords}")
-                for kw in keywords:
-                    try:
-                        kw_results = self.collection.get(
-                            where_document={"$contains": kw},
-                            limit=5,
-                            include=["documents", "metadatas"]
-                        )
-                        if kw_results['ids']:
-                            keyword_docs.extend(kw_results['documents'])
-                            keyword_metas.extend(kw_results['metadatas'])
-                    except Exception as e:
-                        print(f"    Warning: Keyword search failed for '{kw}': {e}")
-
-            # 3. Merge Results (Deduplicate)
-            seen_content = set()
-            final_docs = []
-            final_metas = []
-
-            # Add keyword results first (high priority)
-            for doc, meta in zip(keyword_docs, keyword_metas):
-                if doc not in seen_content:
-                    final_docs.append(doc)
-                    final_metas.append(meta)
-                    seen_content.add(doc)
-
-            # Add semantic results next
-            if semantic_results['documents'] and semantic_results['documents'][0]:
-                for doc, meta in zip(semantic_results['documents'][0], semantic_results['metadatas'][0]):
-                     if doc not in seen_content:
-                        final_docs.append(doc)
-                        final_metas.append(meta)
-                        seen_content.add(doc)
-            
-            # Trim to top_k * 1.5 to allow for a bit more context
-            final_docs = final_docs[:int(top_k * 1.5)]
-            final_metas = final_metas[:int(top_k * 1.5)]
-            
-            context_block = "# CONTEXT FROM EXISTING APPLICATION\n\n---\n"
-            if not final_docs:
-                print("⚠️ No relevant context found in ChromaDB.")
-                return "# CONTEXT\nNo relevant context found.\n"
-
-            print(f"✅ Retrieved {len(final_docs)} relevant chunks (Merged Semantic + Keyword). Sources:")
-            for doc, metadata in zip(final_docs, final_metas):
-                file_path = metadata.get('file_path', 'Unknown Path')
-                print(f"   - {file_path} (Type: {metadata.get('type', 'N/A')})")
-                context_block += f"### FILE: {file_path}\n```\n{doc}\n```\n---\n"
-
-            return context_block
-            
+    def get_context_for_request(self, business_request, top_k=15, filters=None):
+        print(f"Retrieving context for: '{business_request}'")
+        try:
+            chunks = self.retrieve(business_request, top_k=top_k, filters=filters)
+            return self.format_context(chunks)
+
+        except Exception as e:
+            print(f"🚨 Error during context retrieval: {e}")
+            return "# CONTEXT RETRIEVAL FAILED\n"
+
+    def get_context_for_requests(self, queries, top_k=15, filters=None):
+        print(f"Retrieving context for {len(queries)} queries (batched)")
+        try:
+            chunks = self.retrieve_many(queries, top_k=top_k, filters=filters)
+            return self.format_context(chunks)
         except Exception as e:
             print(f"🚨 Error during context retrieval: {e}")
-            return "# CONTEXT RETRIEVAL FAILED\n"
\ No newline at end of file
+            return "# CONTEXT RETRIEVAL FAILED\n"
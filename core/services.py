@@ -0,0 +1,56 @@
+import os
+import json
+import threading
+
+LLM_KEY = ("llm",)
+
+class ServiceContainer:
+    """
+    Process-wide home of the services agents need (retrievers, the LLM adapter, tool clients).
+    Each service is built on first use and then shared by every agent instance, so creating an
+    agent (or restoring a session) costs nothing until it actually retrieves or generates.
+    A service whose construction fails is not cached; the next use tries again.
+    """
+
+    def __init__(self):
+        self._services = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, factory):
+        """Returns the service stored under `key`, calling factory() to build it the first time."""
+        service = self._services.get(key)
+        if service is not None:
+            return service
+        with self._lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+        # One builder per key: concurrent first uses wait instead of loading the same model twice
+        with key_lock:
+            if key not in self._services:
+                self._services[key] = factory()
+            return self._services[key]
+
+    def peek(self, key):
+        """The service under `key` if it has been built already, else None (never builds it)."""
+        return self._services.get(key)
+
+    def retriever(self, db_path, collection_name, kb_config=None):
+        """The (possibly federated) retriever for a collection and a profile's knowledge_base section."""
+        from core.rag.federated_retriever import create_retriever
+        key = ("retriever", os.path.abspath(db_path), collection_name, json.dumps(kb_config or {}, sort_keys=True, default=str))
+        return self.get(key, lambda: create_retriever(db_path, collection_name, kb_config))
+
+    def llm(self):
+        """The shared AIFrameworkAdapter (provider, response cache, telemetry)."""
+        from core.llm.ai_framework_adapter import AIFrameworkAdapter
+        return self.get(LLM_KEY, AIFrameworkAdapter)
+
+    def clear(self):
+        """Drops every service, e.g. after the provider configuration changed."""
+        with self._lock:
+            self._services.clear()
+
+_SERVICES = ServiceContainer()
+
+def get_services():
+    return _SERVICES
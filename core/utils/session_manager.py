@@ -1,60 +1,178 @@
 import os
-import json
 import glob
+import sqlite3
+import threading
+from contextlib import closing
 from datetime import datetime
+from .session_store import read_session, write_session, remove_session
+
+# Metadata of every session in a user's directory, so listing never opens the session files.
+# It lives in a subdirectory so that SQLite's journal files do not touch the session directory's mtime.
+INDEX_DIR = ".index"
+INDEX_FILENAME = "sessions.sqlite3"
+PREVIEW_CHARS = 60
+
+_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    filename TEXT PRIMARY KEY,
+    session_id TEXT,
+    name TEXT,
+    timestamp TEXT,
+    preview TEXT,
+    agent TEXT,
+    mode TEXT,
+    mtime REAL
+);
+CREATE INDEX IF NOT EXISTS sessions_by_mtime ON sessions (mtime DESC);
+CREATE INDEX IF NOT EXISTS sessions_by_id ON sessions (session_id);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
 
 class SessionManager:
-    def __init__(self, username="default"):
+    def __init__(self, username="default", base_session_dir=None):
         # Calculate session dir based on username: data/sessions/{username}
-        base_session_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'sessions'))
+        base_session_dir = base_session_dir or os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'sessions'))
         self.session_dir = os.path.join(base_session_dir, username)
         os.makedirs(self.session_dir, exist_ok=True)
+        os.makedirs(os.path.join(self.session_dir, INDEX_DIR), exist_ok=True)
+        self.index_path = os.path.join(self.session_dir, INDEX_DIR, INDEX_FILENAME)
+        self._lock = threading.Lock()
+        self._init_index()
+
+    # --- INDEX ---
+
+    def _connect(self):
+        conn = sqlite3.connect(self.index_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_index(self):
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(_INDEX_SCHEMA)
+        self._sync_index()
+
+    def _sync_index(self):
+        """
+        Brings the index up to date with session files added, replaced or removed outside this class
+        (copied sessions, sessions saved before the index existed). Only runs when the directory
+        itself changed since the last sync, so a normal page load costs one stat(). Editing an
+        existing file in place does not change the directory, so such an edit is not picked up
+        until the next file is added or removed.
+        """
+        dir_mtime = self._dir_mtime()
+        with self._lock, closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'dir_mtime'").fetchone()
+            if row and row["value"] == dir_mtime:
+                return
+            indexed = {r["filename"]: r["mtime"] for r in conn.execute("SELECT filename, mtime FROM sessions")}
+            on_disk = {os.path.basename(f): os.path.getmtime(f) for f in glob.glob(os.path.join(self.session_dir, "*.json"))}
+
+            stale = [name for name in indexed if name not in on_disk]
+            conn.executemany("DELETE FROM sessions WHERE filename = ?", [(name,) for name in stale])
+            changed = [name for name, mtime in on_disk.items() if indexed.get(name) != mtime]
+            for name in changed:
+                try:
+                    data = read_session(os.path.join(self.session_dir, name), track=False)
+                except Exception:
+                    continue
+                self._upsert(conn, name, self._metadata(data, name), on_disk[name])
+            if stale or changed:
+                print(f"🗂️ Session index: {len(changed)} sessions indexed, {len(stale)} removed ({self.session_dir})")
+            self._mark_synced(conn)
+
+    def _dir_mtime(self):
+        return str(os.stat(self.session_dir).st_mtime)
+
+    def _mark_synced(self, conn, synced_before=None):
+        """
+        Records the directory's current mtime as indexed. After a write of our own, pass the mtime
+        seen before it: the mark only advances if the index was in sync then, so files added by
+        others in the meantime are still reconciled on the next listing.
+        """
+        if synced_before is not None:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'dir_mtime'").fetchone()
+            if not row or row["value"] != synced_before:
+                return
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dir_mtime', ?)", (self._dir_mtime(),))
+
+    def _metadata(self, data, filename):
+        return {
+            "id": data.get("session_id"),
+            "name": data.get("session_name", filename.replace(".json", "")), # User-friendly name
+            "timestamp": data.get("timestamp"),
+            "preview": self._get_preview(data),
+            "agent": data.get("agent_name", "Unknown"),
+            "mode": data.get("agent_mode", "Unknown")
+        }
+
+    def _upsert(self, conn, filename, meta, mtime):
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (filename, session_id, name, timestamp, preview, agent, mode, mtime) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (filename, meta["id"], meta["name"], meta["timestamp"], meta["preview"], meta["agent"], meta["mode"], mtime)
+        )
+
+    def list_sessions(self, limit=None, offset=0):
+        """Returns a list of dicts with session metadata, newest first. limit/offset page through them."""
+        self._sync_index()
+        query = "SELECT * FROM sessions ORDER BY mtime DESC"
+        params = ()
+        if limit is not None:
+            query += " LIMIT ? OFFSET ?"
+            params = (limit, offset)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [{
+            "id": row["session_id"],
+            "filename": row["filename"],
+            "name": row["name"],
+            "timestamp": row["timestamp"],
+            "preview": row["preview"],
+            "agent": row["agent"],
+            "mode": row["mode"]
+        } for row in rows]
 
-    def list_sessions(self):
-        """Returns a list of dicts with session metadata."""
-        sessions = []
-        files = glob.glob(os.path.join(self.session_dir, "*.json"))
-        # Sort by modification time, newest first
-        files.sort(key=os.path.getmtime, reverse=True)
-        
-        for f in files:
-            try:
-                with open(f, 'r') as file:
-                    data = json.load(file)
-                    # Basic validation/metadata extraction
-                    sessions.append({
-                        "id": data.get("session_id"),
-                        "filename": os.path.basename(f),
-                        "name": data.get("session_name", os.path.basename(f).replace(".json", "")), # User-friendly name
-                        "timestamp": data.get("timestamp"),
-                        "preview": self._get_preview(data),
-                        "agent": data.get("agent_name", "Unknown"),
-                        "mode": data.get("agent_mode", "Unknown")
-                    })
-            except Exception:
-                continue
-        return sessions
+    def count_sessions(self):
+        self._sync_index()
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
 
     def _get_preview(self, data):
         """Extracts a short preview string from the conversation history."""
         # Check 'session_data' first (structure from save_session)
         session_data = data.get("session_data", {})
         history = session_data.get("conversation_history", [])
-        
+
         # If flat structure (legacy compatibility)
         if not history and "conversation_history" in data:
             history = data["conversation_history"]
-            
+
         if history:
             # Get the last user message or assistant message
             last_msg = history[-1].get("content", "")
             # Truncate
-            return (last_msg[:60] + '...') if len(last_msg) > 60 else last_msg
+            return (last_msg[:PREVIEW_CHARS] + '...') if len(last_msg) > PREVIEW_CHARS else last_msg
         return "New Session"
 
-    def save_session(self, session_id, session_data, agent_state, agent_name, agent_mode, db_path, collection_name, session_name=None, profile_config=None, profile_name=None):
-        """Saves the current session state to a JSON file."""
-        
+    def _resolve_filename(self, session_id_or_filename):
+        """Filename for a session id or filename; named sessions are found through the index."""
+        if session_id_or_filename.endswith(".json"):
+            return session_id_or_filename
+        filename = f"{session_id_or_filename}.json"
+        if os.path.exists(os.path.join(self.session_dir, filename)):
+            return filename
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT filename FROM sessions WHERE session_id = ? ORDER BY mtime DESC LIMIT 1",
+                               (session_id_or_filename,)).fetchone()
+        return row["filename"] if row else filename
+
+    # --- SESSIONS ---
+
+    def save_session(self, session_id, session_data, agent_state, agent_name, agent_mode, db_path, collection_name, session_name=None, profile_config=None, profile_name=None, changed=()):
+        """
+        Saves the current session state (see session_store: a delta per save, periodic snapshots).
+        `changed` names session_data keys edited deep in place since the last save.
+        """
+
         # If a friendly name is provided, use it for the filename (sanitized), otherwise use session_id
         if session_name:
             # Simple sanitization
@@ -62,9 +180,9 @@ class SessionManager:
             filename = f"{safe_name}.json"
         else:
             filename = f"{session_id}.json"
-            
+
         filepath = os.path.join(self.session_dir, filename)
-        
+
         save_data = {
             "session_id": session_id,
             "session_name": session_name or session_id,
@@ -78,10 +196,13 @@ class SessionManager:
             "profile_name": profile_name or "Unknown",
             "session_data": session_data
         }
-        
+
         try:
-            with open(filepath, 'w') as f:
-                json.dump(save_data, f, indent=2)
+            dir_mtime = self._dir_mtime()
+            write_session(filepath, save_data, changed)
+            with self._lock, closing(self._connect()) as conn, conn:
+                self._upsert(conn, filename, self._metadata(save_data, filename), os.path.getmtime(filepath))
+                self._mark_synced(conn, synced_before=dir_mtime)
             return filepath
         except Exception as e:
             print(f"Error saving session: {e}")
@@ -89,31 +210,24 @@ class SessionManager:
 
     def load_session(self, session_id_or_filename):
         """Loads a session from disk."""
-        if not session_id_or_filename.endswith(".json"):
-            filename = f"{session_id_or_filename}.json"
-        else:
-            filename = session_id_or_filename
-            
-        filepath = os.path.join(self.session_dir, filename)
+        filepath = os.path.join(self.session_dir, self._resolve_filename(session_id_or_filename))
         if not os.path.exists(filepath):
             return None
-            
+
         try:
-            with open(filepath, 'r') as f:
-                return json.load(f)
+            return read_session(filepath)
         except Exception as e:
             print(f"Error loading session: {e}")
             return None
 
     def delete_session(self, session_id_or_filename):
-         if not session_id_or_filename.endswith(".json"):
-            filename = f"{session_id_or_filename}.json"
-         else:
-            filename = session_id_or_filename
-            
+         filename = self._resolve_filename(session_id_or_filename)
          filepath = os.path.join(self.session_dir, filename)
          if os.path.exists(filepath):
-             os.remove(filepath)
+             dir_mtime = self._dir_mtime()
+             remove_session(filepath)
+             with self._lock, closing(self._connect()) as conn, conn:
+                 conn.execute("DELETE FROM sessions WHERE filename = ?", (filename,))
+                 self._mark_synced(conn, synced_before=dir_mtime)
              return True
          return False
-
@@ -0,0 +1,168 @@
+import os
+import json
+import uuid
+import threading
+from collections import OrderedDict
+
+# A session is stored as a snapshot (<name>.json, the same layout as before) plus an append-only
+# log of the changes made since (<name>.json.log). Each save appends one line with the fields that
+# changed and the new conversation turns, so its cost does not grow with the session. Every
+# SESSION_COMPACT_EVERY saves, the snapshot is rewritten atomically and the log starts over.
+# session_data values are expected to be replaced rather than edited deep in place (see _fingerprint);
+# a deep edit that nobody names is still written by the next snapshot.
+SESSION_COMPACT_EVERY = int(os.getenv("SPECTRA_SESSION_COMPACT_EVERY", "20"))
+# Sessions whose last write is remembered (with shallow copies of their values); a session that falls
+# out starts its next save with a snapshot
+SESSION_STATE_CACHE_SIZE = int(os.getenv("SPECTRA_SESSION_STATE_CACHE_SIZE", "256"))
+LOG_SUFFIX = ".log"
+
+# session_data lists that only ever grow; saves append the new items instead of rewriting the list
+APPEND_KEYS = ("conversation_history",)
+
+# What was last written for each session file (least recently used first), to work out the next
+# delta. Module-level because Streamlit builds a new SessionManager on every rerun.
+_STATES = OrderedDict()
+_LOCK = threading.Lock()
+
+def _remember(path, state):
+    _STATES[path] = state
+    _STATES.move_to_end(path)
+    while len(_STATES) > SESSION_STATE_CACHE_SIZE:
+        _STATES.popitem(last=False)
+
+def _fingerprint(value):
+    # Nothing is serialized to find what changed. Lists and dicts keep a shallow copy: comparing it with
+    # the live value costs one identity check per unchanged item, and catches items added, removed or
+    # replaced. Edits further down (value["a"]["b"] = ...) are not seen; name such keys in `changed`.
+    if isinstance(value, dict):
+        return ("d", dict(value))
+    if isinstance(value, list):
+        return ("l", list(value))
+    return ("v", type(value), value)
+
+def _item(item):
+    return dict(item) if isinstance(item, dict) else item
+
+def _state(save_data, log_id, records):
+    session_data = save_data.get("session_data") or {}
+    return {
+        "log_id": log_id,
+        "records": records,
+        "meta": {k: _fingerprint(v) for k, v in save_data.items() if k != "session_data"},
+        "keys": {k: _fingerprint(v) for k, v in session_data.items() if k not in APPEND_KEYS or not isinstance(v, list)},
+        "lists": {k: [_item(i) for i in v] for k, v in session_data.items() if k in APPEND_KEYS and isinstance(v, list)}
+    }
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def _compact(path, save_data, state=None):
+    # Each snapshot starts a new log id: if removing the old log is lost to a crash, its lines no longer match
+    log_id = uuid.uuid4().hex
+    _write_atomic(path, {**save_data, "log_id": log_id})
+    if os.path.exists(path + LOG_SUFFIX):
+        os.remove(path + LOG_SUFFIX)
+    _remember(path, {**(state or _state(save_data, log_id, 0)), "log_id": log_id, "records": 0})
+
+def _delta(previous, current, save_data, changed):
+    """The changes between two states, or None when a list was rewritten rather than extended."""
+    session_data = save_data.get("session_data") or {}
+    delta = {"meta": {}, "set": {}, "del": [], "append": {}}
+    for key, fp in current["meta"].items():
+        if previous["meta"].get(key) != fp:
+            delta["meta"][key] = save_data[key]
+    for key, fp in current["keys"].items():
+        if key in changed or previous["keys"].get(key) != fp:
+            delta["set"][key] = session_data[key]
+    for key, items in current["lists"].items():
+        old_items = previous["lists"].get(key, [])
+        # Any entry before the new tail that was edited, replaced or removed means a rewrite
+        if key in changed or len(items) < len(old_items) or items[:len(old_items)] != old_items:
+            return None
+        if len(items) > len(old_items):
+            delta["append"][key] = session_data[key][len(old_items):]
+    delta["del"] = [k for k in list(previous["keys"]) + list(previous["lists"]) if k not in session_data]
+    return delta
+
+def write_session(path, save_data, changed=()):
+    """
+    Saves `save_data` to `path`: a delta appended to the log, or a fresh snapshot when compaction is due.
+    `changed` names session_data keys edited below their first level since the last save; they are
+    written whether or not they look changed.
+    """
+    with _LOCK:
+        previous = _STATES.get(path)
+        # The first save of this process (nothing to diff against) and old single-file sessions write a snapshot
+        if previous is None or not previous["log_id"] or not os.path.exists(path) or previous["records"] + 1 >= SESSION_COMPACT_EVERY:
+            _compact(path, save_data)
+            return
+        current = _state(save_data, previous["log_id"], previous["records"] + 1)
+        delta = _delta(previous, current, save_data, set(changed))
+        if delta is None:
+            _compact(path, save_data, current)
+            return
+
+        record = {"log": current["log_id"], **{k: v for k, v in delta.items() if v}}
+        try:
+            with open(path + LOG_SUFFIX, 'a') as f:
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception:
+            # The log may now end in a partial line; the next save starts over with a snapshot
+            _STATES.pop(path, None)
+            raise
+        # The snapshot's mtime is the session's "last saved" time (listing order, index freshness)
+        os.utime(path)
+        _remember(path, current)
+
+def _apply(data, record):
+    data.update(record.get("meta", {}))
+    session_data = data.setdefault("session_data", {})
+    session_data.update(record.get("set", {}))
+    for key in record.get("del", []):
+        session_data.pop(key, None)
+    for key, items in record.get("append", {}).items():
+        session_data.setdefault(key, []).extend(items)
+
+def read_session(path, track=True):
+    """
+    Loads the snapshot and replays the log on top of it. Old single-file sessions have no log and
+    load as they are. A last line cut short by a crash is ignored, so at most that save is lost.
+    track=False reads without preparing delta saves (e.g. when only indexing metadata).
+    """
+    with _LOCK:
+        with open(path, 'r') as f:
+            data = json.load(f)
+        log_id = data.pop("log_id", None)
+        records = 0
+        torn = False
+        if os.path.exists(path + LOG_SUFFIX):
+            with open(path + LOG_SUFFIX, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        torn = True
+                        break
+                    if log_id and record.get("log") == log_id:
+                        _apply(data, record)
+                        records += 1
+        if torn:
+            # The next save writes a snapshot instead of appending behind the torn line
+            _STATES.pop(path, None)
+        elif track:
+            _remember(path, _state(data, log_id, records))
+        return data
+
+def remove_session(path):
+    with _LOCK:
+        _STATES.pop(path, None)
+        for p in (path, path + LOG_SUFFIX):
+            if os.path.exists(p):
+                os.remove(p)
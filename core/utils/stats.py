@@ -0,0 +1,24 @@
+import math
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of a list of numbers (pct in 0-100).
+    Returns None for an empty list.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+def summarize_latencies(values):
+    """Returns count, mean and p50/p95/p99 for a list of durations."""
+    if not values:
+        return {"count": 0, "mean": None, "p50": None, "p95": None, "p99": None}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99)
+    }
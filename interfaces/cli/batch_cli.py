@@ -0,0 +1,216 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Add project root to sys.path to allow imports
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, '..', '..'))
+sys.path.append(project_root)
+
+from core.utils.stats import summarize_latencies
+from core.orchestrator import run_solvo_session, DEFAULT_CLARIFICATION_ANSWER
+
+MANIFEST_NAME = "manifest.jsonl"
+REPORT_NAME = "batch_report.json"
+TEXT_FIELDS = ("requirement", "request", "text")
+DIRECTORY_EXTENSIONS = (".docx", ".txt", ".md")
+# Solvo names its report <prefix>_<session_id>.docx: DigitalOne writes a ProductSpec, the ensemble an ImpactAnalysis
+DOC_PREFIXES = {"digital_one": "ProductSpec", "ensemble": "ImpactAnalysis"}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Analyse a queue of requirements with Solvo, unattended. Re-running the same command resumes.")
+    parser.add_argument("--input", required=True, help="JSONL file ({\"id\", \"requirement\"} per line) or a directory of .docx/.txt/.md files.")
+    parser.add_argument("--output-dir", required=True, help="Where the .docx outputs, manifest.jsonl and batch_report.json are written.")
+    parser.add_argument("--db-path", required=True, help="ChromaDB path.")
+    parser.add_argument("--collection", required=True, help="Collection name.")
+    parser.add_argument("--profile", default="ensemble", help="Profile from config/profiles (ensemble or digital).")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requirements analysed at the same time.")
+    parser.add_argument("--clarification-answer", default=DEFAULT_CLARIFICATION_ANSWER, help="Reply sent whenever Solvo asks clarifying questions.")
+    parser.add_argument("--max-turns", type=int, default=3, help="Follow-up turns per requirement (clarifications, DigitalOne stages).")
+    parser.add_argument("--limit", type=int, help="Process at most this many pending items.")
+    return parser.parse_args()
+
+def _read_docx(path):
+    import docx
+    doc = docx.Document(path)
+    return "\n\n".join(para.text for para in doc.paragraphs if para.text.strip())
+
+def load_items(input_path):
+    """[(item_id, requirement_text)] from a JSONL file or a directory of documents, in input order."""
+    items = []
+    if os.path.isdir(input_path):
+        for name in sorted(os.listdir(input_path)):
+            path = os.path.join(input_path, name)
+            if name.startswith("~$") or not name.lower().endswith(DIRECTORY_EXTENSIONS):
+                continue
+            if name.lower().endswith(".docx"):
+                text = _read_docx(path)
+            else:
+                with open(path, 'r', encoding='utf-8') as f:
+                    text = f.read()
+            items.append((os.path.splitext(name)[0], text))
+        return items
+
+    with open(input_path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            text = next((record[k] for k in TEXT_FIELDS if record.get(k)), None)
+            if not text:
+                print(f"⚠️ Line {line_no}: no {'/'.join(TEXT_FIELDS)} field, skipped.")
+                continue
+            items.append((str(record.get("id") or f"line_{line_no}"), text))
+    return items
+
+def safe_id(item_id):
+    return re.sub(r'[^\w.-]', '_', item_id)
+
+class Manifest:
+    """
+    Append-only results log (one JSON line per finished item). The last line for an id wins, so a
+    retried item simply appends a newer record; a line cut short by a crash is ignored on load.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.records = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        self.records[record["id"]] = record
+                    except (json.JSONDecodeError, KeyError):
+                        continue
+
+    def is_done(self, item_id, output_dir):
+        record = self.records.get(item_id)
+        return bool(record and record["status"] == "done" and os.path.exists(os.path.join(output_dir, record["doc"])))
+
+    def append(self, record):
+        with self.lock:
+            self.records[record["id"]] = record
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+def analyse_item(item_id, text, args, db_path, config):
+    from core.llm.scheduler import request_context, BATCH
+    session_id = f"batch_{safe_id(item_id)}"
+    t0 = time.perf_counter()
+    record = {"id": item_id, "session_id": session_id, "status": "failed"}
+    try:
+        # A report left by an earlier, failed run of this item must not count as this run's output
+        for prefix in DOC_PREFIXES.values():
+            if os.path.exists(f"{prefix}_{session_id}.docx"):
+                os.remove(f"{prefix}_{session_id}.docx")
+        with request_context(user="batch", priority=BATCH, session_id=session_id):
+            solvo, session_data, turns = run_solvo_session(text, db_path, args.collection, config, session_id,
+                                                           args.clarification_answer, args.max_turns)
+        doc = f"{DOC_PREFIXES.get(solvo.workflow, DOC_PREFIXES['ensemble'])}_{session_id}.docx"
+        record["turns"] = turns
+        if solvo.state == "DONE" and os.path.exists(doc):
+            record.update(status="done", doc=doc, workflow=solvo.workflow,
+                          summary=(session_data.get("final_solution") or {}).get("summary", ""))
+        else:
+            record["error"] = (session_data.get("last_agent_response") or f"stopped in state {solvo.state}")[:500]
+    except Exception as e:
+        record["error"] = str(e)
+    record["seconds"] = round(time.perf_counter() - t0, 2)
+    record["finished_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    return record
+
+def main():
+    args = parse_args()
+    input_path = os.path.abspath(args.input)
+    db_path = os.path.abspath(args.db_path)
+    output_dir = os.path.abspath(args.output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+    from core.utils.config_loader import load_profile
+    from core.llm.telemetry import get_telemetry, format_summary
+    config = load_profile(args.profile) or {}
+
+    items = load_items(input_path)
+    manifest = Manifest(os.path.join(output_dir, MANIFEST_NAME))
+    pending = [(item_id, text) for item_id, text in items if not manifest.is_done(item_id, output_dir)]
+    skipped = len(items) - len(pending)
+    if args.limit is not None:
+        pending = pending[:args.limit]
+
+    # Solvo writes its .docx into the working directory
+    os.chdir(output_dir)
+    print(f"\n📚 Batch: {len(items)} requirements, {skipped} already done, {len(pending)} to analyse "
+          f"(concurrency {args.concurrency}, profile {args.profile})")
+
+    latencies, failures = [], []
+    recorded = set()
+    interrupted = False
+    t0 = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=max(1, args.concurrency), thread_name_prefix="batch")
+    futures = {executor.submit(contextvars.copy_context().run, analyse_item, item_id, text, args, db_path, config): item_id
+               for item_id, text in pending}
+    try:
+        for i, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            manifest.append(record)
+            recorded.add(futures[future])
+            if record["status"] == "done":
+                latencies.append(record["seconds"])
+                print(f"✅ [{i}/{len(pending)}] {record['id']}: {record['doc']} ({record['seconds']}s)")
+            else:
+                failures.append(record["id"])
+                print(f"🚨 [{i}/{len(pending)}] {record['id']}: {record['error'][:200]}")
+    except KeyboardInterrupt:
+        interrupted = True
+        print("\n⏸️ Interrupted: finishing the requirements in progress, the rest stay pending for the next run.")
+        executor.shutdown(wait=True, cancel_futures=True)
+        for future, item_id in futures.items():
+            if future.done() and not future.cancelled() and item_id not in recorded:
+                manifest.append(future.result())
+    executor.shutdown(wait=True)
+    wall = time.perf_counter() - t0
+
+    telemetry = get_telemetry()
+    llm_summary = telemetry.summary() if telemetry else {}
+    report = {
+        "input": input_path,
+        "profile": args.profile,
+        "concurrency": args.concurrency,
+        "total_items": len(items),
+        "skipped_already_done": skipped,
+        "completed": len(latencies),
+        "failed": failures,
+        "interrupted": interrupted,
+        "wall_seconds": round(wall, 2),
+        "items_per_hour": round(len(latencies) / wall * 3600, 1) if wall and latencies else None,
+        "item_latency": summarize_latencies(latencies),
+        "llm": llm_summary
+    }
+    with open(REPORT_NAME, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    fmt = lambda v: f"{v:.2f}" if v is not None else "-"
+    il = report["item_latency"]
+    print("\n=== Batch Report ===")
+    print(f"Completed {report['completed']} · failed {len(failures)} · skipped {skipped} · wall {report['wall_seconds']}s "
+          f"· {report['items_per_hour']} requirements/hour")
+    print(f"Per requirement: p50 {fmt(il['p50'])}s · p95 {fmt(il['p95'])}s · p99 {fmt(il['p99'])}s")
+    if llm_summary:
+        print("\n" + format_summary(llm_summary))
+    print(f"\n✅ Outputs, {MANIFEST_NAME} and {REPORT_NAME} in {output_dir}")
+    if failures or interrupted:
+        print("Re-run the same command to retry failed and pending requirements.")
+    sys.exit(1 if failures or interrupted else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+
+# Add project root to sys.path to allow imports
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, '..', '..'))
+sys.path.append(project_root)
+
+from core.rag.retriever import Retriever
+from core.rag.evaluator import load_eval_queries, evaluate, format_report, build_synthetic_collection
+from core.rag.indexer import VECTOR_DB_PATH
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure retrieval quality (recall@k, MRR) and per-stage latency.")
+    parser.add_argument("--queries", help="JSONL file with 'query' and 'expected_files' / 'expected_symbols'.")
+    parser.add_argument("--db-path", default=VECTOR_DB_PATH, help="ChromaDB path (ignored with --synthetic).")
+    parser.add_argument("--collection", default="default_collection", help="Collection to evaluate.")
+    parser.add_argument("--top-k", type=int, default=15, help="top_k passed to the Retriever.")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 5, 10], help="Cut-offs for recall@k.")
+    parser.add_argument("--synthetic", action="store_true", help="Build and evaluate a local synthetic collection (offline).")
+    parser.add_argument("--output", help="Write the full JSON report to this path.")
+    parser.add_argument("--min-recall", type=float, help="Exit non-zero if recall at the largest k falls below this value.")
+    parser.add_argument("--min-mrr", type=float, help="Exit non-zero if MRR falls below this value.")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    if args.synthetic:
+        workdir = tempfile.mkdtemp(prefix="spectra_eval_")
+        db_path = os.path.join(workdir, "vector_store")
+        collection_name = "synthetic_eval"
+        cases = build_synthetic_collection(db_path, collection_name, os.path.join(workdir, "corpus"))
+        if args.queries:
+            cases = load_eval_queries(args.queries)
+    else:
+        if not args.queries:
+            print("🚨 --queries is required unless --synthetic is used.")
+            sys.exit(2)
+        db_path, collection_name = args.db_path, args.collection
+        cases = load_eval_queries(args.queries)
+
+    if not cases:
+        print("🚨 No valid eval queries found.")
+        sys.exit(2)
+
+    retriever = Retriever(db_path, collection_name)
+    report = evaluate(retriever, cases, k_values=sorted(args.k), top_k=args.top_k)
+    print("\n" + format_report(report))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Report saved to {args.output}")
+
+    # --- Regression Gates ---
+    failed = False
+    if args.min_recall is not None:
+        recall = report["recall"][f"@{max(args.k)}"]
+        if recall < args.min_recall:
+            print(f"🚨 Recall@{max(args.k)} {recall:.3f} is below the threshold {args.min_recall:.3f}")
+            failed = True
+    if args.min_mrr is not None and report["mrr"] < args.min_mrr:
+        print(f"🚨 MRR {report['mrr']:.3f} is below the threshold {args.min_mrr:.3f}")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
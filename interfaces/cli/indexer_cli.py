@@ -128,7 +128,7 @@ def main():
             if not ignored_dirs:
                 ignored_dirs = [".git", "node_modules", "__pycache__", "venv", ".svn", ".hg", "CVS", ".DS_Store", "dist", "build", "target", ".idea", ".vscode", ".vs"]
 
-            from core.rag.indexer import process_codebase_generator, upload_batch_to_chromadb
+            from core.rag.indexer import process_codebase_generator, upload_batch_to_chromadb, update_collection_modules
 
             # Use the generator directly
             chunk_generator = process_codebase_generator(
@@ -143,6 +143,7 @@ def main():
             for batch_texts, batch_metas, batch_ids in chunk_generator:
                 if batch_texts:
                     upload_batch_to_chromadb(collection, embedding_model, batch_texts, batch_metas, batch_ids)
+                    update_collection_modules(collection, batch_metas)
                     total_chunks += len(batch_ids)
                     chunk_id_counter += len(batch_ids)
             
@@ -155,7 +156,7 @@ def main():
         conf_texts, conf_metas, conf_ids = [], [], []
         for doc in documents:
             conf_texts.append(doc['content'])
-            conf_metas.append(doc['metadata'])
+            conf_metas.append({**doc['metadata'], "language": "document", "module": "confluence"})
             conf_ids.append(f"chunk_{chunk_id_counter}")
             chunk_id_counter += 1
         
@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import tempfile
+import threading
+import tracemalloc
+
+# Add project root to sys.path to allow imports
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, '..', '..'))
+sys.path.append(project_root)
+
+from core.utils.stats import summarize_latencies
+from core.llm.fake_server import FakeOllamaServer
+
+REQUEST = "Customers with a loyalty tier should get a 5% discount on every order. Apply it in the pricing flow."
+CLARIFICATION_ANSWER = "Proceed with your stated assumptions."
+ARCHIVIST_QUESTION = "Where is the order total calculated?"
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Drive N simulated users through full agent workflows and report throughput, latency and memory.")
+    parser.add_argument("--users", type=int, default=4, help="Concurrent simulated users running Solvo → Sutra → Pramana.")
+    parser.add_argument("--archivist-users", type=int, default=0, help="Extra concurrent users asking Archivist (interactive) questions.")
+    parser.add_argument("--iterations", type=int, default=1, help="Workflows per user.")
+    parser.add_argument("--profile", default="ensemble", help="Profile from config/profiles.")
+    parser.add_argument("--db-path", help="ChromaDB path. Defaults to a freshly built synthetic collection.")
+    parser.add_argument("--collection", default="synthetic_eval", help="Collection name (with --db-path).")
+    parser.add_argument("--ollama-host", help="Use a real Ollama server instead of the bundled fake one.")
+    parser.add_argument("--first-token-delay", type=float, default=0.2, help="Fake server: seconds before the first token.")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Fake server: output token rate.")
+    parser.add_argument("--output", help="Write the full JSON report to this path.")
+    return parser.parse_args()
+
+class LoadResults:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.step_latencies = {} # agent -> [seconds per execute()]
+        self.workflow_latencies = []
+        self.errors = []
+
+    def add_step(self, agent, seconds):
+        with self.lock:
+            self.step_latencies.setdefault(agent, []).append(seconds)
+
+    def add_error(self, where, message):
+        with self.lock:
+            self.errors.append({"where": where, "error": message})
+
+def timed_execute(results, name, agent, user_input, session_data):
+    t0 = time.perf_counter()
+    agent.execute(user_input, session_data)
+    results.add_step(name, time.perf_counter() - t0)
+    response = session_data.get("last_agent_response") or ""
+    if response.startswith("🚨"):
+        results.add_error(name, response[:200])
+
+def run_workflow_user(user_idx, args, db_path, collection, config, results):
+    from agents.Solvo.agent import SolvoAgent
+    from agents.Sutra.agent import SutraAgent
+    from agents.Pramana.agent import PramanaAgent
+    from core.llm.scheduler import request_context, BATCH
+
+    for iteration in range(args.iterations):
+        session_id = f"load_{user_idx}_{iteration}_{uuid.uuid4().hex[:8]}"
+        session_data = {"session_id": session_id, "conversation_history": [], "rag_refs": None, "final_solution": None}
+        t0 = time.perf_counter()
+        try:
+            with request_context(user=f"user{user_idx}", priority=BATCH, session_id=session_id):
+                solvo = SolvoAgent(db_path, collection, "solvo", config)
+                timed_execute(results, "Solvo", solvo, REQUEST, session_data)
+                turns = 0
+                while solvo.state != "DONE" and turns < 3:
+                    timed_execute(results, "Solvo", solvo, CLARIFICATION_ANSWER, session_data)
+                    turns += 1
+
+                session_data["uploaded_doc_content"] = json.dumps(session_data.get("final_solution") or {}, indent=2)
+                sutra = SutraAgent(db_path, collection, "coder", config)
+                timed_execute(results, "Sutra", sutra, "Implement the planned code changes.", session_data)
+
+                pramana = PramanaAgent(db_path, collection, "qa", config)
+                timed_execute(results, "Pramana", pramana, "Generate unit tests for the generated code.", session_data)
+            with results.lock:
+                results.workflow_latencies.append(time.perf_counter() - t0)
+        except Exception as e:
+            results.add_error(f"user{user_idx}", str(e))
+
+def run_archivist_user(user_idx, args, db_path, collection, config, results, stop):
+    from agents.Solvo.agent import SolvoAgent
+    from core.llm.scheduler import request_context, INTERACTIVE
+
+    session_id = f"load_archivist_{user_idx}_{uuid.uuid4().hex[:8]}"
+    session_data = {"session_id": session_id, "conversation_history": []}
+    try:
+        with request_context(user=f"archivist{user_idx}", priority=INTERACTIVE, session_id=session_id):
+            agent = SolvoAgent(db_path, collection, "archivist", config)
+            while not stop.is_set():
+                timed_execute(results, "Archivist", agent, ARCHIVIST_QUESTION, session_data)
+    except Exception as e:
+        results.add_error(f"archivist{user_idx}", str(e))
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="spectra_load_")
+    output_path = os.path.abspath(args.output) if args.output else None
+
+    # --- Backend: bundled fake Ollama unless a real server is given ---
+    fake = None
+    if args.ollama_host:
+        os.environ["OLLAMA_HOST"] = args.ollama_host
+    else:
+        fake = FakeOllamaServer(port=0, first_token_delay=args.first_token_delay, tokens_per_second=args.tokens_per_second).start()
+        os.environ["OLLAMA_HOST"] = fake.url
+    os.environ["SPECTRA_LLM_PROVIDER"] = "ollama"
+    os.environ.setdefault("SPECTRA_LLM_METRICS_PATH", os.path.join(workdir, "llm_metrics.jsonl"))
+
+    # --- Knowledge base ---
+    if args.db_path:
+        db_path, collection = os.path.abspath(args.db_path), args.collection
+    else:
+        from core.rag.evaluator import build_synthetic_collection
+        db_path, collection = os.path.join(workdir, "vector_store"), "synthetic_eval"
+        build_synthetic_collection(db_path, collection, os.path.join(workdir, "corpus"))
+
+    from core.utils.config_loader import load_profile
+    from core.llm.telemetry import get_telemetry, format_summary
+    from core.llm.scheduler import get_scheduler
+    config = load_profile(args.profile) or {}
+
+    # Agents write their .docx outputs to the working directory
+    os.chdir(workdir)
+    print(f"\n🏋️ Load test: {args.users} workflow users x {args.iterations}, {args.archivist_users} archivist users (outputs in {workdir})")
+
+    results = LoadResults()
+    stop = threading.Event()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+
+    archivists = [threading.Thread(target=run_archivist_user, args=(i, args, db_path, collection, config, results, stop))
+                  for i in range(args.archivist_users)]
+    workers = [threading.Thread(target=run_workflow_user, args=(i, args, db_path, collection, config, results))
+               for i in range(args.users)]
+    for t in archivists + workers:
+        t.start()
+    for t in workers:
+        t.join()
+    stop.set()
+    for t in archivists:
+        t.join()
+
+    wall = time.perf_counter() - t0
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    try:
+        import resource
+        max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # KiB on Linux
+    except ImportError:
+        max_rss_mb = None
+    if fake:
+        fake.stop()
+
+    telemetry = get_telemetry()
+    llm_summary = telemetry.summary() if telemetry else {}
+    llm_calls = sum(s["calls"] for s in llm_summary.values())
+    report = {
+        "users": args.users,
+        "archivist_users": args.archivist_users,
+        "iterations": args.iterations,
+        "wall_seconds": round(wall, 2),
+        "workflows_completed": len(results.workflow_latencies),
+        "workflows_per_minute": round(len(results.workflow_latencies) / wall * 60, 2) if wall else None,
+        "llm_calls_per_second": round(llm_calls / wall, 2) if wall else None,
+        "workflow_latency": summarize_latencies(results.workflow_latencies),
+        "agent_latency": {agent: summarize_latencies(values) for agent, values in sorted(results.step_latencies.items())},
+        "llm": llm_summary,
+        "scheduler": get_scheduler().snapshot(),
+        "memory": {"tracemalloc_peak_mb": round(peak_bytes / 1024 / 1024, 1), "max_rss_mb": round(max_rss_mb, 1) if max_rss_mb else None},
+        "errors": results.errors
+    }
+
+    fmt = lambda v: f"{v:.2f}" if v is not None else "-"
+    print("\n=== Load Test Report ===")
+    print(f"Wall time: {report['wall_seconds']}s · workflows: {report['workflows_completed']} "
+          f"({report['workflows_per_minute']}/min) · LLM calls/s: {report['llm_calls_per_second']}")
+    wl = report["workflow_latency"]
+    print(f"Workflow latency: p50 {fmt(wl['p50'])}s · p95 {fmt(wl['p95'])}s · p99 {fmt(wl['p99'])}s")
+    for agent, s in report["agent_latency"].items():
+        print(f"  {agent:<10} n={s['count']:<4} p50 {fmt(s['p50'])}s · p95 {fmt(s['p95'])}s · p99 {fmt(s['p99'])}s")
+    print(f"Memory: tracemalloc peak {report['memory']['tracemalloc_peak_mb']} MB · max RSS {report['memory']['max_rss_mb']} MB")
+    if llm_summary:
+        print("\n" + format_summary(llm_summary))
+    if results.errors:
+        print(f"\n⚠️ {len(results.errors)} errors (first: {results.errors[0]})")
+
+    if output_path:
+        with open(output_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Report saved to {output_path}")
+    sys.exit(1 if results.errors else 0)
+
+if __name__ == "__main__":
+    main()
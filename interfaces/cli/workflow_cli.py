@@ -0,0 +1,69 @@
+import os
+import sys
+import json
+import uuid
+import argparse
+
+# Add project root to sys.path to allow imports
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, '..', '..'))
+sys.path.append(project_root)
+
+from core.orchestrator import DAGOrchestrator, build_delivery_chain, collect_artifacts, format_timings, workflow_fingerprint
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run Solvo → Sutra → Pramana for one request as a parallel, resumable workflow.")
+    parser.add_argument("request", nargs="?", help="The change request text.")
+    parser.add_argument("--request-file", help="Read the change request from this file instead.")
+    parser.add_argument("--db-path", required=True, help="ChromaDB path.")
+    parser.add_argument("--collection", required=True, help="Collection name.")
+    parser.add_argument("--profile", default="ensemble", help="Profile from config/profiles.")
+    parser.add_argument("--checkpoint", help="Checkpoint file. Re-running with the same file resumes: finished nodes are not re-run.")
+    parser.add_argument("--max-workers", type=int, default=4, help="Nodes that may run at the same time.")
+    parser.add_argument("--output", help="Write the solution, generated files, tests and timings as JSON to this path.")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.request_file:
+        with open(args.request_file, 'r', encoding='utf-8') as f:
+            request = f.read()
+    else:
+        request = args.request
+    if not request:
+        print("🚨 Provide a request or --request-file.")
+        sys.exit(2)
+
+    from core.utils.config_loader import load_profile
+    from core.llm.scheduler import request_context, BATCH
+    config = load_profile(args.profile) or {}
+
+    db_path = os.path.abspath(args.db_path)
+    # A checkpoint from another request, database or profile is not resumed
+    fingerprint = workflow_fingerprint(request, db_path, args.collection, args.profile)
+    orchestrator = DAGOrchestrator(checkpoint_path=args.checkpoint, max_workers=args.max_workers, fingerprint=fingerprint)
+    session_id = f"workflow_{uuid.uuid4().hex[:8]}"
+    build_delivery_chain(orchestrator, request, db_path, args.collection, config, session_id=session_id)
+
+    print(f"\n🧭 Workflow {session_id}: Solvo → Sutra → Pramana (max {args.max_workers} parallel nodes)")
+    with request_context(user="workflow", priority=BATCH, session_id=session_id):
+        records = orchestrator.run()
+
+    timings = orchestrator.timings()
+    artifacts = collect_artifacts(records)
+    print("\n=== Workflow Report ===")
+    print(format_timings(timings))
+    print(f"Generated {len(artifacts['files'])} files and {len(artifacts['test_files'])} test files.")
+    if orchestrator.failed:
+        print(f"\n⚠️ Not finished: {', '.join(orchestrator.failed)}")
+        if args.checkpoint:
+            print(f"Re-run with --checkpoint {args.checkpoint} to retry only these nodes.")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({**artifacts, "timings": timings}, f, indent=2)
+        print(f"\n✅ Results saved to {args.output}")
+    sys.exit(1 if orchestrator.failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,8 @@ from agents.Pramana.agent import PramanaAgent
 from core.utils.session_manager import SessionManager
 from core.auth.user_manager import UserManager
 from core.utils.config_loader import list_profiles, load_profile
+from core.llm.scheduler import get_scheduler, request_context, INTERACTIVE, BATCH
+from core.services import get_services, LLM_KEY
 import time
 import threading
 import uuid
@@ -35,13 +37,18 @@ st.set_page_config(
 # Define the project root and the path for the feedback file
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
 FEEDBACK_FILE_PATH = os.path.join(PROJECT_ROOT, 'data', 'solvo_feedback.jsonl')
+SESSION_PAGE_SIZE = 20
+
+# Large or derived session fields that feedback consumers do not read (the chunk refs stay)
+FEEDBACK_EXCLUDED_KEYS = ("rag_context", "uploaded_doc_content", "streaming_response", "memory_summaries")
 
 def log_feedback(session_data):
     try:
         # Ensure the data directory exists
         os.makedirs(os.path.dirname(FEEDBACK_FILE_PATH), exist_ok=True)
+        entry = {k: v for k, v in session_data.items() if k not in FEEDBACK_EXCLUDED_KEYS}
         with open(FEEDBACK_FILE_PATH, 'a') as f:
-            f.write(json.dumps(session_data) + '\n')
+            f.write(json.dumps(entry) + '\n')
         print(f"📝 Feedback logged to {FEEDBACK_FILE_PATH}")
     except Exception as e:
         print(f"🚨 Feedback logging failed: {e}")
@@ -162,12 +169,16 @@ def read_uploaded_file(uploaded_file):
             os.remove(file_name)
         return None
 
-def run_agent_in_thread(agent_instance, prompt, session_data):
+def run_agent_in_thread(agent_instance, prompt, session_data, username=None):
     """
     Runs the agent. NOTE: This function CANNOT modify st.session_state directly.
     It only modifies the mutable 'session_data' dictionary.
     """
-    agent_instance.execute(prompt, session_data)
+    # Tag the thread's LLM calls for the scheduler: archivist Q&A is interactive, everything else is batch work
+    priority = INTERACTIVE if agent_instance.mode == "archivist" else BATCH
+    with request_context(user=username or "anonymous", priority=priority,
+                         session_id=session_data.get("session_id"), agent=type(agent_instance).__name__):
+        agent_instance.execute(prompt, session_data)
     # We do NOT set is_thinking=False here anymore. The main loop handles it.
 
 # --- Sidebar ---
@@ -276,11 +287,25 @@ with st.sidebar:
                 st.session_state.session_data = {
                     "session_id": f"streamlit_session_{uuid.uuid4()}",
                     "conversation_history": [],
-                    "rag_context": None,
+                    "rag_refs": None,
                     "final_solution": None
                 }
             st.rerun()
     
+    # Only once the shared LLM exists: rendering the sidebar must not build it
+    shared_llm = get_services().peek(LLM_KEY) if st.session_state.agent_ready else None
+    if shared_llm:
+        cache_stats = shared_llm.cache_stats()
+        if cache_stats:
+            st.caption(f"⚡ LLM cache: {cache_stats['hit_rate']:.0%} hit rate · {cache_stats['saved_seconds']}s saved")
+        metrics = shared_llm.metrics_summary()
+        if metrics:
+            with st.expander("📊 LLM Metrics", expanded=False):
+                for group, m in metrics.items():
+                    p50, p95 = m["latency"]["p50"], m["latency"]["p95"]
+                    st.caption(f"**{group}** · {m['calls']} calls · p50 {p50 or 0:.1f}s · p95 {p95 or 0:.1f}s · "
+                               f"{m['prompt_tokens']}→{m['completion_tokens']} tokens")
+
     # --- HISTORY SECTION ---
     st.divider()
     with st.expander("💾 Session History", expanded=False):
@@ -312,7 +337,12 @@ with st.sidebar:
 
         # Load
         st.caption("Load Previous Session")
-        sessions = session_manager.list_sessions()
+        # Read from the session index one page at a time; the session files are only opened on load
+        session_pages = max(1, -(-session_manager.count_sessions() // SESSION_PAGE_SIZE))
+        session_page = 1
+        if session_pages > 1:
+            session_page = st.number_input(f"Page (of {session_pages})", min_value=1, max_value=session_pages, value=1, step=1, key="session_page")
+        sessions = session_manager.list_sessions(limit=SESSION_PAGE_SIZE, offset=(session_page - 1) * SESSION_PAGE_SIZE)
         if sessions:
             session_options = {s["id"]: f"{s.get('name', s['filename'])} ({s['timestamp'][:10]})" for s in sessions}
             selected_session_id = st.selectbox("Select:", list(session_options.keys()), format_func=lambda x: session_options[x], key="session_selector", label_visibility="collapsed")
@@ -369,7 +399,7 @@ if st.session_state.agent_ready:
     else:
         mode_display_name = "Standard"
 
-    st.info(f"**Profile:** `{profile_display}` | **Agent:** `{agent_display_name}` | **Mode:** `{mode_display_name}` | **KB:** `{st.session_state.agent.retriever.collection.name}`")
+    st.info(f"**Profile:** `{profile_display}` | **Agent:** `{agent_display_name}` | **Mode:** `{mode_display_name}` | **KB:** `{st.session_state.agent.collection_name}`")
     
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
@@ -379,6 +409,7 @@ if st.session_state.agent_ready:
     # If we find a response in the shared dictionary, it means the thread finished.
     if "last_agent_response" in st.session_state.session_data and st.session_state.session_data["last_agent_response"]:
         response_text = st.session_state.session_data.pop("last_agent_response")
+        st.session_state.session_data.pop("streaming_response", None)
         
         # 1. Update UI
         st.session_state.messages.append({"role": "assistant", "content": response_text})
@@ -407,9 +438,18 @@ if st.session_state.agent_ready:
 
     # --- Show Spinner logic ---
     if st.session_state.is_thinking:
+        # Tokens streamed so far by the agent thread (see stream_to_session)
+        partial_response = st.session_state.session_data.get("streaming_response")
         with st.chat_message("assistant"):
-            st.spinner("Solvo is thinking...")
-        time.sleep(2) # Check again in 2s
+            queued = get_scheduler().position(st.session_state.session_data.get("session_id"))
+            if queued:
+                position, waiting, _ = queued
+                st.caption(f"⏳ Waiting for the model: position {position} of {waiting} in the queue")
+            if partial_response:
+                st.markdown(partial_response + " ▌")
+            else:
+                st.spinner("Solvo is thinking...")
+        time.sleep(0.5 if partial_response else 1) # Poll faster while tokens are arriving
         st.rerun()
 
     # --- Input Areas ---
@@ -431,7 +471,7 @@ if st.session_state.agent_ready:
                         st.session_state.messages.append({"role": "user", "content": text or f"Analyzing {uploaded.name}..."})
                         
                         st.session_state.is_thinking = True
-                        threading.Thread(target=run_agent_in_thread, args=(st.session_state.agent, full_prompt, st.session_state.session_data)).start()
+                        threading.Thread(target=run_agent_in_thread, args=(st.session_state.agent, full_prompt, st.session_state.session_data, st.session_state.username)).start()
                         st.rerun()
 
             # State 1: CLARIFYING (Chat)
@@ -439,7 +479,7 @@ if st.session_state.agent_ready:
                 if prompt := st.chat_input("Answer Solvo's questions..."):
                     st.session_state.messages.append({"role": "user", "content": prompt})
                     st.session_state.is_thinking = True
-                    threading.Thread(target=run_agent_in_thread, args=(st.session_state.agent, prompt, st.session_state.session_data)).start()
+                    threading.Thread(target=run_agent_in_thread, args=(st.session_state.agent, prompt, st.session_state.session_data, st.session_state.username)).start()
                     st.rerun()
             
             # State 2: DONE (Reset option)
@@ -472,7 +512,7 @@ if st.session_state.agent_ready:
             if prompt := st.chat_input("Ask about the codebase..."):
                 st.session_state.messages.append({"role": "user", "content": prompt})
                 st.session_state.is_thinking = True
-                threading.Thread(target=run_agent_in_thread, args=(st.session_state.agent, prompt, st.session_state.session_data)).start()
+                threading.Thread(target=run_agent_in_thread, args=(st.session_state.agent, prompt, st.session_state.session_data, st.session_state.username)).start()
                 st.rerun()
 
         elif st.session_state.agent.mode == 'coder': # Sutra
@@ -495,7 +535,7 @@ if st.session_state.agent_ready:
                         st.session_state.messages.append({"role": "user", "content": prompt_text})
                         
                         st.session_state.is_thinking = True
-                        threading.Thread(target=run_agent_in_thread, args=(st.session_state.agent, prompt_text, st.session_state.session_data)).start()
+                        threading.Thread(target=run_agent_in_thread, args=(st.session_state.agent, prompt_text, st.session_state.session_data, st.session_state.username)).start()
                         st.rerun()
 
         elif st.session_state.agent.mode == 'qa': # Pramana
@@ -512,7 +552,7 @@ if st.session_state.agent_ready:
             if p := st.chat_input("Describe tests to generate (e.g. 'Test boundary conditions for discount'):"):
                 st.session_state.messages.append({"role": "user", "content": p})
                 st.session_state.is_thinking = True
-                threading.Thread(target=run_agent_in_thread, args=(st.session_state.agent, p, st.session_state.session_data)).start()
+                threading.Thread(target=run_agent_in_thread, args=(st.session_state.agent, p, st.session_state.session_data, st.session_state.username)).start()
                 st.rerun()
 
 else:
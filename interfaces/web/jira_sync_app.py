@@ -1,8 +1,6 @@
 import streamlit as st
 import os
 import sys
-import json
-import re
 
 # Add project root to the Python path
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
@@ -11,7 +9,7 @@ if project_root not in sys.path:
 
 from agents.Solvo.tools.jira_tools import connect_to_jira, create_stories_in_jira, read_doc_content
 from agents.Solvo.prompts import STORY_CREATOR_PROMPT
-from core.llm.ai_framework_adaptor import AIFrameworkAdapter
+from core.llm.ai_framework_adapter import AIFrameworkAdapter
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -44,12 +42,10 @@ if uploaded_file:
                 if document_content:
                     llm = AIFrameworkAdapter()
                     prompt = f"{STORY_CREATOR_PROMPT}\n# FINALIZED DOCUMENT CONTENT\n\n{document_content}"
-                    response = llm.generate_content(prompt)
+                    story_json, response = llm.generate_json(prompt)
                     
                     if response and response.text:
-                        json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
-                        if json_match:
-                            story_json = json.loads(json_match.group(0))
+                        if story_json:
                             st.session_state.stories_to_create = story_json.get("user_stories", [])
                             st.success(f"Successfully extracted {len(st.session_state.stories_to_create)} stories.")
                         else:
@@ -0,0 +1,68 @@
+import json
+from types import SimpleNamespace
+from interfaces.cli import batch_cli
+from interfaces.cli.batch_cli import Manifest, load_items, analyse_item
+
+def test_load_items_from_jsonl(tmp_path):
+    path = tmp_path / "queue.jsonl"
+    path.write_text("\n".join([
+        json.dumps({"id": "CR-1", "requirement": "first"}),
+        "",
+        json.dumps({"request": "no id"}),
+        json.dumps({"id": "CR-3", "title": "no text"}),
+        json.dumps({"id": 4, "text": "numeric id"})
+    ]), encoding="utf-8")
+    assert load_items(str(path)) == [("CR-1", "first"), ("line_3", "no id"), ("4", "numeric id")]
+
+def test_load_items_from_directory(tmp_path):
+    (tmp_path / "b.md").write_text("second", encoding="utf-8")
+    (tmp_path / "a.txt").write_text("first", encoding="utf-8")
+    (tmp_path / "notes.pdf").write_text("ignored", encoding="utf-8")
+    (tmp_path / "~$a.docx").write_text("office lock file", encoding="utf-8")
+    assert load_items(str(tmp_path)) == [("a", "first"), ("b", "second")]
+
+def test_manifest_last_record_wins_and_torn_line_is_ignored(tmp_path):
+    path = str(tmp_path / "manifest.jsonl")
+    (tmp_path / "CR-1.docx").write_text("report")
+    manifest = Manifest(path)
+    manifest.append({"id": "CR-1", "status": "failed"})
+    manifest.append({"id": "CR-1", "status": "done", "doc": "CR-1.docx"})
+    manifest.append({"id": "CR-2", "status": "done", "doc": "missing.docx"})
+    with open(path, 'a') as f:
+        f.write('{"id": "CR-3", "sta')
+
+    reloaded = Manifest(path)
+    assert set(reloaded.records) == {"CR-1", "CR-2"}
+    assert reloaded.is_done("CR-1", str(tmp_path))
+    assert not reloaded.is_done("CR-2", str(tmp_path))  # Its output is gone
+    assert not reloaded.is_done("CR-3", str(tmp_path))
+
+def _args():
+    return SimpleNamespace(collection="c", clarification_answer="ok", max_turns=1)
+
+def _fake_session(writes_doc):
+    def run(text, db_path, collection, config, session_id, answer, max_turns):
+        if writes_doc:
+            with open(f"ImpactAnalysis_{session_id}.docx", 'w') as f:
+                f.write("report")
+        solvo = SimpleNamespace(state="DONE", workflow="ensemble")
+        return solvo, {"final_solution": {"summary": "s"}, "last_agent_response": "stopped"}, 0
+    return run
+
+def test_analyse_item_ignores_a_report_left_by_an_earlier_run(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "ImpactAnalysis_batch_CR-1.docx").write_text("stale")
+    monkeypatch.setattr(batch_cli, "run_solvo_session", _fake_session(writes_doc=False))
+
+    record = analyse_item("CR-1", "text", _args(), "db", {})
+    assert record["status"] == "failed"
+    assert not (tmp_path / "ImpactAnalysis_batch_CR-1.docx").exists()
+
+def test_analyse_item_reports_the_new_document(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(batch_cli, "run_solvo_session", _fake_session(writes_doc=True))
+
+    record = analyse_item("CR 1", "text", _args(), "db", {})
+    assert record["status"] == "done"
+    assert record["doc"] == "ImpactAnalysis_batch_CR_1.docx"
+    assert record["summary"] == "s"
@@ -0,0 +1,72 @@
+import time
+import threading
+from core.llm.prompt_budget import PromptBuilder
+from core.llm.conversation_memory import ConversationMemory, SUMMARIES_KEY
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+class SummaryLLM:
+    """Summarizes instantly, or once `release` is set when built with gated=True."""
+
+    def __init__(self, gated=False):
+        self.release = threading.Event()
+        if not gated:
+            self.release.set()
+        self.calls = 0
+
+    def prompt_builder(self, name="prompt"):
+        return PromptBuilder(100000, name=name)
+
+    def generate_content(self, prompt, system_instruction=None):
+        self.release.wait(5)
+        self.calls += 1
+        return _Response(f"summary #{self.calls}")
+
+def _turns(n):
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"turn {i}"} for i in range(n)]
+
+def _wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+def test_background_summary_lands_on_the_next_call_not_in_the_background():
+    llm = SummaryLLM(gated=True)
+    memory = ConversationMemory(llm, keep_turns=2)
+    session_data = {"session_id": "s1"}
+    messages = _turns(6)
+
+    summary, verbatim = memory.history(session_data, "chat", messages)
+    assert summary == "" and verbatim == messages
+    snapshot = session_data[SUMMARIES_KEY]
+
+    llm.release.set()
+    assert _wait_for(lambda: not memory._pending)
+    # The job's result waits in the memory; session_data is untouched until the caller asks again
+    assert session_data[SUMMARIES_KEY] is snapshot and snapshot == {}
+
+    summary, verbatim = memory.history(session_data, "chat", messages)
+    assert summary == "summary #1"
+    assert verbatim == messages[4:]
+    assert session_data[SUMMARIES_KEY]["chat"] == {"covered": 4, "summary": "summary #1"}
+
+def test_verbatim_window_stays_between_keep_turns_and_twice_that():
+    llm = SummaryLLM()
+    memory = ConversationMemory(llm, keep_turns=4)
+    session_data = {"session_id": "s1"}
+    for n in range(2, 30, 2):
+        memory.history(session_data, "chat", _turns(n))
+        assert _wait_for(lambda: not memory._pending)
+        _, verbatim = memory.history(session_data, "chat", _turns(n))
+        assert len(verbatim) <= 2 * 4 + 1
+
+def test_stage_summaries_replace_older_stages():
+    memory = ConversationMemory(SummaryLLM(), keep_stages=1)
+    session_data = {"session_id": "s1"}
+    stages = [("REQ", "long requirement analysis"), ("SCOPE", "scope text")]
+    memory.note_stage(session_data, "REQ", stages[0][1])
+    assert _wait_for(lambda: not memory._pending)
+    assert memory.stage_context(session_data, stages) == "## REQ (summary)\nsummary #1\n\nscope text"
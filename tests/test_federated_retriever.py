@@ -0,0 +1,28 @@
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("sentence_transformers")
+
+from core.rag.federated_retriever import FederatedRetriever, KEYWORD_SCORE
+
+def _chunk(distance, source="semantic"):
+    return {"id": str(distance), "document": str(distance), "metadata": {}, "distance": distance, "source": source}
+
+def test_scores_are_absolute_not_relative_to_the_collection():
+    # A collection whose best hit is a poor match must not score like one with a close match
+    close = FederatedRetriever._normalize([_chunk(0.1), _chunk(0.2)], 1.0, "cosine")
+    poor = FederatedRetriever._normalize([_chunk(0.7), _chunk(0.9)], 1.0, "cosine")
+    assert [c["score"] for c in close] == pytest.approx([0.9, 0.8])
+    assert [c["score"] for c in poor] == pytest.approx([0.3, 0.1])
+
+def test_weight_is_applied_on_top_of_the_similarity():
+    (chunk,) = FederatedRetriever._normalize([_chunk(0.4)], 0.5, "l2")
+    assert chunk["score"] == pytest.approx(0.4)
+    (chunk,) = FederatedRetriever._normalize([_chunk(3.0)], 1.0, "l2")
+    assert chunk["score"] == 0.0
+
+def test_keyword_hits_are_scored_by_rank():
+    chunks = FederatedRetriever._normalize([_chunk(None, "keyword"), _chunk(None, "keyword"), _chunk(0.1)], 1.0, "cosine")
+    assert chunks[0]["score"] == pytest.approx(KEYWORD_SCORE)
+    assert chunks[1]["score"] < chunks[0]["score"] < 1.0
+    assert chunks[2]["score"] > chunks[0]["score"]  # A close semantic match outranks a keyword hit
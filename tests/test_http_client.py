@@ -0,0 +1,34 @@
+import pytest
+
+pytest.importorskip("httpx")
+requests = pytest.importorskip("requests")
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+from core.llm.http_client import post_with_retry
+
+class FlakySession:
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def post(self, url, json, timeout, stream):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "response"
+
+def _refused():
+    reason = NewConnectionError(None, "Failed to establish a new connection: [Errno 111] Connection refused")
+    return requests.exceptions.ConnectionError(MaxRetryError(None, "/api/chat", reason))
+
+def test_failures_to_connect_are_retried():
+    session = FlakySession([_refused(), requests.exceptions.ConnectTimeout("connect timed out")])
+    assert post_with_retry(session, "http://llm/api/chat", {}, timeout=1, backoff=0) == "response"
+    assert session.calls == 3
+
+def test_connection_aborted_after_sending_is_not_retried():
+    aborted = requests.exceptions.ConnectionError(ProtocolError("Connection aborted.", ConnectionResetError(104, "reset")))
+    session = FlakySession([aborted])
+    with pytest.raises(requests.exceptions.ConnectionError):
+        post_with_retry(session, "http://llm/api/chat", {}, timeout=1, backoff=0)
+    assert session.calls == 1
@@ -0,0 +1,127 @@
+import pytest
+from core.llm.llm_interface import pop_usage
+from core.llm.model_cache import BoundedModelCache, HistoryBuilder
+from core.llm.scheduler import request_context
+
+class _Metadata:
+    prompt_token_count = 7
+    candidates_token_count = 3
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = _Metadata()
+
+class _Chat:
+    def __init__(self, model, history):
+        self.model = model
+        self.history = history
+
+    def send_message(self, message, safety_settings=None, generation_config=None, stream=False):
+        self.model.sent.append((self.history, message))
+        reply = f"{self.model.system_instruction}|{message}"
+        return [_Response(reply[:4]), _Response(reply[4:])] if stream else _Response(reply)
+
+class StubModel:
+    """Stands in for a GenerativeModel: echoes its system instruction and the prompt."""
+
+    def __init__(self, name, system_instruction):
+        self.name = name
+        self.system_instruction = system_instruction
+        self.sent = []
+
+    def generate_content(self, prompt, safety_settings=None, generation_config=None, stream=False):
+        reply = f"{self.system_instruction}|{prompt}"
+        return [_Response(reply[:4]), _Response(reply[4:])] if stream else _Response(reply)
+
+    def start_chat(self, history):
+        return _Chat(self, history)
+
+def _factory(built):
+    def factory(name, system_instruction):
+        model = StubModel(name, system_instruction)
+        built.append(model)
+        return model
+    return factory
+
+def test_model_cache_reuses_handles_and_evicts_least_recently_used():
+    built = []
+    cache = BoundedModelCache(lambda system_instruction: _factory(built)("m", system_instruction), max_size=2)
+    a = cache.get("A")
+    assert cache.get("A") is a
+    cache.get("B")
+    cache.get("A")  # B is now the least recently used
+    cache.get("C")
+    assert cache.get("A") is a
+    cache.get("B")
+    assert [m.system_instruction for m in built] == ["A", "B", "C", "B"]
+
+def test_history_builder_converts_only_new_turns():
+    converted = []
+    def convert(role, content):
+        converted.append(content)
+        return {"role": role, "parts": [content]}
+    builder = HistoryBuilder(convert)
+
+    messages = [{"role": "user", "content": "q1"}, {"role": "assistant", "content": "a1"}, {"role": "user", "content": "q2"}]
+    history, last = builder.build(messages)
+    assert last == "q2"
+    assert history == [{"role": "user", "parts": ["q1"]}, {"role": "model", "parts": ["a1"]}]
+
+    messages += [{"role": "assistant", "content": "a2"}, {"role": "user", "content": "q3"}]
+    history, last = builder.build(messages)
+    assert last == "q3"
+    assert [item["parts"][0] for item in history] == ["q1", "a1", "q2", "a2"]
+    assert converted == ["q1", "a1", "q2", "a2"]
+
+def test_history_builder_keeps_one_prefix_per_session():
+    converted = []
+    def convert(role, content):
+        converted.append(content)
+        return content
+    builder = HistoryBuilder(convert, max_sessions=2)
+    alice = [{"role": "user", "content": "a1"}, {"role": "assistant", "content": "a2"}, {"role": "user", "content": "a3"}]
+    bob = [{"role": "user", "content": "b1"}, {"role": "assistant", "content": "b2"}, {"role": "user", "content": "b3"}]
+
+    for messages, session in [(alice, "alice"), (bob, "bob"), (alice, "alice"), (bob, "bob")]:
+        with request_context(session_id=session):
+            builder.build(messages)
+    assert converted == ["a1", "a2", "b1", "b2"]  # Interleaving did not evict either prefix
+
+    with request_context(session_id="carol"):
+        builder.build(bob)  # Evicts alice, the least recently used
+    with request_context(session_id="alice"):
+        history, _ = builder.build(alice)
+    assert history == ["a1", "a2"]
+    assert converted[4:] == ["b1", "b2", "a1", "a2"]  # Alice's prefix was converted again
+
+@pytest.fixture(params=["gemini", "vertex"])
+def adapter(request, monkeypatch):
+    built = []
+    if request.param == "gemini":
+        pytest.importorskip("google.generativeai")
+        from core.llm.google_gemini_adapter import GeminiAdapter
+        provider = GeminiAdapter(api_key="test", model_name="stub", model_factory=_factory(built))
+    else:
+        pytest.importorskip("vertexai")
+        from core.llm.vertex_ai_adapter import VertexAIAdapter
+        provider = VertexAIAdapter(project_id="test", model_name="stub", model_factory=_factory(built))
+    provider.built = built
+    pop_usage()
+    return provider
+
+def test_adapter_generates_with_one_handle_per_system_instruction(adapter):
+    assert adapter.generate_content("hi", "sys") == "sys|hi"
+    assert pop_usage() == {"prompt_tokens": 7, "completion_tokens": 3}
+    assert adapter.generate_content("again", "sys") == "sys|again"
+    assert "".join(adapter.generate_content_stream("s", "other")) == "other|s"
+    assert [m.system_instruction for m in adapter.built] == ["sys", "other"]
+
+def test_adapter_chat_sends_history_and_last_user_message(adapter):
+    messages = [{"role": "user", "content": "q1"}, {"role": "assistant", "content": "a1"}, {"role": "user", "content": "q2"}]
+    assert adapter.chat(messages, "sys") == "sys|q2"
+    history, sent = adapter.built[0].sent[-1]
+    assert sent == "q2"
+    assert len(history) == 2
+    assert "".join(adapter.chat_stream(messages, "sys")) == "sys|q2"
+    assert len(adapter.built) == 1
@@ -0,0 +1,76 @@
+import json
+from core.orchestrator import DAGOrchestrator, Node, DONE, FAILED, SKIPPED, collect_artifacts, workflow_fingerprint
+
+def _graph(orchestrator, calls, fail=()):
+    def step(name, value):
+        def run(inputs):
+            calls.append(name)
+            if name in fail:
+                raise RuntimeError(f"{name} failed")
+            return {"value": value, "inputs": sorted(inputs)}
+        return run
+
+    def expand(output):
+        return [Node(f"child:{i}", step(f"child:{i}", i), deps=["root"]) for i in range(output["value"])]
+
+    orchestrator.add(Node("root", step("root", 2), expand=expand))
+    orchestrator.add(Node("after", step("after", 0), deps=["child:1"]))
+    return orchestrator
+
+def test_expanded_nodes_run_after_their_parent():
+    calls = []
+    records = _graph(DAGOrchestrator(), calls).run()
+
+    assert {name: r["status"] for name, r in records.items()} == {"root": DONE, "child:0": DONE, "child:1": DONE, "after": DONE}
+    assert calls[0] == "root" and calls[-1] == "after"
+    assert records["after"]["output"]["inputs"] == ["child:1"]
+
+def test_failed_dependency_skips_downstream_nodes():
+    orchestrator = _graph(DAGOrchestrator(), [], fail=("child:1",))
+    records = orchestrator.run()
+
+    assert records["child:1"]["status"] == FAILED
+    assert records["after"]["status"] == SKIPPED
+    assert records["child:0"]["status"] == DONE
+    assert set(orchestrator.failed) == {"child:1", "after"}
+
+def test_resume_reruns_only_unfinished_nodes(tmp_path):
+    checkpoint = str(tmp_path / "run.json")
+    _graph(DAGOrchestrator(checkpoint, fingerprint="a"), [], fail=("child:1",)).run()
+
+    calls = []
+    records = _graph(DAGOrchestrator(checkpoint, fingerprint="a"), calls).run()
+    assert sorted(calls) == ["after", "child:1"]
+    assert records["root"]["restored"] and records["child:0"]["restored"]
+    assert all(r["status"] == DONE for r in records.values())
+
+def test_checkpoint_of_another_workflow_is_not_restored(tmp_path):
+    checkpoint = str(tmp_path / "run.json")
+    _graph(DAGOrchestrator(checkpoint, fingerprint=workflow_fingerprint("request A", "db", "c", "ensemble")), []).run()
+    with open(checkpoint) as f:
+        assert json.load(f)["fingerprint"] == workflow_fingerprint("request A", "db", "c", "ensemble")
+
+    calls = []
+    _graph(DAGOrchestrator(checkpoint, fingerprint=workflow_fingerprint("request B", "db", "c", "ensemble")), calls).run()
+    assert sorted(calls) == ["after", "child:0", "child:1", "root"]
+
+def test_duplicate_node_names_keep_the_first():
+    orchestrator = DAGOrchestrator()
+    orchestrator.add(Node("a", lambda inputs: 1))
+    orchestrator.add(Node("a", lambda inputs: 2))
+    assert orchestrator.run()["a"]["output"] == 1
+
+def test_collect_artifacts_reports_a_shared_path_once():
+    done = lambda output: {"status": DONE, "output": output}
+    records = {
+        "solvo": done({"final_solution": {"summary": "s"}}),
+        "sutra:a.py": done({"files": [{"path": "a.py", "content": "A1"}, {"path": "util.py", "content": "U1"}]}),
+        "sutra:b.py": done({"files": [{"path": "b.py", "content": "B"}, {"path": "util.py", "content": "U2"}]}),
+        "pramana:util.py": done({"test_files": [{"path": "test_util.py"}], "sutra_node": "sutra:b.py"}),
+        "pramana:a.py": {"status": FAILED, "error": "x"}
+    }
+    artifacts = collect_artifacts(records)
+
+    assert artifacts["final_solution"] == {"summary": "s"}
+    assert sorted((f["path"], f["content"]) for f in artifacts["files"]) == [("a.py", "A1"), ("b.py", "B"), ("util.py", "U2")]
+    assert artifacts["test_files"] == [{"path": "test_util.py"}]
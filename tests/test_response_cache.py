@@ -0,0 +1,28 @@
+import os
+import time
+from core.llm.response_cache import ResponseCache
+
+def _disk_bytes(cache):
+    return sum(size for _, _, size in cache._entries())
+
+def test_overwriting_an_entry_does_not_grow_the_byte_count(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path))
+    key = ResponseCache.make_key("stub", "m", {}, None, "prompt")
+    cache.put(key, "first answer", 1.0)
+    cache.put(key, "a longer second answer", 1.0)
+
+    assert cache.stats()["bytes"] == _disk_bytes(cache)
+    assert cache.get(key) == "a longer second answer"
+
+def test_lru_eviction_keeps_the_cache_under_budget(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path), max_bytes=400)
+    keys = [ResponseCache.make_key("stub", "m", {}, None, f"prompt {i}") for i in range(10)]
+    start = time.time() - 100
+    for i, key in enumerate(keys):
+        cache.put(key, "x" * 50, 1.0)
+        if os.path.exists(cache._path(key)):
+            os.utime(cache._path(key), (start + i, start + i)) # Deterministic access order
+
+    assert cache.stats()["bytes"] == _disk_bytes(cache) <= 400
+    assert cache.get(keys[-1]) is not None
+    assert cache.get(keys[0]) is None
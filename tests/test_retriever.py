@@ -0,0 +1,66 @@
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("sentence_transformers")
+np = pytest.importorskip("numpy")
+
+from core.rag.retriever import Retriever
+
+class FakeCollection:
+    """Answers every query embedding with the documents whose first vector component is closest."""
+
+    def __init__(self, documents):
+        self.documents = documents  # [(id, text, x)]
+        self.metadata = {}
+        self.query_calls = []
+        self.get_calls = []
+
+    def query(self, query_embeddings, n_results, where=None):
+        self.query_calls.append((len(query_embeddings), where))
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for embedding in query_embeddings:
+            ranked = sorted(self.documents, key=lambda d: abs(d[2] - embedding[0]))[:n_results]
+            results["ids"].append([d[0] for d in ranked])
+            results["documents"].append([d[1] for d in ranked])
+            results["metadatas"].append([{} for _ in ranked])
+            results["distances"].append([abs(d[2] - embedding[0]) for d in ranked])
+        return results
+
+    def get(self, where_document, limit, include, where=None):
+        self.get_calls.append(where_document["$contains"])
+        matches = [d for d in self.documents if where_document["$contains"] in d[1]][:limit]
+        return {"ids": [d[0] for d in matches], "documents": [d[1] for d in matches], "metadatas": [{} for _ in matches]}
+
+class FakeModel:
+    def encode(self, texts):
+        vectors = [[float(len(t) % 7), 0.0] for t in ([texts] if isinstance(texts, str) else texts)]
+        return np.array(vectors[0] if isinstance(texts, str) else vectors)
+
+def _retriever(documents):
+    retriever = Retriever.__new__(Retriever)
+    retriever.collection_name = "code"
+    retriever.collection = FakeCollection(documents)
+    retriever.embedding_model = FakeModel()
+    retriever.code_languages = set()
+    retriever.auto_filters = False
+    return retriever
+
+DOCUMENTS = [("a", "def compute_total(): pass", 1.0), ("b", "def load_user(): pass", 3.0), ("c", "class Billing: pass", 5.0)]
+
+def test_batch_sends_all_queries_in_one_vector_query():
+    retriever = _retriever(DOCUMENTS)
+    queries = ["x", "xxx", "xxxxx"]
+    batch = retriever.retrieve_batch(queries, top_k=1)
+
+    assert retriever.collection.query_calls == [(3, None)]
+    assert [[c["id"] for c in chunks] for chunks in batch] == [["a"], ["b"], ["c"]]
+
+def test_batch_matches_single_query_results():
+    retriever = _retriever(DOCUMENTS)
+    queries = ["where is compute_total", "show load_user please"]
+    assert retriever.retrieve_batch(queries, top_k=2) == [retriever.retrieve(q, top_k=2) for q in queries]
+
+def test_keyword_lookups_are_shared_between_queries():
+    retriever = _retriever(DOCUMENTS)
+    retriever.retrieve_many(["fix compute_total", "why compute_total"], top_k=2)
+    assert retriever.collection.get_calls == ["compute_total"]
@@ -0,0 +1,91 @@
+import time
+from contextlib import contextmanager
+from core.llm.llm_interface import pop_usage
+from core.llm.router import HedgedRouter
+from core.llm.stub_provider import StubProvider
+
+def _stub(name, first_token_delay=0.0, fail=False, response="hello"):
+    return StubProvider(model_name=name, response=response, first_token_delay=first_token_delay, token_delay=0.0, fail=fail)
+
+class _Ticket:
+    wait_seconds = 0.25
+
+class QueuedStub(StubProvider):
+    """A stub whose backend queue always made the call wait 0.25s."""
+
+    @contextmanager
+    def slot(self):
+        yield _Ticket
+
+def test_route_twice_without_popping_usage():
+    router = HedgedRouter([("primary", _stub("primary"))], slo_seconds=5.0)
+    assert router.generate_content("a") == "hello"
+    # The first call's usage (including routed_to) is still in the context
+    assert router.generate_content("b") == "hello"
+    usage = pop_usage()
+    assert usage["routed_to"] == "primary"
+    assert usage["hedges"] == 0
+    assert usage["prompt_tokens"] > 0
+
+def test_streaming_route_records_winner():
+    router = HedgedRouter([("primary", _stub("primary", response="streamed text"))], slo_seconds=5.0)
+    assert "".join(router.generate_content_stream("a")) == "streamed text"
+    assert "".join(router.generate_content_stream("b")) == "streamed text"
+    assert pop_usage()["routed_to"] == "primary"
+
+def test_slow_primary_is_hedged_after_the_slo():
+    router = HedgedRouter([("primary", _stub("primary", 0.5, response="slow")), ("fallback", _stub("fallback", response="fast"))], slo_seconds=0.1)
+    t0 = time.perf_counter()
+    assert router.generate_content("a") == "fast"
+    assert time.perf_counter() - t0 < 0.4
+    usage = pop_usage()
+    assert usage["routed_to"] == "fallback" and usage["hedges"] == 1
+
+    assert "".join(router.generate_content_stream("b")) == "fast"
+    assert pop_usage()["routed_to"] == "fallback"
+
+def test_failing_provider_opens_then_half_opens_its_breaker():
+    primary = _stub("primary", fail=True)
+    router = HedgedRouter([("primary", primary), ("fallback", _stub("fallback", response="ok"))],
+                          slo_seconds=1.0, failure_threshold=2, reset_seconds=0.2)
+    for _ in range(2):
+        assert router.generate_content("a") == "ok"
+        assert pop_usage()["hedges"] == 1  # Failed over from primary
+    assert router.breaker_states()["primary"] == "open"
+
+    # While open, the primary is not tried at all
+    assert router.generate_content("a") == "ok"
+    assert pop_usage()["hedges"] == 0
+
+    time.sleep(0.25)
+    assert router.breaker_states()["primary"] == "half_open"
+    primary.fail = False
+    assert router.generate_content("a") == "hello"  # The trial request goes to the primary and closes it
+    assert pop_usage()["routed_to"] == "primary"
+    assert router.breaker_states()["primary"] == "closed"
+
+def test_hedge_cancelled_before_its_own_slo_is_not_a_failure():
+    # The primary misses the SLO by a little; the hedge it triggered is then cancelled while still young
+    router = HedgedRouter([("primary", _stub("primary", 0.3)), ("fallback", _stub("fallback", 0.6))],
+                          slo_seconds=0.2, failure_threshold=1, reset_seconds=60)
+    assert router.generate_content("a") == "hello"
+    assert pop_usage()["routed_to"] == "primary"
+    time.sleep(0.6)  # Let the cancelled hedge's thread finish
+    assert router.breakers["fallback"].failures == 0
+    assert router.breaker_states()["fallback"] == "closed"
+    # The primary itself did miss its SLO
+    assert router.breakers["primary"].failures == 1
+
+def test_loser_cancelled_after_its_slo_counts_as_slow():
+    router = HedgedRouter([("primary", _stub("primary", 0.3)), ("fallback", _stub("fallback"))],
+                          slo_seconds=0.1, failure_threshold=1, reset_seconds=60)
+    assert router.generate_content("a") == "hello"
+    assert pop_usage()["routed_to"] == "fallback"
+    time.sleep(0.35)
+    assert router.breaker_states()["primary"] == "open"
+    assert router.breaker_states()["fallback"] == "closed"
+
+def test_queue_wait_of_the_winning_attempt_is_reported():
+    router = HedgedRouter([("primary", QueuedStub(model_name="primary", response="hi", first_token_delay=0.0, token_delay=0.0))], slo_seconds=1.0)
+    assert router.generate_content("a") == "hi"
+    assert pop_usage()["queue_wait"] == 0.25
@@ -0,0 +1,46 @@
+import os
+import json
+import time
+from core.utils.session_manager import SessionManager
+
+def _save(manager, session_id, content="hello"):
+    session_data = {"session_id": session_id, "conversation_history": [{"role": "user", "content": content}]}
+    return manager.save_session(session_id, session_data, "ANALYZING", "Solvo", "solvo", "db", "collection")
+
+def _copy_in(manager, filename, session_id):
+    with open(os.path.join(manager.session_dir, filename), 'w') as f:
+        json.dump({"session_id": session_id, "session_data": {"conversation_history": []}}, f)
+
+def test_list_sessions_is_paginated_newest_first(tmp_path):
+    manager = SessionManager("alice", base_session_dir=str(tmp_path))
+    for i in range(5):
+        _save(manager, f"s{i}")
+        time.sleep(0.01)
+
+    assert manager.count_sessions() == 5
+    assert [s["id"] for s in manager.list_sessions(limit=2)] == ["s4", "s3"]
+    assert [s["id"] for s in manager.list_sessions(limit=2, offset=4)] == ["s0"]
+
+def test_external_file_is_indexed_after_a_later_save(tmp_path):
+    manager = SessionManager("alice", base_session_dir=str(tmp_path))
+    _save(manager, "first")
+    _copy_in(manager, "ext.json", "ext")
+    # Our own save must not mark the externally added file as already indexed
+    _save(manager, "second")
+    assert {s["id"] for s in manager.list_sessions()} == {"first", "second", "ext"}
+
+def test_external_file_is_indexed_after_a_later_delete(tmp_path):
+    manager = SessionManager("alice", base_session_dir=str(tmp_path))
+    _save(manager, "first")
+    _save(manager, "second")
+    _copy_in(manager, "ext.json", "ext")
+    assert manager.delete_session("first")
+    assert {s["id"] for s in manager.list_sessions()} == {"second", "ext"}
+
+def test_named_session_loads_by_id(tmp_path):
+    manager = SessionManager("alice", base_session_dir=str(tmp_path))
+    session_data = {"session_id": "abc", "conversation_history": []}
+    manager.save_session("abc", session_data, "DONE", "Solvo", "solvo", "db", "collection", session_name="My Analysis")
+    assert manager.load_session("abc")["session_name"] == "My Analysis"
+    assert manager.delete_session("abc")
+    assert manager.count_sessions() == 0
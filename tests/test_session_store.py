@@ -0,0 +1,85 @@
+import os
+import json
+from core.utils import session_store
+from core.utils.session_store import write_session, read_session, remove_session, LOG_SUFFIX
+
+def _save_data(session_data, **meta):
+    return {"session_id": "s", "agent_state": "IDLE", **meta, "session_data": session_data}
+
+def _log_lines(path):
+    if not os.path.exists(path + LOG_SUFFIX):
+        return []
+    with open(path + LOG_SUFFIX) as f:
+        return [json.loads(line) for line in f]
+
+def test_later_saves_append_deltas_that_replay(tmp_path):
+    path = str(tmp_path / "s.json")
+    history = [{"role": "user", "content": "q1"}]
+    notes = {"stage": "REQ"}
+    session_data = {"conversation_history": history, "notes": notes, "big": "x" * 1000}
+    write_session(path, _save_data(session_data))
+
+    history.append({"role": "assistant", "content": "a1"})
+    notes["stage"] = "SCOPE"  # Edited in place
+    write_session(path, _save_data(session_data, agent_state="DONE"))
+
+    (record,) = _log_lines(path)
+    assert record["append"] == {"conversation_history": [{"role": "assistant", "content": "a1"}]}
+    assert record["set"] == {"notes": {"stage": "SCOPE"}}
+    assert record["meta"] == {"agent_state": "DONE"}
+    session_store._STATES.clear()
+    assert read_session(path) == _save_data(session_data, agent_state="DONE")
+
+def test_scalar_type_changes_are_saved(tmp_path):
+    path = str(tmp_path / "s.json")
+    write_session(path, _save_data({"flag": 1}))
+    write_session(path, _save_data({"flag": True}))
+    assert read_session(path)["session_data"]["flag"] is True
+
+def test_edit_before_the_tail_of_the_history_writes_a_snapshot(tmp_path):
+    path = str(tmp_path / "s.json")
+    history = [{"role": "user", "content": "q1"}, {"role": "assistant", "content": "a1"}]
+    session_data = {"conversation_history": history}
+    write_session(path, _save_data(session_data))
+
+    history[0]["content"] = "q1 (edited)"
+    history.append({"role": "user", "content": "q2"})
+    write_session(path, _save_data(session_data))
+    assert _log_lines(path) == []
+    session_store._STATES.clear()
+    assert read_session(path)["session_data"]["conversation_history"][0]["content"] == "q1 (edited)"
+
+def test_deep_edits_are_saved_when_named(tmp_path):
+    path = str(tmp_path / "s.json")
+    session_data = {"final_solution": {"plan": {"steps": 1}}, "notes": {"a": 1}}
+    write_session(path, _save_data(session_data))
+
+    session_data["final_solution"]["plan"]["steps"] = 2
+    write_session(path, _save_data(session_data))
+    assert _log_lines(path)[-1].get("set") is None  # Not seen below the first level
+
+    write_session(path, _save_data(session_data), changed=["final_solution"])
+    assert _log_lines(path)[-1]["set"] == {"final_solution": {"plan": {"steps": 2}}}
+    session_store._STATES.clear()
+    assert read_session(path)["session_data"] == session_data
+
+def test_state_cache_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_store, "SESSION_STATE_CACHE_SIZE", 2)
+    session_store._STATES.clear()
+    paths = [str(tmp_path / f"s{i}.json") for i in range(3)]
+    for path in paths:
+        write_session(path, _save_data({"conversation_history": []}))
+    assert list(session_store._STATES) == paths[1:]
+
+    # The evicted session saves a fresh snapshot instead of a delta
+    write_session(paths[0], _save_data({"conversation_history": [{"role": "user", "content": "q"}]}))
+    assert _log_lines(paths[0]) == []
+    assert read_session(paths[0])["session_data"]["conversation_history"] == [{"role": "user", "content": "q"}]
+
+def test_remove_session_deletes_snapshot_and_log(tmp_path):
+    path = str(tmp_path / "s.json")
+    write_session(path, _save_data({"conversation_history": []}))
+    write_session(path, _save_data({"conversation_history": [{"role": "user", "content": "q"}]}))
+    remove_session(path)
+    assert not os.path.exists(path) and not os.path.exists(path + LOG_SUFFIX)
+    assert path not in session_store._STATES
@@ -0,0 +1,42 @@
+from core.llm.structured_output import extract_json, generate_json, get_response_format, JSON
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+class ScriptedLLM:
+    """Returns the scripted answers in order and remembers the response format each call asked for."""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.calls = []
+
+    def generate_content(self, prompt, system_instruction=None, on_token=None, use_cache=True):
+        self.calls.append((prompt, system_instruction, get_response_format()))
+        return _Response(self.answers.pop(0))
+
+def test_extracts_the_object_around_prose_and_fences():
+    assert extract_json('Sure:\n```json\n{"a": {"b": 1}}\n```\nDone.') == {"a": {"b": 1}}
+    assert extract_json('Answer: {"a": [1, 2]} trailing') == {"a": [1, 2]}
+
+def test_fenced_block_wins_over_braces_in_prose():
+    assert extract_json('Use {placeholders} like this:\n```json\n{"ok": true}\n```') == {"ok": True}
+
+def test_malformed_outer_object_is_not_replaced_by_a_nested_one():
+    text = '{"files": [{"file_path": "a.py", "code_content": "x"}], "explanation": "bad "quote""}'
+    assert extract_json(text) is None
+
+def test_no_object():
+    assert extract_json("") is None
+    assert extract_json("no json here") is None
+    assert extract_json("[1, 2]") is None
+
+def test_malformed_answer_gets_one_repair_round_trip():
+    broken = '{"files": [{"file_path": "a.py"}], "explanation": "bad "quote""}'
+    llm = ScriptedLLM(broken, '{"files": [{"file_path": "a.py"}], "explanation": "bad \\"quote\\""}')
+    result, response = generate_json(llm, "write code")
+
+    assert result == {"files": [{"file_path": "a.py"}], "explanation": 'bad "quote"'}
+    assert response.text == broken
+    assert len(llm.calls) == 2
+    assert llm.calls[1][0] == broken and llm.calls[1][2] == JSON
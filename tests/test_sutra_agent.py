@@ -0,0 +1,41 @@
+import pytest
+
+pytest.importorskip("google.generativeai")
+pytest.importorskip("httpx")
+pytest.importorskip("requests")
+
+from agents.Sutra.agent import SutraAgent
+
+class _Services:
+    def __init__(self):
+        self.retriever_calls = 0
+
+    def retriever(self, db_path, collection_name, kb_config=None):
+        self.retriever_calls += 1
+        raise RuntimeError("no such collection")
+
+def _agent():
+    agent = SutraAgent("db", "code")
+    agent.services = _Services()
+    return agent
+
+def test_failed_retriever_is_not_rebuilt_on_every_access():
+    agent = _agent()
+    assert agent.retriever is None
+    assert agent.retriever is None
+    assert agent.services.retriever_calls == 1
+
+def test_one_failing_file_keeps_the_other_files(monkeypatch):
+    agent = _agent()
+    def generate_file(user_input, plan_context, file_task):
+        if file_task["path"] == "b.py":
+            raise TimeoutError("backend timed out")
+        return {"files": [{"path": file_task["path"], "code_content": "pass", "action": "MODIFY"}], "explanation": "done"}, "raw"
+    monkeypatch.setattr(agent, "generate_file", generate_file)
+
+    session_data = {}
+    tasks = [{"path": "a.py", "instruction": ""}, {"path": "b.py", "instruction": ""}]
+    agent._execute_per_file("implement", "plan", tasks, session_data)
+    response = session_data["last_agent_response"]
+    assert "`a.py`" in response
+    assert "Could not generate: `b.py` (backend timed out)" in response
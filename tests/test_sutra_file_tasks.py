@@ -0,0 +1,43 @@
+import pytest
+from agents.Sutra.file_tasks import extract_file_tasks
+
+def _paths(plan_text):
+    return [task["path"] for task in extract_file_tasks({"uploaded_doc_content": plan_text})]
+
+def test_structured_code_changes_win_over_plan_text():
+    session_data = {
+        "final_solution": {"code_changes": [
+            {"file_path": "src/a.py", "diff": "add f()"},
+            {"file_path": "src/a.py", "diff": "duplicate"},
+            {"file_path": "src/b.py"}
+        ]},
+        "uploaded_doc_content": "Also touch src/c.py"
+    }
+    assert extract_file_tasks(session_data) == [
+        {"path": "src/a.py", "instruction": "add f()"},
+        {"path": "src/b.py", "instruction": ""}
+    ]
+
+def test_paths_are_found_in_the_plan_text_once_in_order():
+    plan = "Update src/main/java/com/acme/Billing.java, then scripts/run_batch.ksh and again src/main/java/com/acme/Billing.java."
+    assert _paths(plan) == ["src/main/java/com/acme/Billing.java", "scripts/run_batch.ksh"]
+
+def test_longest_extension_wins():
+    assert _paths("See lib/engine.cpp and lib/engine.hpp") == ["lib/engine.cpp", "lib/engine.hpp"]
+
+def test_bare_file_name_in_inline_code():
+    assert _paths("Add a check to `Validator.java` and `run.sh`.") == ["Validator.java", "run.sh"]
+
+@pytest.mark.parametrize("prose", [
+    "Store it as a java.sql.Timestamp column.",
+    "The UI runs on Node.js 18.",
+    "Compare with config.py in prose.",
+    "Read com.acme.Billing.java.util.List",
+    "Served from https://cdn.example.com/static/app.js"
+])
+def test_prose_is_not_a_file_task(prose):
+    assert _paths(prose) == []
+
+def test_no_plan_no_tasks():
+    assert extract_file_tasks({}) == []
+    assert extract_file_tasks({"final_solution": "free text", "uploaded_doc_content": None}) == []
@@ -0,0 +1,61 @@
+import pytest
+from agents.Sutra import validator
+from agents.Sutra.validator import check_schema, check_syntax, grammar_for, validate_result
+
+def _result(**file_fields):
+    file = {"path": "src/App.java", "action": "MODIFY", "code_content": "class App {}", **file_fields}
+    return {"files": [file], "explanation": "Adds App."}
+
+def test_valid_result_has_no_schema_diagnostics():
+    assert check_schema(_result()) == []
+
+@pytest.mark.parametrize("result_json, expected", [
+    ([], "Response is not a JSON object."),
+    ({"explanation": "x"}, "'files' must be a non-empty list."),
+    ({"files": []}, "'files' must be a non-empty list."),
+    ({"files": ["App.java"]}, "files[0] is not an object."),
+])
+def test_schema_shape_errors(result_json, expected):
+    assert check_schema(result_json) == [expected]
+
+def test_schema_field_errors():
+    diagnostics = check_schema(_result(path=" ", code_content="", action="DELETE"))
+    assert diagnostics == [
+        "files[0] has no 'path'.",
+        "files[0] ( ) has no 'code_content'.",
+        "files[0] ( ) has action 'DELETE'; expected CREATE or MODIFY.",
+    ]
+    assert check_schema({**_result(), "explanation": ["not", "a", "string"]}) == ["'explanation' must be a string."]
+
+def test_missing_json_is_a_diagnostic():
+    assert validate_result(None) == ["Response contains no valid JSON object."]
+
+@pytest.mark.parametrize("path, grammar", [
+    ("src/App.java", "java"),
+    ("tools/run.py", "python"),
+    ("lib/util.c", "c"),
+    ("lib/Pricing.cpp", "cpp"),
+    ("lib/Pricing.hpp", "cpp"),
+    ("lib/Pricing.cc", "cpp"),
+    ("lib/Pricing.h++", "cpp"),
+    ("bin/deploy.ksh", "bash"),
+    ("lib/types.h", None),
+    ("batch/BILLING.cbl", None),
+    ("README.md", None),
+])
+def test_grammar_for(path, grammar):
+    assert grammar_for(path) == grammar
+
+def test_files_without_grammar_pass_without_a_parser(monkeypatch):
+    monkeypatch.setattr(validator, "_get_parser", lambda grammar: pytest.fail("no parser should be requested") if grammar else None)
+    assert check_syntax("batch/BILLING.cbl", "IDENTIFICATION DIVISION.") == []
+
+def test_syntax_errors_are_located():
+    pytest.importorskip("tree_sitter_languages")
+    diagnostics = check_syntax("src/App.java", "class App {\n  void run( {\n}\n")
+    assert diagnostics and all(d.startswith("src/App.java:") for d in diagnostics)
+
+def test_cpp_is_parsed_with_the_cpp_grammar():
+    pytest.importorskip("tree_sitter_languages")
+    code = "namespace billing {\ntemplate <typename T>\nclass Price { public: T value; };\n}\n"
+    assert check_syntax("lib/Price.hpp", code) == []
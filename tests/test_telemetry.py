@@ -0,0 +1,16 @@
+from core.llm.telemetry import LLMTelemetry, format_summary
+from core.llm.scheduler import request_context
+
+def test_summary_separates_full_prompt_from_evaluated_tokens():
+    telemetry = LLMTelemetry(path=None)
+    with request_context(user="u", agent="Solvo", stage="CHAT"):
+        # Second turn: most of the prompt was served from the KV cache
+        telemetry.record(kind="chat", prompt_tokens=1000, prompt_eval_tokens=1000, completion_tokens=50, latency=2.0)
+        telemetry.record(kind="chat", prompt_tokens=1100, prompt_eval_tokens=100, completion_tokens=40, latency=1.0, prompt_eval_seconds=0.05)
+
+    (group,) = telemetry.summary().values()
+    assert group["calls"] == 2
+    assert group["prompt_tokens"] == 2100
+    assert group["prompt_eval_tokens"] == 1100
+    assert group["completion_tokens"] == 90
+    assert "tok eval" in format_summary(telemetry.summary())